@@ -9,6 +9,7 @@ Version: 1.3.0 (Stable_923001)
 config.py - 配置文件读取与验证
 """
 import os
+import socket
 from botpy.ext.cog_yaml import read
 from core.utils.logger import get_logger
 import subprocess
@@ -40,6 +41,10 @@ LOG_FILE = os.path.join(LOG_DIR, "bot.log")
 MEMORY_FILE = os.path.join(DATA_DIR, "memory.json")
 LONG_TERM_MEMORY_FILE = os.path.join(DATA_DIR, "long_term_memory_{}.txt")
 USER_NAMES_FILE = os.path.join(DATA_DIR, "user_names.json")
+CHANGE_STREAM_TOKEN_FILE = os.path.join(DATA_DIR, "change_stream_token.json")
+LLM_CACHE_FILE = os.path.join(DATA_DIR, "llm_cache.sqlite3")
+LLM_STATS_FILE = os.path.join(DATA_DIR, "llm_stats.json")
+LLM_TOKENIZER_DIR = os.path.join(DATA_DIR, "tokenizers")
 FAISS_INDEX_PATH = "./data/faiss_index.bin"
 
 # 读取配置文件
@@ -105,8 +110,26 @@ REQUEST_LIMIT_TIME_FRAME = test_config.get("request_limit_time_frame", 10)
 REQUEST_LIMIT_COUNT = test_config.get("request_limit_count", 7)
 GLOBAL_RATE_LIMIT = test_config.get("global_rate_limit", 75)
 
-MEMORY_THRESHOLD = 150
-FORGET_THRESHOLD = 5
+# Prompt 组装配置：上下文超出 max_context_tokens 时一次裁剪到该比例，使之后几轮的前缀保持不变
+PROMPT_TRIM_LOW_WATERMARK = test_config.get("prompt_trim_low_watermark", 0.75)
+
+# Token 计数配置：按模型名前缀指定 BPE 编码，例如 {"qwen": "cl100k_base"}，未匹配时使用内置的模型家族表
+LLM_TOKENIZER_ENCODINGS = test_config.get("llm_tokenizer_encodings", {})
+# 按消息内容缓存的 Token 计数条数
+LLM_TOKENIZER_CACHE_ENTRIES = test_config.get("llm_tokenizer_cache_entries", 8192)
+
+# 记忆遗忘配置：每个群组保留的记忆上限，以及可被遗忘的记忆分数阈值
+MEMORY_THRESHOLD = test_config.get("memory_threshold", 150)
+FORGET_THRESHOLD = test_config.get("forget_threshold", 5)
+MEMORY_DECAY_HALF_LIFE_DAYS = test_config.get("memory_decay_half_life_days", 30)
+
+# 记忆压缩任务配置
+MEMORY_COMPACTION_ENABLED = test_config.get("memory_compaction_enabled", True)
+MEMORY_COMPACTION_INTERVAL = test_config.get("memory_compaction_interval", 3600)
+MEMORY_COMPACTION_BATCH_SIZE = test_config.get("memory_compaction_batch_size", 200)
+MEMORY_COMPACTION_THROTTLE = test_config.get("memory_compaction_throttle", 1.0)
+MEMORY_COMPACTION_REQUESTS_PER_SECOND = test_config.get("memory_compaction_requests_per_second", 100)
+TEMP_MEMORY_STALE_DAYS = test_config.get("temp_memory_stale_days", 7)
 
 
 MEMORY_BATCH_SIZE = test_config.get("memory_batch_size", 1)
@@ -115,15 +138,106 @@ REQUEST_TIMEOUT= test_config.get("request_timeout", 7)
 MONGODB_URI = test_config.get("mongodb_url", "")
 MONGODB_USERNAME = test_config.get("mongodb_username", "")
 MONGODB_PASSWORD = test_config.get("mongodb_password", "")
+MONGODB_EXECUTOR_WORKERS = test_config.get("mongodb_executor_workers", 8)
+MONGODB_MAX_POOL_SIZE = test_config.get("mongodb_max_pool_size", 50)
+MONGODB_MIN_POOL_SIZE = test_config.get("mongodb_min_pool_size", 2)
+# 临时记忆写入确认级别: 1 为主节点内存确认（不等待日志落盘），0 为完全不确认
+MONGODB_SCRATCH_WRITE_W = test_config.get("mongodb_scratch_write_w", 1)
+# 对话按月分区：最近 N 个月为热分区，超过 M 个月的分区滚动归档到压缩集合
+CONVERSATION_HOT_MONTHS = test_config.get("conversation_hot_months", 2)
+CONVERSATION_ARCHIVE_AFTER_MONTHS = test_config.get("conversation_archive_after_months", 6)
+CONVERSATION_ARCHIVE_COMPRESSOR = test_config.get("conversation_archive_compressor", "zstd")
+
+# 多实例部署配置：实例标识用于区分本实例写入，变更流用于同步其他实例的写入
+INSTANCE_ID = test_config.get("instance_id") or socket.gethostname()
+CHANGE_STREAM_ENABLED = test_config.get("change_stream_enabled", False)
 
 ELASTICSEARCH_URL = test_config.get("elasticsearch_url", "")
 ELASTICSEARCH_USERNAME = test_config.get("elasticsearch_username", "")
 ELASTICSEARCH_PASSWORD = test_config.get("elasticsearch_password", "")
+ELASTICSEARCH_CONNECTIONS_PER_NODE = test_config.get("elasticsearch_connections_per_node", 10)
+# 全量读取（point-in-time + search_after）的每页文档数与 PIT 保活时间
+ELASTICSEARCH_PAGE_SIZE = test_config.get("elasticsearch_page_size", 1000)
+ELASTICSEARCH_PIT_KEEP_ALIVE = test_config.get("elasticsearch_pit_keep_alive", "1m")
+# 检索请求合并：在窗口期内到达的不同群组的检索合并为一次 _msearch
+ELASTICSEARCH_MSEARCH_WINDOW_MS = test_config.get("elasticsearch_msearch_window_ms", 5)
+ELASTICSEARCH_MSEARCH_MAX_BATCH = test_config.get("elasticsearch_msearch_max_batch", 50)
+# 长期记忆检索返回的文档数（ES 端已按相关度与时间衰减排序）
+ELASTICSEARCH_SEARCH_TOP_K = test_config.get("elasticsearch_search_top_k", 5)
+# 后台批量写入：按文档数、字节数或时间间隔触发刷新，队列满时写入方等待
+ELASTICSEARCH_BULK_MAX_DOCS = test_config.get("elasticsearch_bulk_max_docs", 500)
+ELASTICSEARCH_BULK_MAX_BYTES = test_config.get("elasticsearch_bulk_max_bytes", 5 * 1024 * 1024)
+ELASTICSEARCH_BULK_FLUSH_INTERVAL = test_config.get("elasticsearch_bulk_flush_interval", 1.0)
+ELASTICSEARCH_BULK_QUEUE_SIZE = test_config.get("elasticsearch_bulk_queue_size", 10000)
+ELASTICSEARCH_BULK_MAX_RETRIES = test_config.get("elasticsearch_bulk_max_retries", 5)
 
 OPENAI_SECRET = test_config.get("openai_secret", "")
 OPENAI_MODEL = test_config.get("openai_model", "gpt-4o-mini")
 OPENAI_API_URL = test_config.get("openai_api_url", "https://api.openai-hk.com/v1/chat/completions")
 
+# LLM HTTP 连接池配置：所有 LLM 客户端共享长连接，每个提供商一个连接池
+LLM_HTTP2 = test_config.get("llm_http2", False)
+LLM_MAX_CONNECTIONS = test_config.get("llm_max_connections", 100)
+LLM_MAX_KEEPALIVE_CONNECTIONS = test_config.get("llm_max_keepalive_connections", 20)
+LLM_KEEPALIVE_EXPIRY = test_config.get("llm_keepalive_expiry", 30)
+
+# LLM 多提供商路由配置：llm_providers 为列表，每项包含 provider、secret、model、api_url，可选 name、weight
+# 为空时只使用 llm_provider 指定的单个提供商
+LLM_PROVIDERS = test_config.get("llm_providers", [])
+# 路由策略：latency（选择 EWMA 延迟与错误率最优的后端）或 weighted（按权重随机分配）
+LLM_ROUTER_STRATEGY = test_config.get("llm_router_strategy", "latency")
+# EWMA 平滑系数，越大越重视最近的请求
+LLM_ROUTER_EWMA_ALPHA = test_config.get("llm_router_ewma_alpha", 0.3)
+# 单个后端的请求超时（秒），超时即转移到下一个后端
+LLM_ROUTER_TIMEOUT = test_config.get("llm_router_timeout", 30)
+# 后端连续失败多少次后暂时摘除，以及摘除时长（秒）
+LLM_ROUTER_FAILURE_THRESHOLD = test_config.get("llm_router_failure_threshold", 3)
+LLM_ROUTER_COOLDOWN = test_config.get("llm_router_cooldown", 30)
+
+# 按调用点命名的模型配置：reply（回复）、summary（上下文摘要）、keywords（记忆关键词）、semantic（语义分析）、
+# optimization（记忆优化），每项可包含 model、api_url、secret、endpoint、max_tokens、temperature、timeout，
+# 未配置的字段使用默认值。例如 {"summary": {"model": "gpt-4o-mini", "max_tokens": 80}}
+LLM_PROFILES = test_config.get("llm_profiles", {})
+
+# LLM 辅助调用（关键词提取、语义分析、记忆优化、上下文摘要）的响应缓存配置
+LLM_CACHE_ENABLED = test_config.get("llm_cache_enabled", True)
+# 缓存有效期（秒），默认 7 天
+LLM_CACHE_TTL = test_config.get("llm_cache_ttl", 7 * 24 * 3600)
+# 内存中保留的条目数与磁盘（SQLite）中保留的条目数，超出后淘汰最久未访问的条目
+LLM_CACHE_MEMORY_ENTRIES = test_config.get("llm_cache_memory_entries", 1024)
+LLM_CACHE_MAX_ENTRIES = test_config.get("llm_cache_max_entries", 50000)
+
+# LLM 调用重试与熔断配置
+# 单次调用的最大尝试次数（含第一次）
+LLM_RETRY_MAX_ATTEMPTS = test_config.get("llm_retry_max_attempts", 3)
+# 指数退避的基础等待与最长等待（秒），实际等待在 [0, 上限] 之间随机抖动
+LLM_RETRY_BASE_DELAY = test_config.get("llm_retry_base_delay", 0.5)
+LLM_RETRY_MAX_DELAY = test_config.get("llm_retry_max_delay", 8)
+# 重试预算：每次请求为该端点积累的重试额度，重试总量约为请求量的该比例，避免故障时形成重试风暴
+LLM_RETRY_BUDGET_RATIO = test_config.get("llm_retry_budget_ratio", 0.2)
+# 熔断器：连续失败多少次后断开，断开多少秒后放行一次半开探测
+LLM_BREAKER_FAILURE_THRESHOLD = test_config.get("llm_breaker_failure_threshold", 5)
+LLM_BREAKER_RESET_TIMEOUT = test_config.get("llm_breaker_reset_timeout", 30)
+
+# LLM 准入控制：每个端点（提供商/密钥）按每分钟请求数与 Token 数限流，超出时排队等待
+LLM_RATE_LIMIT_RPM = test_config.get("llm_rate_limit_rpm", 300)
+LLM_RATE_LIMIT_TPM = test_config.get("llm_rate_limit_tpm", 150000)
+# 按端点覆盖限额，例如 {"openai": {"rpm": 500, "tpm": 200000}}，0 表示不限制
+LLM_RATE_LIMITS = test_config.get("llm_rate_limits", {})
+# 每个端点最多排队的请求数与单个请求最长排队时间（秒），超出即拒绝
+LLM_ADMISSION_MAX_QUEUE = test_config.get("llm_admission_max_queue", 200)
+LLM_ADMISSION_MAX_WAIT = test_config.get("llm_admission_max_wait", 30)
+# 排队时各群组的权重，未配置的群组权重为 1，例如 {"group_openid": 2}
+LLM_GROUP_WEIGHTS = test_config.get("llm_group_weights", {})
+
+# LLM 调用遥测：模型价格（美元 / 百万 Token，按模型名前缀匹配），例如 {"gpt-4o-mini": {"prompt": 0.15, "completion": 0.6}}
+LLM_MODEL_PRICES = test_config.get("llm_model_prices", {})
+# 最多单独汇总的群组数，超出后最久未出现的群组并入 "(other)"
+LLM_TELEMETRY_MAX_GROUPS = test_config.get("llm_telemetry_max_groups", 500)
+# 计算延迟分位数时保留的最近调用数，以及保留明细的最近调用数
+LLM_TELEMETRY_WINDOW = test_config.get("llm_telemetry_window", 512)
+LLM_TELEMETRY_RECENT_CALLS = test_config.get("llm_telemetry_recent_calls", 100)
+
 ADMIN_ID = test_config.get("admin_id", "")
 
 # KEEP_ALIVE 配置
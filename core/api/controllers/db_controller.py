@@ -1,75 +1,137 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
+import json
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Body, Depends, Query
+from fastapi.responses import StreamingResponse
 from core.ace.secure import SecureInterface
 from pydantic import BaseModel
 from core.utils.logger import get_logger
-from core.utils.mongodb_utils import MongoDBUtils
+from core.utils.mongodb_utils import AsyncMongoDBUtils
 
 logger = get_logger()
 router = APIRouter()
 
-# 依赖注入 MongoDBUtils 实例
+# 分页参数上限，避免单次请求拉取过多文档
+MAX_PAGE_SIZE = 1000
+
+# 依赖注入 AsyncMongoDBUtils 实例，底层复用服务注册表中的共享连接池
 async def get_db():
-    db = MongoDBUtils()
-    try:
-        yield db
-    finally:
-        db.close_connection()
+    yield AsyncMongoDBUtils()
 
 class UpdateDocumentModel(BaseModel):
     update: dict
 
+
+def _build_cursor_query(query, after_id):
+    """在原查询条件上追加基于 _id 的游标条件"""
+    if not after_id:
+        return query
+    cursor_id = ObjectId(after_id) if ObjectId.is_valid(after_id) else after_id
+    cursor_condition = {"_id": {"$gt": cursor_id}}
+    return {"$and": [query, cursor_condition]} if query else cursor_condition
+
+
+def _parse_projection(projection):
+    """将逗号分隔的字段列表转换为 MongoDB projection"""
+    if not projection:
+        return None
+    return {field.strip(): 1 for field in projection.split(",") if field.strip()}
+
+
+def _serialize_document(document):
+    """将 ObjectId 转换为字符串"""
+    if "_id" in document:
+        document["_id"] = str(document["_id"])
+    return document
+
+
+def _ndjson_stream(cursor):
+    """逐条把游标中的文档写成 NDJSON，服务端内存占用与集合大小无关"""
+    try:
+        for document in cursor:
+            yield json.dumps(_serialize_document(document), ensure_ascii=False, default=str) + "\n"
+    finally:
+        cursor.close()
+
+
+async def _query_documents(db, db_name, collection_name, query, limit, after_id, projection, stream):
+    """按 _id 游标分页查询文档，stream=True 时以 NDJSON 流式返回全部结果"""
+    collection = db.client[db_name][collection_name]
+    cursor_query = _build_cursor_query(query, after_id)
+    fields = _parse_projection(projection)
+
+    if stream:
+        cursor = collection.find(cursor_query, fields).sort("_id", 1).batch_size(limit)
+        return StreamingResponse(_ndjson_stream(cursor), media_type="application/x-ndjson")
+
+    documents = await db.run(lambda: list(collection.find(cursor_query, fields).sort("_id", 1).limit(limit)))
+    documents = [_serialize_document(document) for document in documents]
+    next_after_id = documents[-1]["_id"] if len(documents) == limit else None
+    return {"status": "success", "documents": documents, "next_after_id": next_after_id}
+
 @router.get("/databases")
-async def get_all_databases(db: MongoDBUtils = Depends(get_db)):
+async def get_all_databases(db: AsyncMongoDBUtils = Depends(get_db)):
     """获取所有数据库名称"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        databases = db.get_all_database_names()
+        databases = await db.get_all_database_names()
         return {"status": "success", "databases": databases}
     except Exception as e:
         logger.error(f"获取数据库列表时出错: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/collections/{db_name}")
-async def get_all_collections(db_name: str, db: MongoDBUtils = Depends(get_db)):
+async def get_all_collections(db_name: str, db: AsyncMongoDBUtils = Depends(get_db)):
     """获取指定数据库中的所有集合名称"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        collections = db.get_all_collection_names(db_name)
+        collections = await db.get_all_collection_names(db_name)
         return {"status": "success", "collections": collections}
     except Exception as e:
         logger.error(f"获取数据库集合列表时出错: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/documents/{db_name}/{collection_name}")
-async def get_all_documents(db_name: str, collection_name: str, db: MongoDBUtils = Depends(get_db)):
-    """获取指定集合中的所有文档"""
+@router.get("/indexes/check")
+async def check_indexes(db: AsyncMongoDBUtils = Depends(get_db)):
+    """确保索引存在，并用 explain() 检查热点查询是否仍在全集合扫描"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        # 获取集合对象
-        collection = db.client[db_name][collection_name]
-        documents = list(collection.find({}))
+        indexes = await db.ensure_indexes()
+        report = await db.check_query_plans()
+        return {"status": "success", "indexes": indexes, "report": report}
+    except Exception as e:
+        logger.error(f"检查数据库索引时出错: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 将 ObjectId 转换为字符串
-        for document in documents:
-            if "_id" in document:
-                document["_id"] = str(document["_id"])
+@router.get("/documents/{db_name}/{collection_name}")
+async def get_all_documents(db_name: str, collection_name: str,
+                            limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                            after_id: str = Query(None),
+                            projection: str = Query(None),
+                            stream: bool = Query(False),
+                            db: AsyncMongoDBUtils = Depends(get_db)):
+    """分页获取指定集合中的文档，stream=true 时以 NDJSON 流式返回"""
+    secure_interface = SecureInterface()
+    if not secure_interface.verify_request():
+        return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
-        return {"status": "success", "documents": documents}
+    try:
+        return await _query_documents(db, db_name, collection_name, {}, limit, after_id, projection, stream)
     except Exception as e:
         logger.error(f"获取数据库文档列表时出错: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/documents/{db_name}/{collection_name}")
-async def insert_document(db_name: str, collection_name: str, document: dict = Body(...), db: MongoDBUtils = Depends(get_db)):
+async def insert_document(db_name: str, collection_name: str, document: dict = Body(...), db: AsyncMongoDBUtils = Depends(get_db)):
     """向指定集合中插入文档"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
@@ -78,7 +140,7 @@ async def insert_document(db_name: str, collection_name: str, document: dict = B
     try:
         # 获取集合对象
         collection = db.client[db_name][collection_name]
-        result = collection.insert_one(document)
+        result = await db.run(collection.insert_one, document)
         return {"status": "success", "inserted_id": str(result.inserted_id)}
     except Exception as e:
         logger.error(f"插入数据库文档时出错: {e}")
@@ -87,24 +149,18 @@ async def insert_document(db_name: str, collection_name: str, document: dict = B
 
 @router.post("/documents/find/{db_name}/{collection_name}")
 async def find_document(db_name: str, collection_name: str, query: dict = Body(...),
-                        db: MongoDBUtils = Depends(get_db)):
-    """根据查询条件查找文档"""
+                        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                        after_id: str = Query(None),
+                        projection: str = Query(None),
+                        stream: bool = Query(False),
+                        db: AsyncMongoDBUtils = Depends(get_db)):
+    """根据查询条件分页查找文档，stream=true 时以 NDJSON 流式返回"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        # 获取集合对象
-        collection = db.client[db_name][collection_name]
-        # 查找文档
-        cursor = collection.find(query)
-        result = []
-        for document in cursor:
-            if "_id" in document:
-                document["_id"] = str(document["_id"])  # 将 ObjectId 转换为字符串
-            result.append(document)
-
-        return {"status": "success", "documents": result}
+        return await _query_documents(db, db_name, collection_name, query, limit, after_id, projection, stream)
 
     except Exception as e:
         logger.error(f"查找数据库文档时出错: {e}")
@@ -112,7 +168,7 @@ async def find_document(db_name: str, collection_name: str, query: dict = Body(.
 
 
 @router.put("/update/documents/{db_name}/{collection_name}")
-async def update_document(db_name: str, collection_name: str, query: dict = Body(...), update_data: UpdateDocumentModel = Body(...), db: MongoDBUtils = Depends(get_db)):
+async def update_document(db_name: str, collection_name: str, query: dict = Body(...), update_data: UpdateDocumentModel = Body(...), db: AsyncMongoDBUtils = Depends(get_db)):
     """根据查询条件更新文档"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
@@ -121,14 +177,14 @@ async def update_document(db_name: str, collection_name: str, query: dict = Body
     try:
         # 获取集合对象
         collection = db.client[db_name][collection_name]
-        result = collection.update_one(query, update_data.update)
+        result = await db.run(collection.update_one, query, update_data.update)
         return {"status": "success", "matched_count": result.matched_count, "modified_count": result.modified_count}
     except Exception as e:
         logger.error(f"更新数据库文档时出错: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/delete/documents/{db_name}/{collection_name}")
-async def delete_document(db_name: str, collection_name: str, query: dict = Body(...), db: MongoDBUtils = Depends(get_db)):
+async def delete_document(db_name: str, collection_name: str, query: dict = Body(...), db: AsyncMongoDBUtils = Depends(get_db)):
     """根据查询条件删除文档"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
@@ -137,7 +193,7 @@ async def delete_document(db_name: str, collection_name: str, query: dict = Body
     try:
         # 获取集合对象
         collection = db.client[db_name][collection_name]
-        result = collection.delete_one(query)
+        result = await db.run(collection.delete_one, query)
         return {"status": "success", "deleted_count": result.deleted_count}
     except Exception as e:
         logger.error(f"删除数据库文档时出错: {e}")
@@ -1,23 +1,47 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
+import json
+
+from fastapi import APIRouter, HTTPException, Body, Depends, Query
+from fastapi.responses import StreamingResponse
 from core.ace.secure import SecureInterface
 from pydantic import BaseModel
 from core.utils.logger import get_logger
 from core.db.elasticsearch_index_manager import ElasticsearchIndexManager
+from core.db.service_registry import service_registry
 
 logger = get_logger()
 router = APIRouter()
 
-# 依赖注入 ElasticsearchIndexManager 实例
+# 分页参数上限，避免单次请求拉取过多文档
+MAX_PAGE_SIZE = 1000
+
+# 依赖注入 ElasticsearchIndexManager 实例，底层复用服务注册表中的共享连接池
 async def get_es():
-    es = ElasticsearchIndexManager()
-    try:
-        yield es
-    finally:
-        pass  # Elasticsearch 连接不需要手动关闭
+    yield service_registry.get_es_manager()
 
 class UpdateDocumentModel(BaseModel):
     update: dict
 
+
+def _parse_source(source):
+    """将逗号分隔的字段列表转换为 _source 过滤"""
+    if not source:
+        return None
+    return [field.strip() for field in source.split(",") if field.strip()]
+
+
+def _format_hit(hit):
+    """保留文档ID、所在的具体索引、路由值和内容，别名滚动后更新或删除旧索引中的文档需要用到 _index 与 _routing"""
+    formatted = {"_id": hit.get("_id"), "_index": hit.get("_index"), **hit.get("_source", {})}
+    if hit.get("_routing") is not None:
+        formatted["_routing"] = hit["_routing"]
+    return formatted
+
+
+def _ndjson_stream(es, index_name, size, source):
+    """按 point-in-time + search_after 逐页读取并写成 NDJSON，服务端只保留当前一页"""
+    for hit in es.iterate_documents(index_name, source=source, page_size=size):
+        yield json.dumps(_format_hit(hit), ensure_ascii=False, default=str) + "\n"
+
 @router.get("/indices")
 async def get_all_indices(es: ElasticsearchIndexManager = Depends(get_es)):
     """获取所有索引名称"""
@@ -50,31 +74,44 @@ async def get_index_mapping(index_name: str, es: ElasticsearchIndexManager = Dep
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/documents/{index_name}")
-async def get_all_documents(index_name: str, es: ElasticsearchIndexManager = Depends(get_es)):
-    """获取指定索引中的所有文档"""
+async def get_all_documents(index_name: str,
+                            size: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                            search_after: str = Query(None, description="上一页返回的 next_search_after（JSON 数组）"),
+                            pit_id: str = Query(None, description="上一页返回的 pit_id，与 search_after 一起传入"),
+                            source: str = Query(None),
+                            stream: bool = Query(False),
+                            es: ElasticsearchIndexManager = Depends(get_es)):
+    """分页获取指定索引中的文档，stream=true 时以 NDJSON 流式返回"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        # 使用 match_all 查询获取所有文档
-        query = {"query": {"match_all": {}}}
-        documents = es.search(index_name, query)
-        return {"status": "success", "documents": documents}
+        fields = _parse_source(source)
+        if stream:
+            return StreamingResponse(_ndjson_stream(es, index_name, size, fields), media_type="application/x-ndjson")
+
+        cursor = json.loads(search_after) if search_after else None
+        hits, next_search_after, next_pit_id = es.search_page(index_name, size=size, search_after=cursor,
+                                                              source=fields, pit_id=pit_id)
+        documents = [_format_hit(hit) for hit in hits]
+        return {"status": "success", "documents": documents, "next_search_after": next_search_after,
+                "pit_id": next_pit_id}
     except Exception as e:
         logger.error(f"获取文档列表时出错: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/documents/{index_name}")
-async def insert_document(index_name: str, document: dict = Body(...), es: ElasticsearchIndexManager = Depends(get_es)):
-    """向指定索引中插入文档"""
+async def insert_document(index_name: str, document: dict = Body(...), routing: str = Query(None),
+                          es: ElasticsearchIndexManager = Depends(get_es)):
+    """向指定索引中插入文档，未指定 routing 时按文档中的 group_id 路由"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
         # 使用 Elasticsearch 的 index API 插入文档
-        result = es.es.index(index=index_name, body=document)  # 直接使用 es.es
+        result = es.es.index(index=index_name, body=document, routing=routing or document.get("group_id"))  # 直接使用 es.es
         return {"status": "success", "inserted_id": result["_id"]}
     except Exception as e:
         logger.error(f"插入文档时出错: {e}")
@@ -88,7 +125,7 @@ async def find_document(index_name: str, query: dict = Body(...), es: Elasticsea
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        documents = es.search(index_name, query)
+        documents = es.search(index_name, query, with_ids=True)
         if documents:
             return {"status": "success", "documents": documents}
         else:
@@ -98,29 +135,31 @@ async def find_document(index_name: str, query: dict = Body(...), es: Elasticsea
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/documents/{index_name}/update/{document_id}")
-async def update_document(index_name: str, document_id: str, update_data: UpdateDocumentModel = Body(...), es: ElasticsearchIndexManager = Depends(get_es)):
-    """根据文档ID更新文档"""
+async def update_document(index_name: str, document_id: str, update_data: UpdateDocumentModel = Body(...),
+                          routing: str = Query(None), es: ElasticsearchIndexManager = Depends(get_es)):
+    """根据文档ID更新文档，别名下的旧文档需传入列表中返回的 _index 作为 index_name，并传入 _routing"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
         # 使用 Elasticsearch 的 update API 更新文档
-        result = es.es.update(index=index_name, id=document_id, body=update_data.update) # 直接使用 es.es
+        result = es.es.update(index=index_name, id=document_id, body=update_data.update, routing=routing) # 直接使用 es.es
         return {"status": "success", "result": result}
     except Exception as e:
         logger.error(f"更新文档时出错: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/documents/{index_name}/delete/{document_id}")
-async def delete_document(index_name: str, document_id: str, es: ElasticsearchIndexManager = Depends(get_es)):
-    """根据文档ID删除文档"""
+async def delete_document(index_name: str, document_id: str, routing: str = Query(None),
+                          es: ElasticsearchIndexManager = Depends(get_es)):
+    """根据文档ID删除文档，别名下的旧文档需传入列表中返回的 _index 作为 index_name，并传入 _routing"""
     secure_interface = SecureInterface()
     if not secure_interface.verify_request():
         return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
 
     try:
-        success = es.delete_document(index_name, document_id)
+        success = es.delete_document(index_name, document_id, routing)
         if success:
             return {"status": "success", "message": f"文档 '{document_id}' 已删除"}
         else:
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, HTTPException
+from core.ace.secure import SecureInterface
+from core.utils.logger import get_logger
+from core.llm.response_cache import ResponseCache
+from core.llm.llm_stats import LLMStatsReporter
+
+logger = get_logger()
+router = APIRouter()
+
+TELEMETRY_DIMENSIONS = ("group", "call_site", "model")
+TELEMETRY_SORT_FIELDS = ("cost", "calls", "errors", "retries", "prompt_tokens", "completion_tokens",
+                         "latency_avg", "latency_p50", "latency_p95", "latency_max", "ttft_avg")
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """获取 LLM 响应缓存的命中统计"""
+    secure_interface = SecureInterface()
+    if not secure_interface.verify_request():
+        return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
+
+    try:
+        stats = ResponseCache.read_stats()
+        return {"status": "success", "stats": stats}
+    except Exception as e:
+        logger.error(f"获取 LLM 缓存统计时出错: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def get_llm_stats():
+    """获取 LLM 调用链路的运行指标（准入排队、重试熔断、请求合并、路由、遥测）"""
+    secure_interface = SecureInterface()
+    if not secure_interface.verify_request():
+        return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
+
+    try:
+        stats = LLMStatsReporter.read_snapshot()
+        return {"status": "success", "stats": stats}
+    except Exception as e:
+        logger.error(f"获取 LLM 运行指标时出错: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/telemetry")
+async def get_llm_telemetry(by: str = "group", sort: str = "cost", limit: int = 20):
+    """
+    获取 LLM 调用遥测汇总，按指定维度排序，用于定位消耗最多或最慢的群组、调用点与模型
+
+    参数:
+        by (str): 汇总维度，group、call_site 或 model
+        sort (str): 排序字段，例如 cost、calls、prompt_tokens、latency_avg、latency_p95
+        limit (int): 返回的条目数
+    """
+    secure_interface = SecureInterface()
+    if not secure_interface.verify_request():
+        return {"status": "error", "message": "验证码错误或已过期或者已经拒绝此请求"}
+
+    if by not in TELEMETRY_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的汇总维度: {by}")
+    if sort not in TELEMETRY_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort}")
+
+    try:
+        telemetry = LLMStatsReporter.read_snapshot().get("telemetry", {})
+        rows = [{"key": key} | rollup for key, rollup in telemetry.get(by, {}).items()]
+        rows.sort(key=lambda row: row.get(sort) or 0, reverse=True)
+        return {"status": "success", "totals": telemetry.get("totals", {}), "by": by, "items": rows[:max(limit, 0)]}
+    except Exception as e:
+        logger.error(f"获取 LLM 调用遥测时出错: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
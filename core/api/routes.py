@@ -1,5 +1,5 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from core.api.controllers import plugin_controller, configs_controller, db_controller, es_controller
+from core.api.controllers import plugin_controller, configs_controller, db_controller, es_controller, llm_controller
 from core.api.websocket_manager import websocket_manager
 from core.utils.logger import get_logger
 import asyncio
@@ -12,6 +12,7 @@ router.include_router(plugin_controller.router, prefix="/plugins", tags=["plugin
 router.include_router(configs_controller.router, prefix="/configs", tags=["configs"])
 router.include_router(db_controller.router, prefix="/db", tags=["db"])
 router.include_router(es_controller.router, prefix="/es", tags=["es"])
+router.include_router(llm_controller.router, prefix="/llm", tags=["llm"])
 
 # WebSocket日志推送
 @router.websocket("/ws/logs")
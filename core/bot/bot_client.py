@@ -23,7 +23,7 @@ from core.utils.user_management import load_user_names
 # utils.py模块 - <工具模块化文件>
 from core.utils.utils import load_system_prompt
 # config.py模块 - <配置管理模块化文件>
-from config import SYSTEM_PROMPT_FILE, test_config
+from config import SYSTEM_PROMPT_FILE, MEMORY_COMPACTION_ENABLED, CHANGE_STREAM_ENABLED, test_config
 # file_handler.py模块 - <文件处理模块化文件>
 from core.utils.file_handler import ConfigFileHandler
 # logger.py模块 - <日志记录模块>
@@ -36,6 +36,12 @@ from core.memory.memory_manager import MemoryManager
 from core.keep_alive import keep_alive
 # llm_client.py模块 - <LLM客户端模块化文件>
 from core.llm.llm_factory import LLMFactory
+# service_registry.py模块 - <共享数据库连接池>
+from core.db.service_registry import service_registry
+# change_stream_watcher.py模块 - <多实例缓存同步>
+from core.db.change_stream_watcher import ChangeStreamWatcher
+from core.llm.llm_stats import llm_stats
+from core.utils.tokenizer import token_counter
 
 _log = get_logger()
 
@@ -59,15 +65,15 @@ class MyClient(botpy.Client):
         self.plugin_manager = PluginManager(self)
 
         # 初始化 LLM 客户端
-        llm_factory = LLMFactory()
-        self.llm_client = llm_factory.create_llm_client()
+        self.llm_factory = LLMFactory()
+        self.llm_client = self.llm_factory.create_llm_client()
 
         # 加载插件
         self.plugin_manager.register_plugins()
 
         self.pending_users = {}
         self.system_prompt = load_system_prompt(SYSTEM_PROMPT_FILE)
-        self.memory_manager = MemoryManager()
+        self.memory_manager = MemoryManager(self.llm_client)
         self.message_handler = MessageHandler(self, self.memory_manager)
 
         # 读取配置
@@ -90,10 +96,6 @@ class MyClient(botpy.Client):
             raise ValueError("Admin ID is missing in config.yaml")
 
 
-        # 初始化 last_request_time 和 last_request_content
-        self.last_request_time = 0
-        self.last_request_content = None
-
         # 设置文件监视器
         self.observer = watchdog.observers.Observer()
         event_handler = ConfigFileHandler(self)
@@ -132,11 +134,31 @@ class MyClient(botpy.Client):
         _log.info(f">>> ROBOT 「{self.robot.name}」 IS READY!")
         load_user_names()
 
+        # 在工作线程中预加载 Token 计数所需的词表，之后的计数不再触发 I/O
+        await token_counter.preload()
+
+        # 确保 MongoDB 索引存在
+        _log.info(">>> DB INDEX CHECKING...")
+        await self.memory_manager.mongo.ensure_indexes()
+        await self.memory_manager.es_manager.bootstrap_indices()
+
         # 加载记忆
         _log.info(">>> MEMORY LOADING...")
         await self.memory_manager.load_memory()
         _log.info("   ↳ 记忆加载完成")
 
+        # 启动记忆压缩任务
+        if MEMORY_COMPACTION_ENABLED:
+            self.compaction_task = asyncio.create_task(self.memory_manager.compactor.run_forever())
+
+        # 启动变更流监听，同步其他实例写入的消息与用户
+        if CHANGE_STREAM_ENABLED:
+            self.change_stream_watcher = ChangeStreamWatcher(self.memory_manager)
+            self.change_stream_watcher.start(asyncio.get_running_loop())
+
+        # 定期写入 LLM 调用指标快照，供管理 API 读取
+        llm_stats.start()
+
         # 启动 Keep-Alive 任务
         await asyncio.create_task(keep_alive(self.openai_api_url, self.openai_secret))
 
@@ -176,6 +198,11 @@ class MyClient(botpy.Client):
 
         self.observer.stop()
         self.observer.join()
+        if getattr(self, "change_stream_watcher", None):
+            self.change_stream_watcher.stop()
+        await service_registry.aclose()
+        llm_stats.stop()
+        await self.llm_factory.aclose()
 
         _log.info(">>> BOT RESTART COMMAND RECEIVED, SHUTTING DOWN...")
 
@@ -184,6 +211,29 @@ class MyClient(botpy.Client):
 
         sys.exit()
 
+    async def check_db_indexes(self, group_id, msg_id):
+        """
+        自检 MongoDB 热点查询是否命中索引
+
+        参数:
+            group_id (str): 群组ID
+            msg_id (str): 消息ID
+        """
+        _log.info(">>> DB INDEX SELF-CHECK...")
+        report = await self.memory_manager.mongo.check_query_plans()
+        lines = []
+        for item in report:
+            if "error" in item:
+                lines.append(f"{item['query']}: 检查失败 ({item['error']})")
+            else:
+                status = "⚠️COLLSCAN" if item["collscan"] else "OK"
+                lines.append(f"{item['query']}: {status}")
+        await self.api.post_group_message(
+            group_openid=group_id,
+            content="索引自检结果：\n" + "\n".join(lines),
+            msg_id=msg_id
+        )
+
     async def hot_reload(self, group_id, msg_id):
         """
         热重载系统
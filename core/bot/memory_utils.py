@@ -13,43 +13,26 @@ from core.utils.logger import get_logger
 
 _log = get_logger()
 
-async def manage_memory_insertion(memory_manager, group_id, cleaned_content, context, user_message):
+async def retrieve_prompt_memories(memory_manager, group_id, cleaned_content):
     """
-    检查是否需要插入记忆，并在需要时进行插入。插入位置为用户消息之后。
+    检索本轮需要放入上下文的长期记忆。记忆由 PromptAssembler 统一放在上下文末尾，
+    不再插入到历史中间，以免破坏提供商侧的前缀缓存。
 
     参数:
         memory_manager (MemoryManager): 记忆管理器实例
         group_id (str): 群组的唯一标识符
         cleaned_content (str): 用户发送的消息内容
-        context (list): 当前上下文消息列表
-        user_message (str): 用户的原始消息
 
     返回:
-        list: 可能更新后的上下文消息列表
+        list[str]: 检索到的记忆内容，没有时为空列表
     """
     memory_to_insert = await memory_manager.retrieve_memory(group_id, cleaned_content)
     if memory_to_insert:
-        memory_content = memory_to_insert['content']
-        memory_insertion = f"{user_message}\n---\n<在数据库查找到的你的长期记忆，请谨慎使用：{memory_content}>"
-
-        # 查找最后一个用户消息的位置，将记忆插入到其后
-        inserted = False
-        for i in range(len(context) - 1, -1, -1):
-            if context[i]['role'] == 'user' and context[i]['content'] == user_message:
-                context.insert(i + 1, {"role": "user", "content": memory_insertion})
-                inserted = True
-                _log.info(">>> 记忆已插入到用户消息之后")
-                break
-
-        # 如果没有找到匹配的用户消息，默认追加到上下文末尾
-        if not inserted:
-            context.append({"role": "user", "content": memory_insertion})
-            _log.info(">>> 未找到匹配的用户消息，记忆已追加到上下文末尾")
-
-    else:
-        _log.info(">>> 没有找到需要插入的记忆内容")
+        _log.info(">>> 已检索到需要放入上下文的记忆")
+        return [memory_to_insert['content']]
 
-    return context
+    _log.info(">>> 没有找到需要插入的记忆内容")
+    return []
 
 
 
@@ -108,7 +91,7 @@ async def process_reply_content(memory_manager, group_id, message, reply_content
     memory_content = extract_memory_content(reply_content)
     if memory_content:
         _log.debug(f">>> 存储新的记忆内容: {memory_content}")
-        await memory_manager.store_memory(group_id, message, "assistant", memory_content)
+        await memory_manager.store_memory(group_id, message, "assistant", memory_content, importance=2.0)
 
         # 清除回复内容中的<memory>标记
         reply_content = reply_content.replace(f"<memory>{memory_content}</memory>", "")
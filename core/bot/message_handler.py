@@ -15,19 +15,18 @@ from botpy.message import GroupMessage
 from botpy.types.message import Reference
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from config import MAX_CONTEXT_TOKENS
 
-from core.bot.memory_utils import process_reply_content, handle_long_term_memory, manage_memory_insertion
+from core.bot.memory_utils import process_reply_content, handle_long_term_memory, retrieve_prompt_memories
 # user_registration.py模块 - <处理新用户注册>
 from core.bot.user_registration import handle_new_user_registration
-# elasticsearch_index_manager.py模块 - <用于与Elasticsearch交互>
-from core.db.elasticsearch_index_manager import ElasticsearchIndexManager
 # logger.py模块 - <日志记录模块>
 from core.utils.logger import get_logger
 # user_management.py模块 - <用于用户内容清理、用户名获取、用户注册检查及新增用户处理>
 from core.utils.user_management import clean_content, get_user_name, is_user_registered
 # utils.py模块 - <从回复消息中提取记忆内容>
 from core.utils.utils import calculate_token_count
+from core.llm.call_context import set_current_group
+from core.llm.prompt_assembler import prompt_assembler
 # ace.py模块 - <安全性检查>
 from core.ace.ace import ACE
 
@@ -49,7 +48,7 @@ class MessageHandler:
         """
         self.client = client
         self.memory_manager = memory_manager
-        self.es_manager = ElasticsearchIndexManager()  # 初始化Elasticsearch管理器
+        self.es_manager = memory_manager.es_manager  # 复用记忆管理器的Elasticsearch管理器
         self.message_queues = {}  # 每个群组一个消息队列
         self.locks = {}  # 每个群组一个锁
         self.processed_messages: set[int] = set()   # 记录已经处理过的消息ID
@@ -129,6 +128,8 @@ class MessageHandler:
     async def process_message_queue(self, group_id):
         async with self.locks[group_id]:  # 确保同一时间只有一个任务在处理该群组的消息
             _log.debug(f"<PROCESS> 开始处理群组 {group_id} 的消息队列...")
+            # 之后发起的 LLM 调用都归属于该群组，用于准入控制的公平排队
+            set_current_group(group_id)
             while not self.message_queues[group_id].empty():
                 user_name, cleaned_content, message = await self.message_queues[group_id].get()
 
@@ -151,29 +152,25 @@ class MessageHandler:
                                                                        cleaned_content)
 
                     _log.debug(f"<COMPRESS> 正在压缩群组 {group_id} 的消息历史...")
-                    context = await self.memory_manager.compress_memory(group_id, self.client.get_gpt_response)
+                    context = await self.memory_manager.compress_memory(group_id)
 
                     # 初始化 formatted_message 变量
                     formatted_message = f"{user_name}: {cleaned_content}"
 
                     # 判断消息是否与上下文相似
+                    memories = []
                     if self.is_similar_to_context(cleaned_content, context):
                         _log.info(f"消息与上下文相似，跳过主动记忆调用。")
                     else:
-                        # 将用户消息添加到历史记录中
+                        # 将用户消息添加到历史记录中，并写入当月的对话分区
                         _log.debug(f"<HISTORY> 添加消息到历史记录: {formatted_message}")
-                        self.memory_manager.add_message_to_history(group_id,
-                                                                   {"role": "user", "content": formatted_message})
-                        context = await manage_memory_insertion(self.memory_manager, group_id, cleaned_content, context,
-                                                                formatted_message)
-
-                    # 动态消息队列长度调整 - 基于Token计数
-                    current_token_count = calculate_token_count(context)
-                    _log.debug(f"<TOKENS> 当前Token计数: {current_token_count}")
-                    while current_token_count > MAX_CONTEXT_TOKENS:
-                        context = context[1:]  # 移除最早的一条消息
-                        current_token_count = calculate_token_count(context)
-                        _log.debug(f"<TOKENS> 移除最早消息后Token计数: {current_token_count}")
+                        await self.memory_manager.record_conversation(group_id,
+                                                                      {"role": "user", "content": formatted_message})
+                        memories = await retrieve_prompt_memories(self.memory_manager, group_id, cleaned_content)
+
+                    # 按固定布局组装上下文（摘要 → 历史 → 记忆），超出 Token 上限时由组装器裁剪
+                    context = prompt_assembler.assemble(group_id, self.client.system_prompt, context, memories)
+                    _log.debug(f"<TOKENS> 当前Token计数: {calculate_token_count(context)}")
 
                     # 在获取 LLM 回复之前，发布事件以允许插件进行处理
                     await self.client.plugin_manager.event_bus.publish("before_llm_response", context,
@@ -227,11 +224,12 @@ class MessageHandler:
                         message_reference=message_reference
                     )
 
-                    # 将用户消息和机器人的回复存储到数据库
-                    _log.debug(">>> 存储用户消息到数据库...")
-                    await self.memory_manager.store_memory(group_id, message, "user", formatted_message)
-                    _log.debug(">>> 存储机器人回复到数据库...")
-                    await self.memory_manager.store_memory(group_id, message, "assistant", reply_content)
+                    # 将用户消息和机器人的回复一次批量存储到数据库
+                    _log.debug(">>> 存储用户消息与机器人回复到数据库...")
+                    await self.memory_manager.store_memories(group_id, message, [
+                        {"role": "user", "content": formatted_message},
+                        {"role": "assistant", "content": reply_content}
+                    ])
 
                 except Exception as e:
                     _log.error(f"<ERROR> 🚨处理群组 {group_id} 的消息时出错:")
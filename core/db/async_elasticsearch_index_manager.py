@@ -0,0 +1,394 @@
+"""
+AmyAlmond Project - core/db/async_elasticsearch_index_manager.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+async_elasticsearch_index_manager.py - 基于 AsyncElasticsearch 的索引管理器，供记忆读写等事件循环中的调用使用
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from elasticsearch import ApiError, TransportError
+from elasticsearch.helpers import async_bulk, async_scan, BulkIndexError
+from config import ELASTICSEARCH_URL, ELASTICSEARCH_PAGE_SIZE, ELASTICSEARCH_PIT_KEEP_ALIVE
+from core.db.elasticsearch_index_manager import build_bulk_actions, is_index_not_found
+from core.db.search_batcher import SearchBatcher
+from core.db.service_registry import service_registry
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class AsyncElasticsearchIndexManager:
+    """
+    ElasticsearchIndexManager 的异步版本，方法名与返回值保持一致，但全部可 await。
+
+    HTTP 请求在事件循环上并发进行，多个群组的检索与写入可以重叠等待，而不是依次阻塞事件循环。
+    """
+
+    def __init__(self, es=None):
+        """
+        参数:
+            es (AsyncElasticsearch): 使用的客户端，默认取服务注册表中的共享异步客户端
+        """
+        self.es = es or service_registry.get_async_es_client()
+        # 已确认存在的索引，只有在请求返回 index_not_found 时才会移除
+        self._known_indices = set()
+        # 合并不同群组同时发起的检索
+        self._batcher = SearchBatcher(self.es)
+        _log.info("<ELASTICSEARCH> 已初始化异步Elasticsearch管理器:")
+        _log.info(f"   ↳ URL: {ELASTICSEARCH_URL}")
+
+    async def _index_exists(self, index_name):
+        """
+        检查索引是否存在，结果缓存在内存中，避免每次读写前都多一次请求
+        """
+        if index_name in self._known_indices:
+            return True
+        if await self.es.indices.exists(index=index_name):
+            self._known_indices.add(index_name)
+            return True
+        return False
+
+    def _forget_index(self, index_name, error):
+        """
+        请求返回 index_not_found 时使该索引的缓存失效
+
+        返回:
+            bool: 错误是否为索引不存在
+        """
+        if not is_index_not_found(error):
+            return False
+        self._known_indices.discard(index_name)
+        _log.warning(f"<INDEX> 索引 '{index_name}' 不存在，已清除存在性缓存")
+        return True
+
+    async def bootstrap_indices(self):
+        """
+        写入索引模板并确保按月滚动的别名存在，然后预热存在性缓存，在启动时调用一次。
+        模板与别名管理很少执行，直接复用同步管理器的实现。
+
+        返回:
+            list: 已确保存在的别名
+        """
+        ensured = await asyncio.to_thread(service_registry.get_es_manager().bootstrap_indices)
+        self._known_indices.update(ensured)
+        return ensured
+
+    async def rollover_indices(self):
+        """
+        对所有按月滚动的别名执行滚动检查，复用同步管理器的实现
+
+        返回:
+            list: 发生了滚动的别名
+        """
+        return await asyncio.to_thread(service_registry.get_es_manager().rollover_indices)
+
+    async def create_index(self, index_name, settings=None, mappings=None):
+        """
+        创建Elasticsearch索引
+        """
+        try:
+            body = {}
+            if settings:
+                body['settings'] = settings
+            if mappings:
+                body['mappings'] = mappings
+
+            if not await self.es.indices.exists(index=index_name):
+                await self.es.indices.create(index=index_name, body=body)
+                self._known_indices.add(index_name)
+                _log.info("<INDEX> 成功创建Elasticsearch索引:")
+                _log.info(f"   ↳ 索引名称: {index_name}")
+                return True
+            _log.warning("<INDEX> 索引已存在，跳过创建:")
+            _log.warning(f"   ↳ 索引名称: {index_name}")
+            return False
+        except (ApiError, TransportError) as e:
+            _log.error("<ERROR> 创建索引时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return False
+
+    async def delete_document(self, index_name, document_id, routing=None):
+        """
+        从Elasticsearch索引中删除文档
+        """
+        try:
+            await self.es.delete(index=index_name, id=document_id, routing=routing)
+            _log.info("<ELASTICSEARCH> 成功删除文档:")
+            _log.info(f"   ↳ 索引名称: {index_name}")
+            _log.info(f"   ↳ 文档ID: {document_id}")
+            return True
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                _log.warning(f"<ELASTICSEARCH> 索引 '{index_name}' 不存在，无法删除文档")
+                return False
+            _log.error("<ERROR> 删除文档时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 文档ID: {document_id}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return False
+
+    async def bulk_insert(self, index_name, data):
+        """
+        使用 async_bulk 批量插入数据到Elasticsearch索引中
+        """
+        try:
+            if not await self._index_exists(index_name):
+                _log.error("<ERROR> 索引不存在，无法插入数据:")
+                _log.error(f"   ↳ 索引名称: {index_name}")
+                return False
+
+            actions = build_bulk_actions(index_name, data)
+            _log.debug(f"<BULK INSERT> 尝试插入的数据: {actions}")
+
+            success, _ = await async_bulk(self.es, actions)
+            _log.info("<BULK INSERT> 成功插入数据:")
+            _log.info(f"   ↳ 插入数量: {success} 条记录")
+            _log.info(f"   ↳ 目标索引: {index_name}")
+            return True
+        except BulkIndexError as e:
+            self._forget_index(index_name, e)
+            _log.error("<ERROR> 批量插入数据时出错:")
+            _log.error(f"   ↳ 错误详情: {e.errors}")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            return False
+        except (ApiError, TransportError) as e:
+            self._forget_index(index_name, e)
+            _log.error("<ERROR> 批量插入数据时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return False
+
+    async def search(self, index_name, query, with_ids=False, routing=None, batched=False):
+        """
+        在Elasticsearch索引中执行搜索查询，只发送一次请求，索引不存在时返回空列表
+
+        参数:
+            index_name (str): 索引名称
+            query (dict): 查询体
+            with_ids (bool): 是否在返回的文档中附带 `_id` 与 `_index` 字段
+            routing (str): 路由值（群组ID），指定后只查询该群组所在的分片
+            batched (bool): 是否与其他协程同时发起的检索合并为一次 _msearch
+        """
+        try:
+            if batched:
+                result = await self._batcher.search(index_name, query, routing)
+                if "error" in result:
+                    if not self._forget_index(index_name, result["error"]):
+                        _log.error("<ERROR> 搜索索引时出错:")
+                        _log.error(f"   ↳ 索引名称: {index_name}")
+                        _log.error(f"   ↳ 错误详情: {result['error']}")
+                    return []
+            else:
+                result = await self.es.search(index=index_name, body=query, routing=routing)
+            hits = result.get("hits", {}).get("hits", [])
+            _log.info("<SEARCH> 搜索成功:")
+            _log.info(f"   ↳ 索引名称: {index_name}")
+            _log.info(f"   ↳ 记录数: {len(hits)} 条")
+            _log.debug(f"   ↳ 搜索结果: {hits}")
+            if with_ids:
+                return [dict(hit.get("_source", {}), _id=hit.get("_id"), _index=hit.get("_index")) for hit in hits]
+            return [hit.get("_source", {}) for hit in hits]
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                return []
+            _log.error("<ERROR> 搜索索引时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return []
+
+    async def search_page(self, index_name, query=None, size=100, search_after=None, source=None, pit_id=None,
+                          keep_alive=ELASTICSEARCH_PIT_KEEP_ALIVE):
+        """
+        使用 point-in-time + search_after 分页读取索引中的文档，按 timestamp 升序排列，同一时间戳按 _shard_doc 排序
+
+        返回:
+            tuple: (hits 列表, 下一页游标, PIT ID)，没有更多数据时游标与 PIT ID 均为 None
+        """
+        try:
+            if not pit_id:
+                pit_id = (await self.es.open_point_in_time(index=index_name, keep_alive=keep_alive))["id"]
+            params = {
+                "pit": {"id": pit_id, "keep_alive": keep_alive},
+                "query": query or {"match_all": {}},
+                "size": size,
+                "sort": [{"timestamp": {"order": "asc", "unmapped_type": "date"}}, {"_shard_doc": "asc"}],
+            }
+            if search_after:
+                params["search_after"] = search_after
+            if source is not None:
+                params["_source"] = source
+            result = await self.es.search(**params)
+            pit_id = result.get("pit_id", pit_id)
+            hits = result.get("hits", {}).get("hits", [])
+            if len(hits) == size:
+                return hits, hits[-1]["sort"], pit_id
+            await self._close_point_in_time(pit_id)
+            return hits, None, None
+        except (ApiError, TransportError) as e:
+            await self._close_point_in_time(pit_id)
+            if self._forget_index(index_name, e):
+                return [], None, None
+            _log.error("<ERROR> 分页读取索引时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return [], None, None
+
+    async def _close_point_in_time(self, pit_id):
+        """
+        关闭 point-in-time，失败时只记录警告
+        """
+        if not pit_id:
+            return
+        try:
+            await self.es.close_point_in_time(id=pit_id)
+        except (ApiError, TransportError) as e:
+            _log.warning(f"<ELASTICSEARCH> 关闭 point-in-time 失败: {e}")
+
+    async def iterate_documents(self, index_name, query=None, source=None, page_size=ELASTICSEARCH_PAGE_SIZE, sort=None,
+                                keep_alive=ELASTICSEARCH_PIT_KEEP_ALIVE):
+        """
+        使用 point-in-time + search_after 遍历索引中的全部文档，内存中只保留当前一页，读取期间看到的是一致的快照
+
+        参数:
+            index_name (str): 索引名称或别名
+            query (dict): 查询条件（query 子句），默认 match_all
+            source (list): 需要返回的 `_source` 字段
+            page_size (int): 每页文档数
+            sort (list): 排序方式，默认按分片内文档顺序（最快）
+            keep_alive (str): 每页之间 PIT 的保活时间
+
+        返回:
+            async generator: 逐条产出 hit（包含 `_id`、`_index` 与 `_source`）
+        """
+        pit_id = None
+        try:
+            pit_id = (await self.es.open_point_in_time(index=index_name, keep_alive=keep_alive))["id"]
+            search_after = None
+            while True:
+                params = {
+                    "pit": {"id": pit_id, "keep_alive": keep_alive},
+                    "query": query or {"match_all": {}},
+                    "size": page_size,
+                    "sort": sort or [{"_shard_doc": "asc"}],
+                }
+                if search_after:
+                    params["search_after"] = search_after
+                if source is not None:
+                    params["_source"] = source
+                result = await self.es.search(**params)
+                pit_id = result.get("pit_id", pit_id)
+                hits = result.get("hits", {}).get("hits", [])
+                for hit in hits:
+                    yield hit
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]["sort"]
+        except (ApiError, TransportError) as e:
+            if not self._forget_index(index_name, e):
+                _log.error("<ERROR> 遍历索引时出错:")
+                _log.error(f"   ↳ 索引名称: {index_name}")
+                _log.error(f"   ↳ 错误详情: {e}")
+        finally:
+            await self._close_point_in_time(pit_id)
+
+    async def scan_documents(self, index_name, query=None, source=None, page_size=1000, routing=None):
+        """
+        逐批遍历索引中的文档
+
+        返回:
+            async generator: 逐条产出 hit（包含 `_id` 与 `_source`）
+        """
+        body = query or {"query": {"match_all": {}}}
+        try:
+            async for hit in async_scan(self.es, index=index_name, query=body, _source=source, size=page_size,
+                                        routing=routing):
+                yield hit
+        except (ApiError, TransportError) as e:
+            _log.error("<ERROR> 遍历索引时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+
+    async def delete_by_query(self, index_name, query, requests_per_second=None, routing=None):
+        """
+        按查询条件删除文档，可通过 requests_per_second 对删除进行限流
+
+        返回:
+            int: 删除的文档数
+        """
+        try:
+            result = await self.es.delete_by_query(
+                index=index_name,
+                query=query,
+                conflicts="proceed",
+                refresh=True,
+                requests_per_second=requests_per_second if requests_per_second else -1,
+                routing=routing
+            )
+            deleted = result.get("deleted", 0)
+            _log.info("<DELETE BY QUERY> 成功删除文档:")
+            _log.info(f"   ↳ 索引名称: {index_name}")
+            _log.info(f"   ↳ 删除数量: {deleted} 条记录")
+            return deleted
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                return 0
+            _log.error("<ERROR> 按查询删除文档时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return 0
+
+    async def record_retrieval(self, index_name, document_id, routing=None):
+        """
+        记录一次记忆被检索使用，累加 retrieval_count 并更新 last_retrieved
+
+        参数:
+            index_name (str): 文档所在的具体索引（别名指向多个索引时无法按ID更新）
+            document_id (str): 文档ID
+            routing (str): 文档的路由值（群组ID）
+        """
+        try:
+            await self.es.update(
+                index=index_name,
+                id=document_id,
+                routing=routing,
+                script={
+                    "source": "ctx._source.retrieval_count = (ctx._source.retrieval_count == null ? 0 : ctx._source.retrieval_count) + 1;"
+                              "ctx._source.last_retrieved = params.now",
+                    "params": {"now": datetime.now(timezone.utc).isoformat()}
+                },
+                retry_on_conflict=3
+            )
+            return True
+        except (ApiError, TransportError) as e:
+            self._forget_index(index_name, e)
+            _log.warning(f"<ELASTICSEARCH> 记录记忆检索次数失败: {e}")
+            return False
+
+    async def group_document_counts(self, index_name, field="group_id", size=1000):
+        """
+        统计每个群组在索引中的文档数量
+
+        返回:
+            dict: {group_id: 文档数}
+        """
+        try:
+            result = await self.es.search(
+                index=index_name,
+                size=0,
+                aggs={"groups": {"terms": {"field": field, "size": size}}}
+            )
+            buckets = result.get("aggregations", {}).get("groups", {}).get("buckets", [])
+            return {bucket["key"]: bucket["doc_count"] for bucket in buckets}
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                return {}
+            _log.error("<ERROR> 统计群组文档数量时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return {}
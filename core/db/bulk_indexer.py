@@ -0,0 +1,166 @@
+"""
+AmyAlmond Project - core/db/bulk_indexer.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+bulk_indexer.py - 后台批量写入 Elasticsearch，汇总所有群组的文档后按大小、数量或时间间隔统一刷新
+"""
+import asyncio
+import json
+import time
+
+from elasticsearch import ApiError, TransportError
+from elasticsearch.helpers import async_streaming_bulk
+
+from config import (ELASTICSEARCH_BULK_MAX_DOCS, ELASTICSEARCH_BULK_MAX_BYTES, ELASTICSEARCH_BULK_FLUSH_INTERVAL,
+                    ELASTICSEARCH_BULK_QUEUE_SIZE, ELASTICSEARCH_BULK_MAX_RETRIES)
+from core.db.elasticsearch_index_manager import build_bulk_actions
+from core.db.service_registry import service_registry
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class BulkIndexer:
+    """
+    后台批量写入器
+
+    写入方调用 enqueue() 只是把文档放入有界队列；后台任务在累计文档数达到 max_docs、字节数达到 max_bytes
+    或距离第一条文档超过 flush_interval 秒时，使用 async_streaming_bulk 一次性写入。
+    ES 返回 429 时按指数退避重试；队列写满时 enqueue() 会等待，从而对写入方形成背压。
+    """
+
+    def __init__(self, es=None, max_docs=ELASTICSEARCH_BULK_MAX_DOCS, max_bytes=ELASTICSEARCH_BULK_MAX_BYTES,
+                 flush_interval=ELASTICSEARCH_BULK_FLUSH_INTERVAL, queue_size=ELASTICSEARCH_BULK_QUEUE_SIZE,
+                 max_retries=ELASTICSEARCH_BULK_MAX_RETRIES):
+        """
+        参数:
+            es (AsyncElasticsearch): 使用的客户端，默认取服务注册表中的共享异步客户端
+            max_docs (int): 单次刷新的最大文档数
+            max_bytes (int): 单次刷新的最大字节数
+            flush_interval (float): 最长等待多少秒后刷新
+            queue_size (int): 等待写入的文档上限，超过后写入方等待
+            max_retries (int): 遇到 429 时的最大重试次数
+        """
+        self.es = es or service_registry.get_async_es_client()
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._task = None
+        self.last_flush = {}
+        self.totals = {"flushes": 0, "indexed": 0, "failed": 0, "bytes": 0}
+
+    def start(self):
+        """
+        启动后台刷新任务，已在运行时不做任何事
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, index_name, document):
+        """
+        把一条文档加入写入队列，队列已满时等待
+
+        参数:
+            index_name (str): 目标索引
+            document (dict): 文档内容，可包含 `_id`
+        """
+        self.start()
+        action = build_bulk_actions(index_name, [document])[0]
+        size = len(json.dumps(action["_source"], ensure_ascii=False, default=str).encode("utf-8"))
+        await self._queue.put((action, size))
+
+    async def close(self):
+        """
+        写入队列中剩余的文档并停止后台任务
+        """
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+
+    def stats(self):
+        """
+        获取写入统计
+
+        返回:
+            dict: 最近一次刷新的指标、累计指标与当前队列长度
+        """
+        return {"last_flush": self.last_flush, "totals": dict(self.totals), "queued": self._queue.qsize()}
+
+    async def _run(self):
+        """
+        后台任务主循环：收集一批文档后刷新，收到结束标记时写完最后一批退出
+        """
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch, batch_bytes = [item[0]], item[1]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_docs and batch_bytes < self.max_bytes:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item[0])
+                batch_bytes += item[1]
+            await self._flush(batch, batch_bytes)
+
+    async def _flush(self, batch, batch_bytes):
+        """
+        使用 async_streaming_bulk 写入一批文档并记录本次刷新的指标
+        """
+        started = time.perf_counter()
+        indexed = failed = 0
+        try:
+            async for ok, info in async_streaming_bulk(
+                    self.es, batch,
+                    chunk_size=self.max_docs,
+                    max_chunk_bytes=self.max_bytes,
+                    max_retries=self.max_retries,
+                    initial_backoff=1,
+                    max_backoff=30,
+                    raise_on_error=False,
+                    raise_on_exception=False):
+                if ok:
+                    indexed += 1
+                else:
+                    failed += 1
+                    _log.warning(f"<BULK INDEXER> 文档写入失败: {info}")
+        except (ApiError, TransportError) as e:
+            failed = len(batch) - indexed
+            _log.error("<BULK INDEXER> 批量写入时出错:")
+            _log.error(f"   ↳ 错误详情: {e}")
+
+        elapsed = time.perf_counter() - started
+        self.last_flush = {
+            "docs": len(batch),
+            "bytes": batch_bytes,
+            "indexed": indexed,
+            "failed": failed,
+            "seconds": round(elapsed, 3),
+            "docs_per_second": round(len(batch) / elapsed, 1) if elapsed else None,
+            "queued": self._queue.qsize(),
+        }
+        self.totals["flushes"] += 1
+        self.totals["indexed"] += indexed
+        self.totals["failed"] += failed
+        self.totals["bytes"] += batch_bytes
+        _log.info("<BULK INDEXER> 批量写入完成:")
+        _log.info(f"   ↳ 文档数: {len(batch)} ({batch_bytes} 字节)")
+        _log.info(f"   ↳ 成功/失败: {indexed}/{failed}")
+        _log.info(f"   ↳ 耗时: {elapsed:.3f} 秒，队列剩余: {self.last_flush['queued']}")
@@ -0,0 +1,170 @@
+"""
+AmyAlmond Project - core/db/change_stream_watcher.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+change_stream_watcher.py - 监听 MongoDB 变更流，把其他实例的写入同步到本进程的缓存（消息历史、用户名映射）
+
+注意：变更流需要 MongoDB 以副本集或分片集群方式运行。
+"""
+import os
+import threading
+import time
+
+from bson import json_util
+from pymongo import errors
+
+from config import INSTANCE_ID, CHANGE_STREAM_TOKEN_FILE
+from core.db.service_registry import service_registry
+from core.utils.logger import get_logger
+from core.utils.mongodb_utils import CONVERSATION_PARTITION_PREFIX
+from core.utils.user_management import set_user_name
+
+_log = get_logger()
+
+# 需要同步的集合，对话另外按月分区集合名匹配。消息历史只由对话插入驱动：
+# temp_memories 中的用户消息已写入对话分区，其余是本地历史不包含的回复与摘要，同步它们会让各实例的历史不一致
+WATCHED_COLLECTIONS = ["conversations", "users"]
+
+# 变更流历史已被覆盖，无法再通过 resume token 恢复
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class ChangeStreamWatcher:
+    """
+    在独立线程中消费 MongoDB 变更流，并在事件循环中把远端变更应用到进程内缓存。
+
+    每处理一个事件都会记录 resume token，断线重连时从该位置继续，不会丢失事件；
+    token 定期持久化到本地文件，进程重启后同样可以续接。
+    """
+
+    def __init__(self, memory_manager, save_interval=5):
+        """
+        参数:
+            memory_manager (MemoryManager): 持有消息历史缓存的记忆管理器
+            save_interval (int): resume token 持久化间隔（秒）
+        """
+        self.memory_manager = memory_manager
+        self.save_interval = save_interval
+        self.resume_token = self._load_resume_token()
+        self._loop = None
+        self._thread = None
+        self._stream = None
+        self._stopped = threading.Event()
+        self._last_saved = 0
+
+    def start(self, loop):
+        """
+        启动监听线程
+
+        参数:
+            loop (asyncio.AbstractEventLoop): 应用变更所在的事件循环
+        """
+        self._loop = loop
+        self._thread = threading.Thread(target=self._run, name="mongodb-change-stream", daemon=True)
+        self._thread.start()
+        _log.info(">>> CHANGE STREAM WATCHER STARTED")
+        _log.info(f"   ↳ 实例: {INSTANCE_ID}")
+        _log.info(f"   ↳ 集合: {WATCHED_COLLECTIONS}")
+
+    def stop(self):
+        """
+        停止监听并保存最新的 resume token
+        """
+        self._stopped.set()
+        if self._stream is not None:
+            self._stream.close()
+        self._save_resume_token(force=True)
+
+    def _run(self):
+        """
+        监听线程主循环，出错后按指数退避重连
+        """
+        db = service_registry.get_mongo_client()["amyalmond"]
+        message_collections = [coll for coll in WATCHED_COLLECTIONS if coll != "users"]
+        # 对话只同步新插入的文档：之后的更新（记忆压缩、归档等）不是新消息，
+        # 再次追加会在远端实例的历史中产生重复；用户昵称则需要同步更新与替换
+        pipeline = [{"$match": {"$or": [
+            {
+                "$or": [
+                    {"ns.coll": {"$in": message_collections}},
+                    {"ns.coll": {"$regex": f"^{CONVERSATION_PARTITION_PREFIX}\\d{{6}}$"}}
+                ],
+                "operationType": "insert"
+            },
+            {"ns.coll": "users", "operationType": {"$in": ["insert", "update", "replace"]}}
+        ]}}]
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                with db.watch(pipeline, full_document="updateLookup", resume_after=self.resume_token) as stream:
+                    self._stream = stream
+                    backoff = 1
+                    for change in stream:
+                        self._handle_change(change)
+                        self.resume_token = stream.resume_token
+                        self._save_resume_token()
+                        if self._stopped.is_set():
+                            break
+            except errors.OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    _log.warning("<CHANGE STREAM> resume token 已失效，从当前位置重新开始监听")
+                    self.resume_token = None
+                    continue
+                _log.error(f"<CHANGE STREAM> 变更流出错: {e}")
+            except errors.PyMongoError as e:
+                if self._stopped.is_set():
+                    break
+                _log.error(f"<CHANGE STREAM> 变更流连接中断，{backoff} 秒后重连: {e}")
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _handle_change(self, change):
+        """
+        过滤本实例的写入，把远端变更交给事件循环处理
+        """
+        document = change.get("fullDocument")
+        if not document or document.get("origin") == INSTANCE_ID or document.get("migrated"):
+            return
+        collection = change["ns"]["coll"]
+        self._loop.call_soon_threadsafe(self._apply_change, collection, document)
+
+    def _apply_change(self, collection, document):
+        """
+        在事件循环线程中把远端变更写入进程内缓存
+        """
+        group_id = document.get("group_id")
+        if collection.startswith("conversations") and group_id:
+            self.memory_manager.add_message_to_history(group_id, document.get("message", {}))
+        elif collection == "users" and document.get("user_id") and document.get("nickname"):
+            set_user_name(document["user_id"], document["nickname"])
+        _log.debug(f"<CHANGE STREAM> 已同步远端变更: {collection} ({document.get('origin')})")
+
+    def _load_resume_token(self):
+        """
+        读取上次保存的 resume token
+        """
+        try:
+            with open(CHANGE_STREAM_TOKEN_FILE, "r", encoding="utf-8") as f:
+                data = json_util.loads(f.read())
+            if data.get("instance_id") == INSTANCE_ID:
+                return data.get("resume_token")
+        except (FileNotFoundError, ValueError):
+            pass
+        return None
+
+    def _save_resume_token(self, force=False):
+        """
+        按 save_interval 节流保存 resume token
+        """
+        now = time.monotonic()
+        if self.resume_token is None or (not force and now - self._last_saved < self.save_interval):
+            return
+        self._last_saved = now
+        tmp_file = f"{CHANGE_STREAM_TOKEN_FILE}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(json_util.dumps({"instance_id": INSTANCE_ID, "resume_token": self.resume_token}))
+        os.replace(tmp_file, CHANGE_STREAM_TOKEN_FILE)
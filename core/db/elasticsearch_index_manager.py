@@ -11,29 +11,104 @@ elasticsearch_index_manager.py - 负责Elasticsearch索引的创建、更新和
 import uuid
 from datetime import datetime, timezone
 
-from elasticsearch import Elasticsearch, TransportError
-from elasticsearch.helpers import bulk, BulkIndexError
-from config import ELASTICSEARCH_URL, ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD
+from elasticsearch import ApiError, NotFoundError, TransportError
+from elasticsearch.helpers import bulk, scan, BulkIndexError
+from config import ELASTICSEARCH_URL, ELASTICSEARCH_PAGE_SIZE, ELASTICSEARCH_PIT_KEEP_ALIVE
+from core.db.service_registry import service_registry
 from core.utils.logger import get_logger
 
 _log = get_logger()
 
+# 按月滚动的索引模板: {别名: 模板}，实际索引名为 <别名>-YYYY.MM，别名指向全部月索引，最新的月索引为写入索引。
+# 启动时创建模板和别名，运行期间的读写不再检查或创建索引
+ES_INDEX_TEMPLATES = {
+    "messages": {
+        "index_patterns": ["messages-*"],
+        "priority": 100,
+        "template": {
+            "settings": {
+                # 按时间倒序存储，按时间排序的查询可以提前结束，不必扫描旧段
+                "index": {"sort.field": "timestamp", "sort.order": "desc"}
+            },
+            "mappings": {
+                # 同一群组的文档写入同一分片，按群组查询时只访问一个分片
+                "_routing": {"required": True},
+                "properties": {
+                    "group_id": {"type": "keyword"},
+                    "role": {"type": "keyword"},
+                    "content": {"type": "text"},
+                    "timestamp": {"type": "date"},
+                    "importance": {"type": "float"},
+                    "retrieval_count": {"type": "integer"},
+                    "last_retrieved": {"type": "date"},
+                }
+            }
+        }
+    },
+}
+
+
+def monthly_index_name(alias, now=None):
+    """
+    获取别名在指定时间（默认当前）对应的月索引名称，例如 messages-2024.10
+    """
+    return f"{alias}-{(now or datetime.now(timezone.utc)):%Y.%m}"
+
+
+def is_index_not_found(error):
+    """
+    判断异常（或 _msearch 响应中的 error 字段）是否为索引不存在（index_not_found_exception）
+    """
+    if isinstance(error, dict):
+        return error.get("type") == "index_not_found_exception"
+    if isinstance(error, NotFoundError):
+        return error.error == "index_not_found_exception"
+    if isinstance(error, BulkIndexError):
+        return any(
+            (item.get(op) or {}).get("error", {}).get("type") == "index_not_found_exception"
+            for item in error.errors for op in item
+        )
+    return False
+
+
+def build_bulk_actions(index_name, data):
+    """
+    将文档列表转换为 bulk 操作，缺失的 `_id` 与 timestamp 会自动补全
+    """
+    actions = []
+    for doc in data:
+        doc_id = doc.get("_id", str(uuid.uuid4()))
+        doc.pop("_id", None)
+        doc["timestamp"] = doc.get("timestamp", datetime.now(timezone.utc).isoformat())
+
+        action = {
+            "_index": index_name,
+            "_id": doc_id,
+            "_source": doc
+        }
+        # 按群组路由，满足索引模板中必填的 _routing
+        if doc.get("group_id"):
+            action["_routing"] = doc["group_id"]
+        actions.append(action)
+    return actions
+
 
 class ElasticsearchIndexManager:
     """
     负责管理Elasticsearch索引的类
     """
 
-    def __init__(self):
+    def __init__(self, es=None):
         """
         初始化ElasticsearchIndexManager实例并连接到Elasticsearch服务器
+
+        参数:
+            es (Elasticsearch): 使用的客户端，默认取服务注册表中的共享客户端
         """
         try:
-            self.es = Elasticsearch(
-                [ELASTICSEARCH_URL],
-                http_auth=(ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD),
-                verify_certs=True
-            )
+            self.es = es or service_registry.get_es_client()
+            # 已确认存在的索引，只有在请求返回 index_not_found 时才会移除
+            self._known_indices = set()
             _log.info("<ELASTICSEARCH> 成功连接到Elasticsearch服务器:")
             _log.info(f"   ↳ URL: {ELASTICSEARCH_URL}")
         except Exception as e:
@@ -41,6 +116,125 @@ class ElasticsearchIndexManager:
             _log.error(f"   ↳ 错误详情: {e}")
             raise
 
+    def _index_exists(self, index_name):
+        """
+        检查索引是否存在，结果缓存在内存中，避免每次读写前都多一次请求
+        """
+        if index_name in self._known_indices:
+            return True
+        if self.es.indices.exists(index=index_name):
+            self._known_indices.add(index_name)
+            return True
+        return False
+
+    def _forget_index(self, index_name, error):
+        """
+        请求返回 index_not_found 时使该索引的缓存失效
+
+        返回:
+            bool: 错误是否为索引不存在
+        """
+        if not is_index_not_found(error):
+            return False
+        self._known_indices.discard(index_name)
+        _log.warning(f"<INDEX> 索引 '{index_name}' 不存在，已清除存在性缓存")
+        return True
+
+    def bootstrap_indices(self):
+        """
+        写入 ES_INDEX_TEMPLATES 中的索引模板，确保每个别名存在并指向当前月索引，然后预热存在性缓存。
+        在启动时调用一次；旧的同名普通索引会被迁移到月索引中。
+
+        返回:
+            list: 已确保存在的别名
+        """
+        ensured = []
+        for alias, template in ES_INDEX_TEMPLATES.items():
+            try:
+                self.es.indices.put_index_template(name=f"{alias}-template", **template)
+                if self.es.indices.exists_alias(name=alias):
+                    self.rollover_index(alias)
+                elif self.es.indices.exists(index=alias):
+                    if not self._migrate_legacy_index(alias):
+                        continue
+                else:
+                    self.es.indices.create(index=monthly_index_name(alias), aliases={alias: {"is_write_index": True}})
+                    _log.info("<INDEX> 成功创建Elasticsearch月索引:")
+                    _log.info(f"   ↳ 索引名称: {monthly_index_name(alias)}")
+                self._known_indices.add(alias)
+                ensured.append(alias)
+            except (ApiError, TransportError) as e:
+                _log.error("<ERROR> 初始化索引时出错:")
+                _log.error(f"   ↳ 索引名称: {alias}")
+                _log.error(f"   ↳ 错误详情: {e}")
+        return ensured
+
+    def rollover_index(self, alias):
+        """
+        当前月索引尚不存在时，把别名的写入索引滚动到新的月索引
+
+        返回:
+            bool: 是否发生了滚动
+        """
+        target = monthly_index_name(alias)
+        try:
+            if self.es.indices.exists(index=target):
+                return False
+            self.es.indices.rollover(alias=alias, new_index=target)
+            _log.info("<INDEX> 索引已滚动到新的月索引:")
+            _log.info(f"   ↳ 别名: {alias}")
+            _log.info(f"   ↳ 写入索引: {target}")
+            return True
+        except (ApiError, TransportError) as e:
+            _log.error("<ERROR> 滚动索引时出错:")
+            _log.error(f"   ↳ 别名: {alias}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return False
+
+    def rollover_indices(self):
+        """
+        对所有按月滚动的别名执行 rollover_index
+
+        返回:
+            list: 发生了滚动的别名
+        """
+        return [alias for alias in ES_INDEX_TEMPLATES if self.rollover_index(alias)]
+
+    def _migrate_legacy_index(self, alias):
+        """
+        把旧的同名普通索引重建索引到当前月索引（按 group_id 补上路由），文档数一致后删除旧索引并原子地换成别名
+
+        返回:
+            bool: 是否迁移成功
+        """
+        target = monthly_index_name(alias)
+        _log.warning(f"<INDEX> 发现未使用模板的旧索引 '{alias}'，正在迁移到 '{target}'...")
+        if not self.es.indices.exists(index=target):
+            self.es.indices.create(index=target)
+        self.es.reindex(
+            source={"index": alias},
+            dest={"index": target},
+            script={
+                "source": "if (ctx._source.group_id != null) { ctx._routing = ctx._source.group_id } else { ctx.op = 'noop' }",
+                "lang": "painless"
+            },
+            wait_for_completion=True,
+            refresh=True
+        )
+        expected = self.es.count(index=alias, query={"exists": {"field": "group_id"}})["count"]
+        migrated = self.es.count(index=target)["count"]
+        if migrated < expected:
+            _log.error("<ERROR> 旧索引迁移后文档数不一致，保留旧索引:")
+            _log.error(f"   ↳ 旧索引: {expected} 条，新索引: {migrated} 条")
+            return False
+        self.es.indices.update_aliases(actions=[
+            {"remove_index": {"index": alias}},
+            {"add": {"index": target, "alias": alias, "is_write_index": True}}
+        ])
+        _log.info("<INDEX> 旧索引迁移完成:")
+        _log.info(f"   ↳ 迁移文档数: {migrated}")
+        _log.info(f"   ↳ 别名: {alias} -> {target}")
+        return True
 
     def get_all_indices(self):
         """
@@ -71,20 +265,20 @@ class ElasticsearchIndexManager:
             dict: 索引映射
         """
         try:
-            if self.es.indices.exists(index=index_name):
-                mapping = self.es.indices.get_mapping(index=index_name)
-                _log.info(f"<ELASTICSEARCH> 获取索引 '{index_name}' 的映射成功:")
-                _log.debug(f"   ↳ 映射: {mapping}")
-                return mapping
-            else:
+            mapping = self.es.indices.get_mapping(index=index_name)
+            self._known_indices.add(index_name)
+            _log.info(f"<ELASTICSEARCH> 获取索引 '{index_name}' 的映射成功:")
+            _log.debug(f"   ↳ 映射: {mapping}")
+            return mapping
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
                 _log.warning(f"<ELASTICSEARCH> 索引 '{index_name}' 不存在，无法获取映射")
                 return None
-        except TransportError as e:
             _log.error(f"<ERROR> 获取索引 '{index_name}' 的映射时出错:")
             _log.error(f"   ↳ 错误详情: {e}")
             return None
 
-    def delete_document(self, index_name, document_id):
+    def delete_document(self, index_name, document_id, routing=None):
         """
         从Elasticsearch索引中删除文档
 
@@ -93,16 +287,15 @@ class ElasticsearchIndexManager:
             document_id (str): 文档ID
         """
         try:
-            if self.es.indices.exists(index=index_name):
-                self.es.delete(index=index_name, id=document_id)
-                _log.info(f"<ELASTICSEARCH> 成功删除文档:")
-                _log.info(f"   ↳ 索引名称: {index_name}")
-                _log.info(f"   ↳ 文档ID: {document_id}")
-                return True
-            else:
+            self.es.delete(index=index_name, id=document_id, routing=routing)
+            _log.info(f"<ELASTICSEARCH> 成功删除文档:")
+            _log.info(f"   ↳ 索引名称: {index_name}")
+            _log.info(f"   ↳ 文档ID: {document_id}")
+            return True
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
                 _log.warning(f"<ELASTICSEARCH> 索引 '{index_name}' 不存在，无法删除文档")
                 return False
-        except TransportError as e:
             _log.error(f"<ERROR> 删除文档时出错:")
             _log.error(f"   ↳ 索引名称: {index_name}")
             _log.error(f"   ↳ 文档ID: {document_id}")
@@ -122,6 +315,7 @@ class ElasticsearchIndexManager:
 
             if not self.es.indices.exists(index=index_name):
                 self.es.indices.create(index=index_name, body=body)
+                self._known_indices.add(index_name)
                 _log.info("<INDEX> 成功创建Elasticsearch索引:")
                 _log.info(f"   ↳ 索引名称: {index_name}")
                 return True
@@ -142,6 +336,7 @@ class ElasticsearchIndexManager:
         try:
             if self.es.indices.exists(index=index_name):
                 self.es.indices.delete(index=index_name)
+                self._known_indices.discard(index_name)
                 _log.info("<INDEX> 成功删除Elasticsearch索引:")
                 _log.info(f"   ↳ 索引名称: {index_name}")
                 return True
@@ -160,21 +355,20 @@ class ElasticsearchIndexManager:
         更新Elasticsearch索引的设置和映射
         """
         try:
-            if self.es.indices.exists(index=index_name):
-                if settings:
-                    self.es.indices.put_settings(index=index_name, body=settings)
-                    _log.info("<INDEX> 成功更新索引设置:")
-                    _log.info(f"   ↳ 索引名称: {index_name}")
-                if mappings:
-                    self.es.indices.put_mapping(index=index_name, body=mappings)
-                    _log.info("<INDEX> 成功更新索引映射:")
-                    _log.info(f"   ↳ 索引名称: {index_name}")
-                return True
-            else:
+            if settings:
+                self.es.indices.put_settings(index=index_name, body=settings)
+                _log.info("<INDEX> 成功更新索引设置:")
+                _log.info(f"   ↳ 索引名称: {index_name}")
+            if mappings:
+                self.es.indices.put_mapping(index=index_name, body=mappings)
+                _log.info("<INDEX> 成功更新索引映射:")
+                _log.info(f"   ↳ 索引名称: {index_name}")
+            return True
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
                 _log.warning("<INDEX> 索引不存在，无法更新:")
                 _log.warning(f"   ↳ 索引名称: {index_name}")
                 return False
-        except TransportError as e:
             _log.error("<ERROR> 更新索引时出错:")
             _log.error(f"   ↳ 索引名称: {index_name}")
             _log.error(f"   ↳ 错误详情: {e}")
@@ -185,22 +379,12 @@ class ElasticsearchIndexManager:
         批量插入数据到Elasticsearch索引中
         """
         try:
-            if not self.es.indices.exists(index=index_name):
+            if not self._index_exists(index_name):
                 _log.error("<ERROR> 索引不存在，无法插入数据:")
                 _log.error(f"   ↳ 索引名称: {index_name}")
                 return False
 
-            actions = []
-            for doc in data:
-                doc_id = doc.get("_id", str(uuid.uuid4()))
-                doc.pop("_id", None)
-                doc["timestamp"] = doc.get("timestamp", datetime.now(timezone.utc).isoformat())
-
-                actions.append({
-                    "_index": index_name,
-                    "_id": doc_id,
-                    "_source": doc
-                })
+            actions = build_bulk_actions(index_name, data)
 
             _log.debug(f"<BULK INSERT> 尝试插入的数据: {actions}")
 
@@ -211,35 +395,249 @@ class ElasticsearchIndexManager:
             return True
 
         except BulkIndexError as e:
+            self._forget_index(index_name, e)
             _log.error("<ERROR> 批量插入数据时出错:")
             _log.error(f"   ↳ 错误详情: {e.errors}")  # 打印详细的错误信息
             _log.error(f"   ↳ 索引名称: {index_name}")
             return False
-        except TransportError as e:
+        except (ApiError, TransportError) as e:
+            self._forget_index(index_name, e)
             _log.error("<ERROR> 批量插入数据时出错:")
             _log.error(f"   ↳ 索引名称: {index_name}")
             _log.error(f"   ↳ 错误详情: {e}")
             return False
 
-    def search(self, index_name, query):
+    def search(self, index_name, query, with_ids=False, routing=None):
         """
-        在Elasticsearch索引中执行搜索查询
+        在Elasticsearch索引中执行搜索查询，只发送一次请求，索引不存在时返回空列表
+
+        参数:
+            index_name (str): 索引名称
+            query (dict): 查询体
+            with_ids (bool): 是否在返回的文档中附带 `_id` 与 `_index` 字段
+            routing (str): 路由值（群组ID），指定后只查询该群组所在的分片
         """
         try:
-            if not self.es.indices.exists(index=index_name):
-                _log.warning("<INDEX> 索引不存在，正在自动创建:")
-                _log.warning(f"   ↳ 索引名称: {index_name}")
-                self.create_index(index_name)
-
-            result = self.es.search(index=index_name, body=query)
+            result = self.es.search(index=index_name, body=query, routing=routing)
             hits = result.get("hits", {}).get("hits", [])
             _log.info("<SEARCH> 搜索成功:")
             _log.info(f"   ↳ 索引名称: {index_name}")
             _log.info(f"   ↳ 记录数: {len(hits)} 条")
             _log.debug(f"   ↳ 搜索结果: {hits}")
+            if with_ids:
+                return [dict(hit.get("_source", {}), _id=hit.get("_id"), _index=hit.get("_index")) for hit in hits]
             return [hit.get("_source", {}) for hit in hits]
-        except TransportError as e:
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                return []
             _log.error("<ERROR> 搜索索引时出错:")
             _log.error(f"   ↳ 索引名称: {index_name}")
             _log.error(f"   ↳ 错误详情: {e}")
             return []
+
+    def search_page(self, index_name, query=None, size=100, search_after=None, source=None, pit_id=None,
+                    keep_alive=ELASTICSEARCH_PIT_KEEP_ALIVE):
+        """
+        使用 point-in-time + search_after 分页读取索引中的文档，按 timestamp 升序排列
+
+        同一时间戳的文档按 _shard_doc 排序，它在 PIT 内全局唯一，别名跨多个索引时翻页也不会跳过或重复文档。
+        第一页不传 pit_id，会打开新的 PIT；之后每页传入上一页返回的 pit_id 与游标，读完最后一页时自动关闭 PIT。
+
+        参数:
+            index_name (str): 索引名称或别名
+            query (dict): 查询条件（query 子句），默认 match_all
+            size (int): 每页文档数
+            search_after (list): 上一页返回的游标
+            source (list): 需要返回的 `_source` 字段
+            pit_id (str): 上一页返回的 PIT ID
+            keep_alive (str): 每页之间 PIT 的保活时间
+
+        返回:
+            tuple: (hits 列表, 下一页游标, PIT ID)，没有更多数据时游标与 PIT ID 均为 None
+        """
+        try:
+            if not pit_id:
+                pit_id = self.es.open_point_in_time(index=index_name, keep_alive=keep_alive)["id"]
+            params = {
+                "pit": {"id": pit_id, "keep_alive": keep_alive},
+                "query": query or {"match_all": {}},
+                "size": size,
+                "sort": [{"timestamp": {"order": "asc", "unmapped_type": "date"}}, {"_shard_doc": "asc"}],
+            }
+            if search_after:
+                params["search_after"] = search_after
+            if source is not None:
+                params["_source"] = source
+            result = self.es.search(**params)
+            pit_id = result.get("pit_id", pit_id)
+            hits = result.get("hits", {}).get("hits", [])
+            if len(hits) == size:
+                return hits, hits[-1]["sort"], pit_id
+            self._close_point_in_time(pit_id)
+            return hits, None, None
+        except (ApiError, TransportError) as e:
+            self._close_point_in_time(pit_id)
+            if self._forget_index(index_name, e):
+                return [], None, None
+            _log.error("<ERROR> 分页读取索引时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return [], None, None
+
+    def _close_point_in_time(self, pit_id):
+        """
+        关闭 point-in-time，失败时只记录警告
+        """
+        if not pit_id:
+            return
+        try:
+            self.es.close_point_in_time(id=pit_id)
+        except (ApiError, TransportError) as e:
+            _log.warning(f"<ELASTICSEARCH> 关闭 point-in-time 失败: {e}")
+
+    def iterate_documents(self, index_name, query=None, source=None, page_size=ELASTICSEARCH_PAGE_SIZE, sort=None,
+                          keep_alive=ELASTICSEARCH_PIT_KEEP_ALIVE):
+        """
+        使用 point-in-time + search_after 遍历索引中的全部文档，内存中只保留当前一页，读取期间看到的是一致的快照
+
+        参数:
+            index_name (str): 索引名称或别名
+            query (dict): 查询条件（query 子句），默认 match_all
+            source (list): 需要返回的 `_source` 字段
+            page_size (int): 每页文档数
+            sort (list): 排序方式，默认按分片内文档顺序（最快）
+            keep_alive (str): 每页之间 PIT 的保活时间
+
+        返回:
+            generator: 逐条产出 hit（包含 `_id`、`_index` 与 `_source`）
+        """
+        pit_id = None
+        try:
+            pit_id = self.es.open_point_in_time(index=index_name, keep_alive=keep_alive)["id"]
+            search_after = None
+            while True:
+                params = {
+                    "pit": {"id": pit_id, "keep_alive": keep_alive},
+                    "query": query or {"match_all": {}},
+                    "size": page_size,
+                    "sort": sort or [{"_shard_doc": "asc"}],
+                }
+                if search_after:
+                    params["search_after"] = search_after
+                if source is not None:
+                    params["_source"] = source
+                result = self.es.search(**params)
+                pit_id = result.get("pit_id", pit_id)
+                hits = result.get("hits", {}).get("hits", [])
+                yield from hits
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]["sort"]
+        except (ApiError, TransportError) as e:
+            if not self._forget_index(index_name, e):
+                _log.error("<ERROR> 遍历索引时出错:")
+                _log.error(f"   ↳ 索引名称: {index_name}")
+                _log.error(f"   ↳ 错误详情: {e}")
+        finally:
+            self._close_point_in_time(pit_id)
+
+    def scan_documents(self, index_name, query=None, source=None, page_size=1000, routing=None):
+        """
+        逐批遍历索引中的文档，不会一次性把整个索引读入内存
+
+        参数:
+            index_name (str): 索引名称
+            query (dict): 查询体，默认 match_all
+            source (list): 需要返回的 `_source` 字段
+            page_size (int): 每批拉取的文档数
+
+        返回:
+            generator: 逐条产出 hit（包含 `_id` 与 `_source`）
+        """
+        body = query or {"query": {"match_all": {}}}
+        try:
+            yield from scan(self.es, index=index_name, query=body, _source=source, size=page_size,
+                            routing=routing)
+        except (ApiError, TransportError) as e:
+            _log.error("<ERROR> 遍历索引时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+
+    def delete_by_query(self, index_name, query, requests_per_second=None, routing=None):
+        """
+        按查询条件删除文档，可通过 requests_per_second 对删除进行限流
+
+        返回:
+            int: 删除的文档数
+        """
+        try:
+            result = self.es.delete_by_query(
+                index=index_name,
+                query=query,
+                conflicts="proceed",
+                refresh=True,
+                requests_per_second=requests_per_second if requests_per_second else -1,
+                routing=routing
+            )
+            deleted = result.get("deleted", 0)
+            _log.info("<DELETE BY QUERY> 成功删除文档:")
+            _log.info(f"   ↳ 索引名称: {index_name}")
+            _log.info(f"   ↳ 删除数量: {deleted} 条记录")
+            return deleted
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                return 0
+            _log.error("<ERROR> 按查询删除文档时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return 0
+
+    def record_retrieval(self, index_name, document_id, routing=None):
+        """
+        记录一次记忆被检索使用，累加 retrieval_count 并更新 last_retrieved
+
+        参数:
+            index_name (str): 文档所在的具体索引（别名指向多个索引时无法按ID更新）
+            document_id (str): 文档ID
+            routing (str): 文档的路由值（群组ID）
+        """
+        try:
+            self.es.update(
+                index=index_name,
+                id=document_id,
+                routing=routing,
+                script={
+                    "source": "ctx._source.retrieval_count = (ctx._source.retrieval_count == null ? 0 : ctx._source.retrieval_count) + 1;"
+                              "ctx._source.last_retrieved = params.now",
+                    "params": {"now": datetime.now(timezone.utc).isoformat()}
+                },
+                retry_on_conflict=3
+            )
+            return True
+        except (ApiError, TransportError) as e:
+            self._forget_index(index_name, e)
+            _log.warning(f"<ELASTICSEARCH> 记录记忆检索次数失败: {e}")
+            return False
+
+    def group_document_counts(self, index_name, field="group_id", size=1000):
+        """
+        统计每个群组在索引中的文档数量
+
+        返回:
+            dict: {group_id: 文档数}
+        """
+        try:
+            result = self.es.search(
+                index=index_name,
+                size=0,
+                aggs={"groups": {"terms": {"field": field, "size": size}}}
+            )
+            buckets = result.get("aggregations", {}).get("groups", {}).get("buckets", [])
+            return {bucket["key"]: bucket["doc_count"] for bucket in buckets}
+        except (ApiError, TransportError) as e:
+            if self._forget_index(index_name, e):
+                return {}
+            _log.error("<ERROR> 统计群组文档数量时出错:")
+            _log.error(f"   ↳ 索引名称: {index_name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return {}
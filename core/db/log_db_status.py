@@ -1,8 +1,6 @@
 import os
-from core.db.elasticsearch_index_manager import ElasticsearchIndexManager
-from core.utils.mongodb_utils import MongoDBUtils
+from core.db.service_registry import service_registry
 from core.utils.logger import get_logger
-from config import ELASTICSEARCH_URL, ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD, MONGODB_URI, MONGODB_USERNAME, MONGODB_PASSWORD
 
 _log = get_logger()
 
@@ -10,7 +8,7 @@ def log_elasticsearch_status(log_dir):
     """
     记录Elasticsearch的详细状态信息到指定文件中
     """
-    es_manager = ElasticsearchIndexManager()
+    es_manager = service_registry.get_es_manager()
     es_status_file = os.path.join(log_dir, "elasticsearch_status.txt")
 
     try:
@@ -39,7 +37,7 @@ def log_mongodb_status(log_dir):
     """
     记录MongoDB的详细状态信息到指定文件中
     """
-    mongo_utils = MongoDBUtils()
+    mongo_utils = service_registry.get_mongo_utils()
     mongo_status_file = os.path.join(log_dir, "mongodb_status.txt")
 
     try:
@@ -0,0 +1,105 @@
+"""
+AmyAlmond Project - core/db/search_batcher.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+search_batcher.py - 把短时间内来自不同群组的检索合并成一次 _msearch 请求
+"""
+import asyncio
+
+from config import ELASTICSEARCH_MSEARCH_WINDOW_MS, ELASTICSEARCH_MSEARCH_MAX_BATCH
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class SearchBatcher:
+    """
+    检索请求合并器
+
+    第一条检索到达后等待 window_ms 毫秒，期间到达的检索与它一起通过 _msearch 发送；
+    攒够 max_batch 条时立即发送。每条检索的响应按顺序交还给各自等待的协程；
+    _msearch 返回的响应不足或发送被取消时，未得到响应的检索收到带 `error` 字段的响应，不会一直等待。
+    """
+
+    def __init__(self, es, window_ms=ELASTICSEARCH_MSEARCH_WINDOW_MS, max_batch=ELASTICSEARCH_MSEARCH_MAX_BATCH):
+        """
+        参数:
+            es (AsyncElasticsearch): 异步 Elasticsearch 客户端
+            window_ms (float): 合并窗口（毫秒）
+            max_batch (int): 单次 _msearch 的最大检索数
+        """
+        self.es = es
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self._tasks = set()  # 持有发送任务的引用，避免任务在完成前被回收
+
+    async def search(self, index_name, body, routing=None):
+        """
+        提交一条检索并等待其响应
+
+        参数:
+            index_name (str): 索引名称或别名
+            body (dict): 检索请求体
+            routing (str): 路由值
+        返回:
+            dict: 该检索在 _msearch 中对应的响应，出错时包含 `error` 字段
+        """
+        loop = asyncio.get_running_loop()
+        header = {"index": index_name}
+        if routing:
+            header["routing"] = routing
+        future = loop.create_future()
+        self._pending.append((header, body, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        """
+        取出当前等待中的检索并在后台发送
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        """
+        发送一次 _msearch，并把响应或异常分发给各个等待的协程
+        """
+        searches = []
+        for header, body, _ in batch:
+            searches.extend([header, body])
+        reason = "msearch 返回的响应数少于检索数"
+        try:
+            result = await self.es.msearch(searches=searches)
+            responses = result.get("responses", [])
+            _log.debug(f"<MSEARCH> 合并发送 {len(batch)} 条检索")
+            for (_, _, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+        except asyncio.CancelledError:
+            reason = "msearch 请求已取消"
+            raise
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # 没有拿到响应的检索按出错处理，等待的协程不会永远挂起
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result({"error": {"type": "msearch_incomplete", "reason": reason}})
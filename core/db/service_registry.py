@@ -0,0 +1,184 @@
+"""
+AmyAlmond Project - core/db/service_registry.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+service_registry.py - 进程级服务注册表，统一持有带连接池的 MongoDB 与 Elasticsearch 客户端
+
+注意：异步 Elasticsearch 客户端的连接会绑定到首次使用它的事件循环（机器人的事件循环）。
+"""
+import threading
+
+from elasticsearch import Elasticsearch, AsyncElasticsearch
+from pymongo import MongoClient
+
+from config import (MONGODB_URI, MONGODB_USERNAME, MONGODB_PASSWORD, MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE,
+                    ELASTICSEARCH_URL, ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD,
+                    ELASTICSEARCH_CONNECTIONS_PER_NODE)
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class ServiceRegistry:
+    """
+    进程级服务注册表
+
+    机器人代码与 FastAPI 依赖注入都从这里获取客户端，整个进程只维护一个 MongoDB 连接池和一个 Elasticsearch 连接池，
+    避免每个请求重复进行 TCP/TLS 握手。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mongo_client = None
+        self._es_client = None
+        self._async_es_client = None
+        self._mongo_utils = None
+        self._es_manager = None
+        self._async_es_manager = None
+        self._bulk_indexer = None
+
+    def get_mongo_client(self):
+        """
+        获取共享的 MongoClient，首次调用时创建
+
+        返回:
+            MongoClient: 带连接池的 MongoDB 客户端
+        """
+        if self._mongo_client is None:
+            with self._lock:
+                if self._mongo_client is None:
+                    # 修改URI，增加authSource参数
+                    updated_uri = f"{MONGODB_URI}?authSource=admin"
+                    self._mongo_client = MongoClient(
+                        updated_uri,
+                        username=MONGODB_USERNAME,
+                        password=MONGODB_PASSWORD,
+                        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                        minPoolSize=MONGODB_MIN_POOL_SIZE
+                    )
+                    _log.info("<REGISTRY> 已创建共享MongoDB客户端:")
+                    _log.info(f"   ↳ URI: {updated_uri}")
+                    _log.info(f"   ↳ 连接池: {MONGODB_MIN_POOL_SIZE}-{MONGODB_MAX_POOL_SIZE}")
+        return self._mongo_client
+
+    def get_es_client(self):
+        """
+        获取共享的 Elasticsearch 客户端，首次调用时创建
+
+        返回:
+            Elasticsearch: 带连接池的 Elasticsearch 客户端
+        """
+        if self._es_client is None:
+            with self._lock:
+                if self._es_client is None:
+                    self._es_client = Elasticsearch(
+                        [ELASTICSEARCH_URL],
+                        basic_auth=(ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD),
+                        verify_certs=True,
+                        connections_per_node=ELASTICSEARCH_CONNECTIONS_PER_NODE
+                    )
+                    _log.info("<REGISTRY> 已创建共享Elasticsearch客户端:")
+                    _log.info(f"   ↳ URL: {ELASTICSEARCH_URL}")
+                    _log.info(f"   ↳ 每节点连接数: {ELASTICSEARCH_CONNECTIONS_PER_NODE}")
+        return self._es_client
+
+    def get_async_es_client(self):
+        """
+        获取共享的 AsyncElasticsearch 客户端，首次调用时创建
+
+        返回:
+            AsyncElasticsearch: 带连接池的异步 Elasticsearch 客户端
+        """
+        if self._async_es_client is None:
+            with self._lock:
+                if self._async_es_client is None:
+                    self._async_es_client = AsyncElasticsearch(
+                        [ELASTICSEARCH_URL],
+                        basic_auth=(ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD),
+                        verify_certs=True,
+                        connections_per_node=ELASTICSEARCH_CONNECTIONS_PER_NODE
+                    )
+                    _log.info("<REGISTRY> 已创建共享异步Elasticsearch客户端:")
+                    _log.info(f"   ↳ URL: {ELASTICSEARCH_URL}")
+                    _log.info(f"   ↳ 每节点连接数: {ELASTICSEARCH_CONNECTIONS_PER_NODE}")
+        return self._async_es_client
+
+    def get_mongo_utils(self):
+        """
+        获取共享的 MongoDBUtils 实例
+        """
+        if self._mongo_utils is None:
+            from core.utils.mongodb_utils import MongoDBUtils
+            with self._lock:
+                if self._mongo_utils is None:
+                    self._mongo_utils = MongoDBUtils()
+        return self._mongo_utils
+
+    def get_es_manager(self):
+        """
+        获取共享的 ElasticsearchIndexManager 实例
+        """
+        if self._es_manager is None:
+            from core.db.elasticsearch_index_manager import ElasticsearchIndexManager
+            with self._lock:
+                if self._es_manager is None:
+                    self._es_manager = ElasticsearchIndexManager()
+        return self._es_manager
+
+    def get_async_es_manager(self):
+        """
+        获取共享的 AsyncElasticsearchIndexManager 实例
+        """
+        if self._async_es_manager is None:
+            from core.db.async_elasticsearch_index_manager import AsyncElasticsearchIndexManager
+            with self._lock:
+                if self._async_es_manager is None:
+                    self._async_es_manager = AsyncElasticsearchIndexManager()
+        return self._async_es_manager
+
+    def get_bulk_indexer(self):
+        """
+        获取共享的后台批量写入器，所有群组的 ES 写入共用一个队列
+        """
+        if self._bulk_indexer is None:
+            from core.db.bulk_indexer import BulkIndexer
+            with self._lock:
+                if self._bulk_indexer is None:
+                    self._bulk_indexer = BulkIndexer()
+        return self._bulk_indexer
+
+    async def aclose(self):
+        """
+        写完批量写入队列后关闭所有共享客户端（包括异步客户端），在事件循环中调用
+        """
+        bulk_indexer, self._bulk_indexer = self._bulk_indexer, None
+        if bulk_indexer is not None:
+            await bulk_indexer.close()
+        async_client, self._async_es_client, self._async_es_manager = self._async_es_client, None, None
+        if async_client is not None:
+            await async_client.close()
+            _log.info("<REGISTRY> 已关闭共享异步Elasticsearch客户端")
+        self.close()
+
+    def close(self):
+        """
+        关闭所有共享客户端，在进程退出前调用
+        """
+        with self._lock:
+            if self._mongo_client is not None:
+                self._mongo_client.close()
+                self._mongo_client = None
+                self._mongo_utils = None
+                _log.info("<REGISTRY> 已关闭共享MongoDB客户端")
+            if self._es_client is not None:
+                self._es_client.close()
+                self._es_client = None
+                self._es_manager = None
+                _log.info("<REGISTRY> 已关闭共享Elasticsearch客户端")
+
+
+service_registry = ServiceRegistry()
@@ -0,0 +1,238 @@
+"""
+AmyAlmond Project - core/llm/admission.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+admission.py - LLM 请求准入控制：按端点的 RPM/TPM 令牌桶限流，群组间加权公平排队
+"""
+import asyncio
+import time
+from collections import deque
+
+from config import (LLM_RATE_LIMIT_RPM, LLM_RATE_LIMIT_TPM, LLM_RATE_LIMITS, LLM_ADMISSION_MAX_QUEUE,
+                    LLM_ADMISSION_MAX_WAIT, LLM_GROUP_WEIGHTS)
+from core.llm.call_context import current_group
+from core.llm.llm_client import LLMRequestError
+from core.llm.llm_stats import llm_stats
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class AdmissionRejectedError(LLMRequestError):
+    """
+    排队已满或等待超时，请求未被放行
+    """
+
+    def __init__(self, endpoint, reason):
+        super().__init__(f"端点 {endpoint} 拒绝准入: {reason}", retryable=False)
+        self.endpoint = endpoint
+
+
+class TokenBucket:
+    """
+    每分钟补充 per_minute 个令牌的令牌桶，容量等于每分钟额度；per_minute 为 0 表示不限制
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        距离桶中有 amount 个令牌还需等待的秒数（超过容量的请求按容量计）
+        """
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        if self.capacity:
+            self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("group", "cost", "tag", "future", "enqueued")
+
+    def __init__(self, group, cost, tag, future):
+        self.group = group
+        self.cost = cost
+        self.tag = tag
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    """
+    单个端点的准入控制器
+
+    请求需同时从请求数令牌桶（RPM）与 Token 令牌桶（TPM）取得额度才会放行。额度不足时进入所属群组的队列，
+    调度器按开始时间公平排队（SFQ）：每个请求的虚拟标签为 max(虚拟时钟, 该群组上一个标签) + 成本 / 群组权重，
+    总是先放行标签最小的请求，因此单个群组突发大量请求也无法饿死其他群组。
+    """
+
+    def __init__(self, endpoint, rpm=LLM_RATE_LIMIT_RPM, tpm=LLM_RATE_LIMIT_TPM, max_queue=LLM_ADMISSION_MAX_QUEUE,
+                 max_wait=LLM_ADMISSION_MAX_WAIT, weights=None):
+        self.endpoint = endpoint
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.weights = LLM_GROUP_WEIGHTS if weights is None else weights
+        self._queues = {}
+        self._last_tag = {}
+        self._vclock = 0.0
+        self._queued = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self.metrics = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0,
+                        "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    async def acquire(self, cost, group=None):
+        """
+        申请一次调用额度，必要时排队等待
+
+        参数:
+            cost (int): 预估消耗的 Token 数
+            group (str): 所属群组，默认取当前调用上下文中的群组
+        异常:
+            AdmissionRejectedError: 队列已满或等待超过 max_wait 秒
+        """
+        group = group or current_group.get()
+        if not self._queued and not self.requests.wait_time(1) and not self.tokens.wait_time(cost):
+            self._grant(cost)
+            return
+
+        if self._queued >= self.max_queue:
+            self.metrics["rejected_queue_full"] += 1
+            _log.warning(f"<ADMISSION> 端点 {self.endpoint} 排队已满，拒绝群组 {group} 的请求")
+            raise AdmissionRejectedError(self.endpoint, "排队已满")
+
+        weight = float(self.weights.get(group, 1)) or 1.0
+        tag = max(self._vclock, self._last_tag.get(group, 0.0)) + max(cost, 1) / weight
+        self._last_tag[group] = tag
+        waiter = _Waiter(group, cost, tag, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(group, deque()).append(waiter)
+        self._queued += 1
+        self.metrics["queued"] += 1
+        self._ensure_dispatcher()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            waiter.future.cancel()
+            self.metrics["rejected_timeout"] += 1
+            _log.warning(f"<ADMISSION> 端点 {self.endpoint} 排队超过 {self.max_wait} 秒，拒绝群组 {group} 的请求")
+            raise AdmissionRejectedError(self.endpoint, "排队超时")
+        except asyncio.CancelledError:
+            waiter.future.cancel()
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        self.metrics["wait_seconds_total"] += waited
+        self.metrics["wait_seconds_max"] = max(self.metrics["wait_seconds_max"], waited)
+
+    def _grant(self, cost):
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self.metrics["admitted"] += 1
+
+    def _ensure_dispatcher(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _next_waiter(self):
+        """
+        丢弃已取消的等待者，返回各群组队首中标签最小的一个
+        """
+        best = None
+        for group in list(self._queues):
+            queue = self._queues[group]
+            while queue and queue[0].future.done():
+                queue.popleft()
+                self._queued -= 1
+            if not queue:
+                del self._queues[group]
+                continue
+            if best is None or queue[0].tag < best.tag:
+                best = queue[0]
+        return best
+
+    async def _dispatch(self):
+        """
+        调度循环：额度足够时按标签顺序放行等待者，否则睡到令牌补足或有新请求到达
+        """
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(waiter.cost))
+            if delay <= 0:
+                self._queues[waiter.group].popleft()
+                self._queued -= 1
+                self._vclock = waiter.tag
+                self._grant(waiter.cost)
+                waiter.future.set_result(True)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        """
+        获取准入统计
+
+        返回:
+            dict: 放行/排队/拒绝次数、等待时间与当前队列长度
+        """
+        queued_waits = self.metrics["queued"] - self.metrics["rejected_timeout"]
+        return self.metrics | {
+            "wait_seconds_total": round(self.metrics["wait_seconds_total"], 3),
+            "wait_seconds_max": round(self.metrics["wait_seconds_max"], 3),
+            "wait_seconds_avg": round(self.metrics["wait_seconds_total"] / queued_waits, 3) if queued_waits > 0 else 0,
+            "queue_length": self._queued,
+            "queued_groups": len(self._queues),
+        }
+
+
+class AdmissionRegistry:
+    """
+    按端点创建并缓存准入控制器，限额取 llm_rate_limits 中的端点配置，否则使用全局默认值
+    """
+
+    def __init__(self):
+        self._controllers = {}
+
+    def get(self, endpoint):
+        if endpoint not in self._controllers:
+            limits = LLM_RATE_LIMITS.get(endpoint, {})
+            self._controllers[endpoint] = AdmissionController(
+                endpoint,
+                rpm=limits.get("rpm", LLM_RATE_LIMIT_RPM),
+                tpm=limits.get("tpm", LLM_RATE_LIMIT_TPM)
+            )
+        return self._controllers[endpoint]
+
+    def stats(self):
+        return {endpoint: controller.stats() for endpoint, controller in self._controllers.items()}
+
+
+admission_registry = AdmissionRegistry()
+llm_stats.register("admission", admission_registry.stats)
@@ -0,0 +1,46 @@
+"""
+AmyAlmond Project - core/llm/call_context.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+call_context.py - 记录当前 LLM 调用所属的群组与调用点，供准入控制、遥测等下游组件读取
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 当前协程正在为哪个群组发起 LLM 调用，未设置时视为系统任务
+current_group = ContextVar("llm_current_group", default="system")
+
+
+def set_current_group(group_id):
+    """
+    设置当前上下文所属的群组，之后在该协程及其创建的任务中发起的 LLM 调用都归属于该群组
+
+    参数:
+        group_id (str): 群组的唯一标识符
+    返回:
+        Token: 可用于 current_group.reset() 恢复
+    """
+    return current_group.set(group_id or "system")
+
+
+# 当前 LLM 调用来自哪个调用点（reply、keywords、summary、optimization 等），用于遥测分类
+current_call_site = ContextVar("llm_current_call_site", default="reply")
+
+
+@contextmanager
+def call_site(name):
+    """
+    在 with 块内把发起的 LLM 调用归属到指定调用点，退出时恢复
+
+    参数:
+        name (str): 调用点名称
+    """
+    token = current_call_site.set(name)
+    try:
+        yield
+    finally:
+        current_call_site.reset(token)
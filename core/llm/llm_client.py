@@ -9,6 +9,8 @@ Version: 1.3.0 (Stable_923001)
 llm_client.py - 定义了 LLM 客户端接口。
 """
 from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 
 class LLMClient(ABC):
@@ -44,3 +46,78 @@ class LLMClient(ABC):
             str: LLM 模型生成的回复内容。
         """
         pass
+
+
+class LLMRequestError(Exception):
+    """
+    LLM 请求失败时抛出的异常。
+
+    客户端以 raise_errors=True 创建时，请求失败不再返回兜底文本，而是抛出该异常，
+    以便上层（例如 ResilientLLMClient、LLMRouter）进行重试或故障转移。
+    """
+
+    # 可以重试的 HTTP 状态码：超时、冲突、限流与服务端错误
+    RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+    def __init__(self, message, status_code=None, retry_after=None, retryable=None):
+        """
+        Args:
+            message (str): 错误信息。
+            status_code (int): HTTP 状态码，网络错误时为 None。
+            retry_after (float): 服务端通过 Retry-After 建议的等待秒数。
+            retryable (bool): 是否可以重试，默认按状态码判断，网络错误视为可重试。
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status_code is None or status_code in self.RETRYABLE_STATUS
+        self.retryable = retryable
+
+    @classmethod
+    def from_status_error(cls, error):
+        """
+        根据 httpx.HTTPStatusError 创建异常，并解析 Retry-After 响应头。
+
+        Args:
+            error (httpx.HTTPStatusError): 原始异常。
+
+        Returns:
+            LLMRequestError: 转换后的异常。
+        """
+        retry_after = None
+        header = error.response.headers.get("Retry-After")
+        if header:
+            try:
+                retry_after = max(float(header), 0.0)
+            except ValueError:
+                # Retry-After 也可以是 HTTP 日期
+                try:
+                    retry_after = max((parsedate_to_datetime(header) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+                except (TypeError, ValueError):
+                    retry_after = None
+        return cls(str(error), error.response.status_code, retry_after)
+
+
+# 各客户端在请求失败时返回的兜底文本，这类结果不应被缓存或当作正常回复复用
+FALLBACK_REPLIES = (
+    "子网故障,过来楼下检查一下/。",
+    "请求超时或网络错误，请稍后再试。",
+    "发生未知错误，请联系管理员。",
+    "请求失败，请稍后再试。",
+)
+
+
+def is_fallback_reply(reply):
+    """
+    判断回复是否为客户端请求失败时返回的兜底文本。
+
+    Args:
+        reply (str): LLM 客户端返回的内容。
+
+    Returns:
+        bool: 是兜底文本时返回 True。
+    """
+    if not isinstance(reply, str):
+        return False
+    return reply in FALLBACK_REPLIES or (reply.startswith("请求失败，状态码：") and reply.endswith("请稍后再试。"))
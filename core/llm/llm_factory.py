@@ -16,7 +16,12 @@ from core.llm.plugins.azure_client import AzureClient
 from core.llm.plugins.chatglm_client import ChatGLMClient
 from core.llm.plugins.google_client import GoogleClient
 from core.llm.plugins.openai_client import OpenAIClient
-from config import test_config
+from core.llm.llm_profiles import get_profile
+from core.llm.llm_router import LLMBackend, LLMRouter
+from core.llm.llm_stats import llm_stats
+from core.llm.resilience import ResilientLLMClient
+from core.llm.llm_transport import llm_transport
+from config import test_config, LLM_PROVIDERS, LLM_ROUTER_STRATEGY
 from core.utils.logger import get_logger
 
 _log = get_logger()
@@ -25,15 +30,28 @@ _log = get_logger()
 class LLMFactory:
     """
     LLM 工厂类，用于根据配置文件创建相应的 LLM 客户端。
+    创建出的客户端共享工厂持有的 HTTP 连接池。
     """
 
+    def __init__(self, transport=None):
+        self.transport = transport or llm_transport
+
+    async def aclose(self):
+        """
+        关闭所有 LLM 客户端共享的 HTTP 连接池
+        """
+        await self.transport.aclose()
+
     def create_llm_client(self) -> LLMClient:
         """
         根据配置文件创建 LLM 客户端。
+        配置了 llm_providers 时返回在多个后端之间路由的 LLMRouter。
 
         Returns:
             LLMClient: LLM 客户端实例。
         """
+        if LLM_PROVIDERS:
+            return self.create_llm_router(LLM_PROVIDERS)
 
         # 如果用户没有设置，警告一下
         if not test_config.get("llm_provider"):
@@ -66,28 +84,100 @@ class LLMFactory:
 
         llm_provider = test_config.get("llm_provider", "openai")
         if llm_provider == "openai":
-            return OpenAIClient(test_config.get("openai_secret"),
-                                test_config.get("openai_model"),
-                                test_config.get("openai_api_url"))
+            # OpenAI 的回复模型由 reply 配置决定，默认即 openai_* 配置
+            profile = get_profile("reply")
+            client = self.create_provider_client(llm_provider, profile.secret, profile.model, profile.api_url,
+                                                 raise_errors=True, profile=profile)
+            return ResilientLLMClient(client, profile.endpoint, model=profile.model)
+
+        secret_key = "google_api_key" if llm_provider == "google" else f"{llm_provider}_secret"
+        client = self.create_provider_client(llm_provider,
+                                             test_config.get(secret_key),
+                                             test_config.get(f"{llm_provider}_model"),
+                                             test_config.get(f"{llm_provider}_api_url"),
+                                             raise_errors=True)
+        # 重试与熔断由 ResilientLLMClient 统一处理，最终失败时返回兜底文本
+        return ResilientLLMClient(client, llm_provider, model=test_config.get(f"{llm_provider}_model"))
+
+    def create_profile_client(self, name, fallback=None) -> LLMClient:
+        """
+        根据调用点的模型配置（llm_profiles）创建带重试与熔断的 OpenAI 兼容客户端。
+        调用点与 openai_* 均未配置密钥（例如只使用其他提供商）时返回 fallback。
+
+        Args:
+            name (str): 调用点名称，例如 summary、semantic、optimization。
+            fallback (LLMClient): 没有 OpenAI 配置时使用的客户端，通常为回复客户端。
+
+        Returns:
+            LLMClient: 最终失败时返回兜底文本的客户端实例。
+        """
+        profile = get_profile(name)
+        if not profile.secret and fallback is not None:
+            _log.info(f"<LLM PROFILE> 调用点 {name} 没有 OpenAI 配置，改用回复客户端")
+            return fallback
+        client = self.create_provider_client("openai", profile.secret, profile.model, profile.api_url,
+                                             raise_errors=True, profile=profile)
+        return ResilientLLMClient(client, profile.endpoint, model=profile.model)
+
+    def create_provider_client(self, llm_provider, secret, model, api_url, raise_errors=False,
+                               profile=None) -> LLMClient:
+        """
+        创建指定提供商的 LLM 客户端。
+
+        Args:
+            llm_provider (str): 提供商名称。
+            secret (str): API 密钥。
+            model (str): 模型名称。
+            api_url (str): API 地址。
+            raise_errors (bool): 请求失败时是否抛出 LLMRequestError。
+            profile (LLMProfile): 调用点的模型配置，提供 max_tokens、temperature 与超时，仅 OpenAI 客户端使用。
+
+        Returns:
+            LLMClient: LLM 客户端实例。
+        """
+        if llm_provider == "openai":
+            profile = profile or get_profile("reply")
+            return OpenAIClient(secret, model, api_url, transport=self.transport, raise_errors=raise_errors,
+                                max_tokens=profile.max_tokens, temperature=profile.temperature,
+                                timeout=profile.timeout)
         elif llm_provider == "azure":
-            return AzureClient(test_config.get("azure_secret"),
-                               test_config.get("azure_model"),
-                               test_config.get("azure_api_url"))
+            return AzureClient(secret, model, api_url, transport=self.transport, raise_errors=raise_errors)
         elif llm_provider == "google":
-            return GoogleClient(test_config.get("google_api_key"),
-                                test_config.get("google_model"),
-                                test_config.get("google_api_url"))
+            return GoogleClient(secret, model, api_url)
         elif llm_provider == "anthropic":
-            return AnthropicClient(test_config.get("anthropic_secret"),
-                                   test_config.get("anthropic_model"),
-                                   test_config.get("anthropic_api_url"))
+            return AnthropicClient(secret, model, api_url, transport=self.transport, raise_errors=raise_errors)
         elif llm_provider == "aliyun":
-            return AliyunClient(test_config.get("aliyun_secret"),
-                                test_config.get("aliyun_model"),
-                                test_config.get("aliyun_api_url"))
+            return AliyunClient(secret, model, api_url, transport=self.transport, raise_errors=raise_errors)
         elif llm_provider == "chatglm":
-            return ChatGLMClient(test_config.get("chatglm_secret"),
-                                 test_config.get("chatglm_model"),
-                                 test_config.get("chatglm_api_url"))
+            return ChatGLMClient(secret, model, api_url, transport=self.transport, raise_errors=raise_errors)
         else:
             raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+
+    def create_llm_router(self, providers) -> LLMRouter:
+        """
+        根据 llm_providers 配置创建多后端路由器。
+
+        Args:
+            providers (list[dict]): 每项包含 provider、secret、model、api_url，可选 name、weight。
+
+        Returns:
+            LLMRouter: 路由器实例。
+        """
+        backends = []
+        for i, item in enumerate(providers):
+            llm_provider = item.get("provider", "openai").lower()
+            missing_configs = [key for key in ("secret", "model", "api_url") if not item.get(key)]
+            if missing_configs:
+                _log.error(f"🔥 请在 llm_providers 第 {i + 1} 项中填写：{'、'.join(missing_configs)} 🔥")
+                raise SystemExit(1)
+            client = self.create_provider_client(llm_provider, item["secret"], item["model"], item["api_url"],
+                                                 raise_errors=True)
+            name = item.get("name") or f"{llm_provider}#{i + 1}"
+            # 每个后端独立熔断与重试，最终失败时抛出异常交给路由器转移
+            client = ResilientLLMClient(client, name, raise_errors=True, model=item["model"])
+            backends.append(LLMBackend(name, client, item.get("weight", 1)))
+
+        _log.info(f"🔥当前LLM路由：{'、'.join(backend.name for backend in backends)} ({LLM_ROUTER_STRATEGY})🔥")
+        router = LLMRouter(backends)
+        llm_stats.register("router", router.stats)
+        return router
@@ -0,0 +1,66 @@
+"""
+AmyAlmond Project - core/llm/llm_profiles.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+llm_profiles.py - 按调用点命名的模型配置（模型、端点、max_tokens、temperature、超时）
+"""
+from urllib.parse import urlparse
+
+from config import OPENAI_SECRET, OPENAI_MODEL, OPENAI_API_URL, REQUEST_TIMEOUT, LLM_PROFILES
+
+# 各调用点的默认参数，未在 llm_profiles 中配置的字段取这里的值，模型与端点默认使用 openai_* 配置
+DEFAULT_PROFILES = {
+    "reply": {"max_tokens": 3450, "temperature": 0.85},
+    "summary": {"max_tokens": 200, "temperature": 0.7},
+    "keywords": {"max_tokens": 100, "temperature": 0.7},
+    "semantic": {"max_tokens": 100, "temperature": 0.7},
+    "optimization": {"max_tokens": 3450, "temperature": 0.7},
+}
+
+
+class LLMProfile:
+    """
+    一个调用点使用的模型配置
+
+    endpoint 为重试、熔断与准入限额共享的端点标识：与 openai_api_url 相同时为 "openai"，
+    否则为 "openai@<域名>"，也可以在配置中用 endpoint 字段指定。
+    """
+
+    def __init__(self, name, model, api_url, secret, max_tokens, temperature, timeout, endpoint=None):
+        self.name = name
+        self.model = model
+        self.api_url = api_url
+        self.secret = secret
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.endpoint = endpoint or ("openai" if api_url == OPENAI_API_URL else f"openai@{urlparse(api_url).netloc}")
+
+    def __repr__(self):
+        return f"LLMProfile({self.name}: {self.model} @ {self.endpoint}, max_tokens={self.max_tokens})"
+
+
+def get_profile(name):
+    """
+    获取调用点的模型配置，llm_profiles 中的配置覆盖默认值
+
+    参数:
+        name (str): 调用点名称，例如 reply、summary、keywords、semantic、optimization
+    返回:
+        LLMProfile: 合并后的配置
+    """
+    config = DEFAULT_PROFILES.get(name, DEFAULT_PROFILES["reply"]) | LLM_PROFILES.get(name, {})
+    return LLMProfile(
+        name,
+        model=config.get("model") or OPENAI_MODEL,
+        api_url=config.get("api_url") or OPENAI_API_URL,
+        secret=config.get("secret") or OPENAI_SECRET,
+        max_tokens=config.get("max_tokens"),
+        temperature=config.get("temperature"),
+        timeout=config.get("timeout") or REQUEST_TIMEOUT or 7,
+        endpoint=config.get("endpoint"),
+    )
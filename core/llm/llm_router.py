@@ -0,0 +1,174 @@
+"""
+AmyAlmond Project - core/llm/llm_router.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+llm_router.py - 在多个 LLM 提供商/密钥之间按延迟与健康度路由请求，并在失败时自动转移
+"""
+import asyncio
+import random
+import time
+
+from config import (LLM_ROUTER_STRATEGY, LLM_ROUTER_EWMA_ALPHA, LLM_ROUTER_TIMEOUT, LLM_ROUTER_FAILURE_THRESHOLD,
+                    LLM_ROUTER_COOLDOWN)
+from core.llm.llm_client import LLMClient
+from core.llm.single_flight import coalesce
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class LLMBackend:
+    """
+    路由器中的一个后端，记录该后端的 EWMA 延迟、EWMA 错误率与摘除状态
+    """
+
+    def __init__(self, name, client, weight=1):
+        self.name = name
+        self.client = client
+        self.weight = max(float(weight), 0.01)
+        self.latency = None
+        self.error_rate = 0.0
+        self.inflight = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now):
+        """
+        后端是否可用（未处于摘除期）
+        """
+        return now >= self.cooldown_until
+
+    def score(self):
+        """
+        计算后端得分，越小越优先：EWMA 延迟按并发数放大、按错误率惩罚、按权重缩小。
+        尚无延迟样本的后端得分为 0，保证每个后端都会被试探到；从未成功过的后端排在最后。
+        """
+        if self.latency is None:
+            return 0.0 if self.failures == 0 else float("inf")
+        return self.latency * (1 + self.inflight) * (1 + 4 * self.error_rate) / self.weight
+
+    def record(self, ok, elapsed, alpha):
+        """
+        记录一次请求结果
+        """
+        self.requests += 1
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * (0.0 if ok else 1.0)
+        if ok:
+            self.latency = elapsed if self.latency is None else (1 - alpha) * self.latency + alpha * elapsed
+            self.consecutive_failures = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "ewma_latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "cooling_down": not self.available(time.monotonic()),
+        }
+
+
+class LLMRouter(LLMClient):
+    """
+    多后端 LLM 路由器，实现了 LLMClient 接口。
+
+    每次调用按策略对后端排序后依次尝试：后端抛出异常或超时即记录失败并转移到下一个后端；
+    连续失败达到阈值的后端会被摘除一段时间。后端客户端需以 raise_errors=True 创建，
+    否则失败时返回的兜底文本无法被识别为错误。
+    """
+
+    async def on_message(self, message, reply_message):
+        pass
+
+    def __init__(self, backends, strategy=LLM_ROUTER_STRATEGY, alpha=LLM_ROUTER_EWMA_ALPHA,
+                 timeout=LLM_ROUTER_TIMEOUT, failure_threshold=LLM_ROUTER_FAILURE_THRESHOLD,
+                 cooldown=LLM_ROUTER_COOLDOWN):
+        """
+        参数:
+            backends (list[LLMBackend]): 参与路由的后端
+            strategy (str): latency 或 weighted
+            alpha (float): EWMA 平滑系数
+            timeout (float): 单个后端的请求超时（秒）
+            failure_threshold (int): 连续失败多少次后摘除后端
+            cooldown (float): 摘除时长（秒）
+        """
+        if not backends:
+            raise ValueError("LLMRouter 至少需要一个后端")
+        self.backends = backends
+        self.strategy = strategy
+        self.alpha = alpha
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+    def _ordered_backends(self):
+        """
+        按路由策略返回本次调用的尝试顺序；全部处于摘除期时仍按原顺序全部尝试
+        """
+        now = time.monotonic()
+        candidates = [backend for backend in self.backends if backend.available(now)] or list(self.backends)
+
+        if self.strategy == "weighted":
+            # 按权重做无放回随机抽样，决定尝试顺序
+            ordered, pool = [], list(candidates)
+            while pool:
+                pick = random.choices(pool, weights=[backend.weight for backend in pool])[0]
+                ordered.append(pick)
+                pool.remove(pick)
+            return ordered
+
+        # 得分相同的后端之间随机打散，避免新后端总是按配置顺序被试探
+        return sorted(candidates, key=lambda backend: (backend.score(), random.random()))
+
+    @coalesce
+    async def get_response(self, context, user_input, system_prompt):
+        """
+        根据上下文和用户输入获取回复，失败时自动转移到下一个后端
+
+        返回:
+            str: 回复内容；所有后端都失败时返回兜底文本
+        """
+        for backend in self._ordered_backends():
+            backend.inflight += 1
+            started = time.perf_counter()
+            try:
+                reply = await asyncio.wait_for(
+                    backend.client.get_response(context, user_input, system_prompt), self.timeout)
+            except Exception as e:
+                backend.record(False, time.perf_counter() - started, self.alpha)
+                _log.warning(f"<LLM ROUTER> 后端 {backend.name} 请求失败，尝试转移:")
+                _log.warning(f"   ↳ 错误类型: {type(e).__name__}")
+                _log.warning(f"   ↳ 错误详情: {e}")
+                if backend.consecutive_failures >= self.failure_threshold:
+                    backend.cooldown_until = time.monotonic() + self.cooldown
+                    _log.warning(f"   ↳ 连续失败 {backend.consecutive_failures} 次，摘除 {self.cooldown} 秒")
+                continue
+            finally:
+                backend.inflight -= 1
+
+            backend.record(True, time.perf_counter() - started, self.alpha)
+            _log.debug(f"<LLM ROUTER> 由 {backend.name} 返回，EWMA 延迟 {backend.latency:.3f} 秒")
+            return reply
+
+        _log.error("<LLM ROUTER> 所有 LLM 后端均请求失败")
+        return "子网故障,过来楼下检查一下/。"
+
+    def stats(self):
+        """
+        获取各后端的路由统计
+
+        返回:
+            list[dict]: 每个后端的延迟、错误率、并发与摘除状态
+        """
+        return [backend.stats() for backend in self.backends]
@@ -0,0 +1,104 @@
+"""
+AmyAlmond Project - core/llm/llm_stats.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+llm_stats.py - 汇总 LLM 调用链路各组件的运行指标，定期写入快照文件供 API 进程读取
+"""
+import asyncio
+import json
+import os
+import time
+
+from config import LLM_STATS_FILE
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+# 快照写入间隔（秒）
+SNAPSHOT_INTERVAL = 10
+
+
+class LLMStatsReporter:
+    """
+    LLM 指标汇报器
+
+    各组件通过 register(name, collector) 注册一个返回 dict 的函数；机器人进程中的后台任务
+    每隔 SNAPSHOT_INTERVAL 秒调用所有 collector，把结果原子写入快照文件。
+    """
+
+    def __init__(self, path=LLM_STATS_FILE, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._collectors = {}
+        self._task = None
+
+    def register(self, name, collector):
+        """
+        注册一个指标来源
+
+        参数:
+            name (str): 指标名称，作为快照中的键
+            collector (callable): 无参函数，返回可 JSON 序列化的 dict
+        """
+        self._collectors[name] = collector
+
+    def collect(self):
+        """
+        立即收集所有指标
+        """
+        snapshot = {"updated_at": time.time()}
+        for name, collector in self._collectors.items():
+            try:
+                snapshot[name] = collector()
+            except Exception as e:
+                _log.warning(f"<LLM STATS> 收集指标 {name} 时出错: {e}")
+        return snapshot
+
+    def start(self):
+        """
+        启动定期写入快照的后台任务
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                _log.warning(f"<LLM STATS> 写入指标快照时出错: {e}")
+
+    def write_snapshot(self):
+        """
+        把当前指标原子写入快照文件
+        """
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.collect(), f, ensure_ascii=False, default=str)
+        os.replace(tmp_file, self.path)
+
+    @staticmethod
+    def read_snapshot(path=LLM_STATS_FILE):
+        """
+        读取最近一次写入的指标快照，可在 API 等其他进程中调用
+
+        返回:
+            dict: 快照内容，尚未生成时为空字典
+        """
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+llm_stats = LLMStatsReporter()
@@ -0,0 +1,93 @@
+"""
+AmyAlmond Project - core/llm/llm_transport.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+llm_transport.py - LLM 客户端共享的 HTTP 连接池，避免每次调用都重新进行 DNS/TCP/TLS 握手
+"""
+import asyncio
+import importlib.util
+
+import aiohttp
+import httpx
+
+from config import (REQUEST_TIMEOUT, LLM_HTTP2, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    LLM_KEEPALIVE_EXPIRY)
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class LLMTransport:
+    """
+    LLM HTTP 传输层
+
+    每个提供商持有一个长连接的 httpx.AsyncClient，不同提供商的连接池互不影响；
+    连接会绑定到创建它的事件循环，因此按 (提供商, 事件循环) 缓存。
+    HTTP/2 需要安装 h2 包，未安装时自动退回 HTTP/1.1。
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._sessions = {}
+        self.http2 = LLM_HTTP2
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            _log.warning("<LLM TRANSPORT> 未安装 h2，HTTP/2 已禁用（pip install httpx[http2]）")
+            self.http2 = False
+
+    def get_client(self, provider):
+        """
+        获取指定提供商的共享 httpx.AsyncClient，首次调用时创建
+
+        参数:
+            provider (str): 提供商名称，例如 openai
+        返回:
+            httpx.AsyncClient: 带连接池的客户端
+        """
+        key = (provider, asyncio.get_running_loop())
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=REQUEST_TIMEOUT or 7,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                )
+            )
+            self._clients[key] = client
+            _log.info(f"<LLM TRANSPORT> 已创建 {provider} 连接池 (HTTP/{'2' if self.http2 else '1.1'})")
+        return client
+
+    def get_session(self, provider):
+        """
+        获取指定提供商的共享 aiohttp.ClientSession，供基于 aiohttp 的客户端使用
+        """
+        key = (provider, asyncio.get_running_loop())
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit=LLM_MAX_CONNECTIONS,
+                keepalive_timeout=LLM_KEEPALIVE_EXPIRY
+            ))
+            self._sessions[key] = session
+            _log.info(f"<LLM TRANSPORT> 已创建 {provider} aiohttp 会话")
+        return session
+
+    async def aclose(self):
+        """
+        关闭当前事件循环上创建的所有连接池
+        """
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._clients if key[1] is loop]:
+            await self._clients.pop(key).aclose()
+        for key in [key for key in self._sessions if key[1] is loop]:
+            await self._sessions.pop(key).close()
+        _log.info("<LLM TRANSPORT> 已关闭 LLM 连接池")
+
+
+llm_transport = LLMTransport()
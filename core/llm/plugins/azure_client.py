@@ -3,10 +3,12 @@
 提供商: Microsoft Azure（https://azure.microsoft.com/zh-cn/）
 文档: https://learn.microsoft.com/en-us/azure/cognitive-services/openai/
 """
-import time
 import httpx
 from core.utils.logger import get_logger
-from core.llm.llm_client import LLMClient
+from core.llm.single_flight import coalesce
+from core.llm.llm_client import LLMClient, LLMRequestError
+from core.llm.telemetry import report_usage
+from core.llm.llm_transport import llm_transport
 
 _log = get_logger()
 
@@ -28,15 +30,18 @@ class AzureClient(LLMClient):
     async def on_message(self, message, reply_message):
         pass
 
-    def __init__(self, azure_secret, azure_model, azure_api_url):
+    def __init__(self, azure_secret, azure_model, azure_api_url, transport=None, raise_errors=False):
         self.azure_secret = azure_secret
         self.azure_model = azure_model
         self.azure_api_url = azure_api_url
 
-        # 初始化 last_request_time 和 last_request_content
-        self.last_request_time = 0
-        self.last_request_content = None
+        # 共享的 HTTP 连接池，默认使用全局 LLMTransport
+        self.transport = transport or llm_transport
 
+        # 为 True 时请求失败抛出 LLMRequestError 而不是返回兜底文本
+        self.raise_errors = raise_errors
+
+    @coalesce
     async def get_response(self, context, user_input, system_prompt):
         """
         根据给定的上下文和用户输入,从 Azure 模型获取回复
@@ -52,11 +57,6 @@ class AzureClient(LLMClient):
         异常:
             httpx.HTTPStatusError: 当请求 Azure API 出现问题时引发
         """
-        # 检查是否为重复请求
-        if time.time() - self.last_request_time < 0.6 and user_input == self.last_request_content and "<get memory>" not in user_input:
-            _log.warning(f"Duplicate request detected and ignored: {user_input}")
-            return None
-
         payload = {
             "model": self.azure_model,
             "temperature": 0.85,
@@ -78,10 +78,11 @@ class AzureClient(LLMClient):
         _log.debug(f"Request payload: {payload}")
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.azure_api_url, headers=headers, json=payload)
-                response.raise_for_status()
-                response_data = response.json()
+            client = self.transport.get_client("azure")
+            response = await client.post(self.azure_api_url, headers=headers, json=payload)
+            response.raise_for_status()
+            response_data = response.json()
+            report_usage(response_data)
 
             # 记录完整的响应数据
             _log.debug(f"Response data: {response_data}")
@@ -90,10 +91,6 @@ class AzureClient(LLMClient):
                                                                          response_data['choices'][0]['message'][
                                                                              'content'] else None
 
-            #  更新 last_request_time 和 last_request_content
-            self.last_request_time = time.time()
-            self.last_request_content = user_input
-
             if reply is None:
                 _log.warning(f"Azure response is empty for user input: {user_input}.")
             else:
@@ -103,4 +100,6 @@ class AzureClient(LLMClient):
             return reply
         except httpx.HTTPStatusError as e:
             _log.error(f"Error requesting from Azure API: {e}", exc_info=True)
+            if self.raise_errors:
+                raise LLMRequestError.from_status_error(e) from e
             return "子网故障,过来楼下检查一下/。"
\ No newline at end of file
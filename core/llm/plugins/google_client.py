@@ -5,7 +5,6 @@
 
 请注意：如需使用，请先取消 第12-13行 和 38-40行 的注释，并安装对应的包。
 """
-import time
 import asyncio
 from typing import List, Dict
 
@@ -13,6 +12,7 @@ from typing import List, Dict
 # from google.cloud import aiplatform_v1
 
 from core.utils.logger import get_logger
+from core.llm.single_flight import coalesce
 from core.llm.llm_client import LLMClient
 _log = get_logger()
 
@@ -39,10 +39,7 @@ class GoogleClient(LLMClient):
         # client_options = ClientOptions(api_key=self.google_api_key)
         # self.client = aiplatform_v1.PredictionServiceClient(client_options=client_options)
 
-        # 初始化 last_request_time 和 last_request_content
-        self.last_request_time = 0
-        self.last_request_content = None
-
+    @coalesce
     async def get_response(self, context: List[Dict], user_input: str, system_prompt: str) -> str:
         """
         根据给定的上下文和用户输入,从 Google AI Platform 模型获取回复
@@ -58,11 +55,6 @@ class GoogleClient(LLMClient):
         异常:
             Exception: 当请求 Google AI Platform API 出现问题时引发
         """
-        # 检查是否为重复请求
-        if time.time() - self.last_request_time < 0.6 and user_input == self.last_request_content and "<get memory>" not in user_input:
-            _log.warning(f"Duplicate request detected and ignored: {user_input}")
-            return None
-
         # 构建请求实例
         endpoint = f"{self.google_api_url}/projects//locations//publishers//models/{self.google_model}:predict"
         # 将上下文信息合并到单个字符串中
@@ -77,9 +69,6 @@ class GoogleClient(LLMClient):
             instances=[instance],
             parameters=parameters,
         ))
-        #  更新 last_request_time 和 last_request_content
-        self.last_request_time = time.time()
-        self.last_request_content = user_input
         # 处理响应
         if response.predictions:
             reply = response.predictions[0]['content']
@@ -10,22 +10,33 @@ inject_memory_client.py - 实现与 LLM 交互的客户端，用于处理记忆
 """
 
 import httpx
+from core.llm.call_context import call_site
+from core.llm.llm_client import LLMRequestError
+from core.llm.llm_profiles import get_profile
+from core.llm.llm_transport import llm_transport
+from core.llm.resilience import resilience_policy
+from core.llm.single_flight import coalesce
+from core.llm.response_cache import response_cache
 from core.utils.logger import get_logger
+from core.utils.utils import calculate_token_count
 
 _log = get_logger()
 
+KEYWORDS_SYSTEM_PROMPT = "请提取此Prompt中的关键词用于记忆查询，请注意语义联想搜索。"
+
 
 class InjectMemoryClient:
     """
-    用于与 LLM 交互的客户端类，专注于记忆提取和注入任务
+    用于与 LLM 交互的客户端类，专注于记忆提取和注入任务。
+    关键词提取与对话摘要分别使用 keywords 与 summary 调用点的模型配置（llm_profiles）。
     """
 
-    def __init__(self, openai_secret, openai_model, openai_api_url):
-        self.openai_secret = openai_secret
-        self.openai_model = openai_model
-        self.openai_api_url = openai_api_url
-        self.last_request_time = 0
-        self.last_request_content = None
+    def __init__(self, transport=None):
+        self.keywords_profile = get_profile("keywords")
+        self.summary_profile = get_profile("summary")
+
+        # 共享的 HTTP 连接池，默认使用全局 LLMTransport
+        self.transport = transport or llm_transport
 
     async def get_keywords_for_memory_retrieval(self, prompt):
         """
@@ -35,25 +46,30 @@ class InjectMemoryClient:
             prompt (str): 需要提取关键词的提示内容
 
         返回:
-            str: LLM 生成的关键词
+            str: LLM 生成的关键词，相同输入直接复用缓存结果
+        """
+        with call_site("keywords"):
+            return await response_cache.get_or_compute("keywords", self.keywords_profile.model, KEYWORDS_SYSTEM_PROMPT,
+                                                       prompt, lambda: self._request_keywords(prompt))
+
+    @coalesce
+    async def _request_keywords(self, prompt):
+        """
+        请求 LLM 提取关键词
         """
+        profile = self.keywords_profile
         payload = {
-            "openai_model": self.openai_model,
-            "temperature": 0.7,
-            "max_tokens": 100,
-            "messages": [{"role": "system", "content": "请提取此Prompt中的关键词用于记忆查询，请注意语义联想搜索。"},
+            "model": profile.model,
+            "temperature": profile.temperature,
+            "max_tokens": profile.max_tokens,
+            "messages": [{"role": "system", "content": KEYWORDS_SYSTEM_PROMPT},
                          {"role": "user", "content": prompt}]
         }
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.openai_secret}"
-        }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.openai_api_url, headers=headers, json=payload)
-                response.raise_for_status()
-                response_data = response.json()
+            response_data = await resilience_policy.call(profile.endpoint, lambda: self._post(profile, payload),
+                                                         calculate_token_count(payload["messages"], profile.model),
+                                                         profile.model)
 
             keywords = response_data['choices'][0]['message']['content'] if 'choices' in response_data and \
                                                                             response_data['choices'][0]['message'][
@@ -65,10 +81,11 @@ class InjectMemoryClient:
                 _log.info(f"LLM provided keywords: {keywords}")
 
             return keywords
-        except httpx.HTTPStatusError as e:
+        except LLMRequestError as e:
             _log.error(f"Error requesting keywords from LLM API: {e}", exc_info=True)
             return ""
 
+    @coalesce
     async def get_memory_summary(self, context):
         """
         从 LLM 获取当前对话的摘要
@@ -79,22 +96,19 @@ class InjectMemoryClient:
         返回:
             str: LLM 生成的对话摘要
         """
+        profile = self.summary_profile
         payload = {
-            "openai_model": self.openai_model,
-            "temperature": 0.7,
-            "max_tokens": 200,
+            "model": profile.model,
+            "temperature": profile.temperature,
+            "max_tokens": profile.max_tokens,
             "messages": context + [{"role": "system", "content": "请总结以上对话内容。"}]
         }
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.openai_secret}"
-        }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.openai_api_url, headers=headers, json=payload)
-                response.raise_for_status()
-                response_data = response.json()
+            with call_site("summary"):
+                response_data = await resilience_policy.call(profile.endpoint, lambda: self._post(profile, payload),
+                                                             calculate_token_count(payload["messages"], profile.model),
+                                                             profile.model)
 
             summary = response_data['choices'][0]['message']['content'] if 'choices' in response_data and \
                                                                            response_data['choices'][0]['message'][
@@ -106,6 +120,22 @@ class InjectMemoryClient:
                 _log.info(f"LLM provided summary: {summary}")
 
             return summary
-        except httpx.HTTPStatusError as e:
+        except LLMRequestError as e:
             _log.error(f"Error requesting summary from LLM API: {e}", exc_info=True)
             return ""
+
+    async def _post(self, profile, payload):
+        """
+        按模型配置发送一次请求，HTTP 错误转换为 LLMRequestError 以便重试策略判断
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {profile.secret}"
+        }
+        client = self.transport.get_client("openai")
+        response = await client.post(profile.api_url, headers=headers, json=payload, timeout=profile.timeout)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise LLMRequestError.from_status_error(e) from e
+        return response.json()
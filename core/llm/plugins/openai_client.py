@@ -1,8 +1,10 @@
 import asyncio
-import time
 import httpx
 from core.utils.logger import get_logger
-from core.llm.llm_client import LLMClient
+from core.llm.single_flight import coalesce
+from core.llm.llm_client import LLMClient, LLMRequestError
+from core.llm.telemetry import report_usage
+from core.llm.llm_transport import llm_transport
 from config import REQUEST_TIMEOUT
 
 _log = get_logger()
@@ -16,19 +18,27 @@ class OpenAIClient(LLMClient):
     async def on_message(self, message, reply_message):
         pass
 
-    def __init__(self, openai_secret, openai_model, openai_api_url):
+    def __init__(self, openai_secret, openai_model, openai_api_url, transport=None, raise_errors=False,
+                 max_tokens=3450, temperature=0.85, timeout=None):
         self.openai_secret = openai_secret
         self.openai_model = openai_model
         self.openai_api_url = openai_api_url
 
-        # 初始化 last_request_time 和 last_request_content
-        self.last_request_time = 0
-        self.last_request_content = None
+        # 生成参数，由调用点的模型配置（llm_profiles）决定
+        self.max_tokens = max_tokens
+        self.temperature = temperature
 
         # 从配置文件中读取超时设置，默认为7秒
-        self.timeout = REQUEST_TIMEOUT or 7
+        self.timeout = timeout or REQUEST_TIMEOUT or 7
 
-    async def get_response(self, context, user_input, system_prompt, retries=2):
+        # 共享的 HTTP 连接池，默认使用全局 LLMTransport
+        self.transport = transport or llm_transport
+
+        # 为 True 时请求失败抛出 LLMRequestError 而不是返回兜底文本，由上层重试或故障转移
+        self.raise_errors = raise_errors
+
+    @coalesce
+    async def get_response(self, context, user_input, system_prompt):
         """
         根据给定的上下文和用户输入,从 OpenAI 模型获取回复
 
@@ -36,7 +46,6 @@ class OpenAIClient(LLMClient):
             context (list): 对话上下文,包含之前的对话内容
             user_input (str): 用户的输入内容
             system_prompt (str): 系统提示
-            retries (int): 出现错误时的最大重试次数，默认值为2次
 
         返回:
             str: OpenAI 模型生成的回复内容
@@ -44,18 +53,12 @@ class OpenAIClient(LLMClient):
         异常:
             httpx.HTTPStatusError: 当请求 OpenAI API 出现问题时引发
         """
-        # 检查是否为重复请求
-        if time.time() - self.last_request_time < 0.6 and user_input == self.last_request_content and "<get memory>" not in user_input:
-            _log.warning("<DUPLICATE> 检测到重复请求，已忽略:")
-            _log.warning(f"   ↳ 用户输入: {user_input}")
-            return None
-
         payload = {
             "model": self.openai_model,
-            "temperature": 0.85,
+            "temperature": self.temperature,
             "top_p": 1,
             "presence_penalty": 1,
-            "max_tokens": 3450,
+            "max_tokens": self.max_tokens,
             "messages": [
                             {"role": "system", "content": system_prompt}
                         ] + context + [
@@ -73,72 +76,55 @@ class OpenAIClient(LLMClient):
         _log.debug(f"   ↳ Payload: {payload}")
         _log.debug(f"   ↳ Headers: {headers}")
 
-        for attempt in range(retries + 1):
-            try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(self.openai_api_url, headers=headers, json=payload)
-                    response.raise_for_status()
-                    response_data = response.json()
-
-                # 记录完整的响应数据
-                _log.debug("<RESPONSE> 完整响应数据:")
-                _log.debug(f"   ↳ {response_data}")
-
-                reply = response_data['choices'][0]['message']['content'] if 'choices' in response_data and \
-                                                                             response_data['choices'][0]['message'][
-                                                                                 'content'] else None
-
-                # 更新 last_request_time 和 last_request_content
-                self.last_request_time = time.time()
-                self.last_request_content = user_input
-
-                if reply is None:
-                    _log.warning("<RESPONSE> OpenAI 回复为空:")
-                    _log.warning(f"   ↳ 用户输入: {user_input}")
-                else:
-                    # 记录 OpenAI 的回复内容
-                    _log.info("<RESPONSE> OpenAI 回复:")
-                    _log.info(f"   ↳ 内容: {reply}")
-
-                return reply
-
-            except httpx.HTTPStatusError as e:
-                _log.error("<ERROR> 🚨请求错误:")
-                _log.error(f"   ↳ 状态码: {e.response.status_code}")
-                _log.error(f"   ↳ 错误详情: {e}")
-                _log.error(f"   ↳ 返回内容: {e.response.text}")
-                if e.response.status_code in {503, 504, 500}:  # 处理常见错误状态码
-                    _log.info(f"请求失败，状态码：{e.response.status_code}。正在尝试重试...({attempt + 1}/{retries})")
-                    if attempt < retries:
-                        await asyncio.sleep(2)  # 等待2秒后重试
-                        continue
-                return f"请求失败，状态码：{e.response.status_code}。请稍后再试。"
-
-
-            except httpx.RequestError as e:
-                _log.error("<ERROR> 请求异常:")
-                _log.error(f"   ↳ 错误详情: {e}")
-                _log.error(f"   ↳ 错误类型: {type(e)}")
-                if attempt < retries:
-                    _log.info(f"请求异常，正在尝试重试...({attempt + 1}/{retries})")
-                    await asyncio.sleep(2)  # 等待2秒后重试
-                    continue
-                return "请求超时或网络错误，请稍后再试。"
-
-
-            except Exception as e:
-
-                _log.error("<ERROR> 未知错误:")
-                _log.error(f"   ↳ 错误详情: {e}")
-                _log.error(f"   ↳ 错误类型: {type(e)}")
-                if attempt < retries:
-                    _log.info(f"发生未知错误，正在尝试重试...({attempt + 1}/{retries})")
-                    await asyncio.sleep(2)  # 等待2秒后重试
-                    continue
-
-                return "发生未知错误，请联系管理员。"
-
-        return "请求失败，请稍后再试。"
+        try:
+            client = self.transport.get_client("openai")
+            response = await client.post(self.openai_api_url, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            response_data = response.json()
+            report_usage(response_data)
+
+            # 记录完整的响应数据
+            _log.debug("<RESPONSE> 完整响应数据:")
+            _log.debug(f"   ↳ {response_data}")
+
+            reply = response_data['choices'][0]['message']['content'] if 'choices' in response_data and \
+                                                                         response_data['choices'][0]['message'][
+                                                                             'content'] else None
+
+            if reply is None:
+                _log.warning("<RESPONSE> OpenAI 回复为空:")
+                _log.warning(f"   ↳ 用户输入: {user_input}")
+            else:
+                # 记录 OpenAI 的回复内容
+                _log.info("<RESPONSE> OpenAI 回复:")
+                _log.info(f"   ↳ 内容: {reply}")
+
+            return reply
+
+        except httpx.HTTPStatusError as e:
+            _log.error("<ERROR> 🚨请求错误:")
+            _log.error(f"   ↳ 状态码: {e.response.status_code}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            _log.error(f"   ↳ 返回内容: {e.response.text}")
+            if self.raise_errors:
+                raise LLMRequestError.from_status_error(e) from e
+            return f"请求失败，状态码：{e.response.status_code}。请稍后再试。"
+
+        except httpx.RequestError as e:
+            _log.error("<ERROR> 请求异常:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            _log.error(f"   ↳ 错误类型: {type(e)}")
+            if self.raise_errors:
+                raise LLMRequestError(str(e)) from e
+            return "请求超时或网络错误，请稍后再试。"
+
+        except Exception as e:
+            _log.error("<ERROR> 未知错误:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            _log.error(f"   ↳ 错误类型: {type(e)}")
+            if self.raise_errors:
+                raise LLMRequestError(str(e), retryable=False) from e
+            return "发生未知错误，请联系管理员。"
 
     async def test(self):
         """
@@ -1,6 +1,7 @@
 import aiohttp
 import asyncio
 from config import TEA_URL, TEA_SECRET, TEA_MODEL, DIMENSION
+from core.llm.llm_transport import llm_transport
 from core.utils.logger import get_logger
 
 _log = get_logger()
@@ -11,11 +12,12 @@ class TeaClient:
     Tea API 客户端，用于与LLM模型交互以生成向量。
     """
 
-    def __init__(self):
+    def __init__(self, transport=None):
         self.tea_url = TEA_URL
         self.tea_secret = TEA_SECRET
         self.tea_model = TEA_MODEL
         self.dimension = DIMENSION
+        self.transport = transport or llm_transport
 
     async def generate_vector(self, input_text, max_retries=3, timeout=130):
         """
@@ -54,10 +56,10 @@ class TeaClient:
 
         for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(self.tea_url, headers=headers, json=payload, timeout=timeout) as response:
-                        response.raise_for_status()
-                        response_data = await response.json()
+                session = self.transport.get_session("tea")
+                async with session.post(self.tea_url, headers=headers, json=payload, timeout=timeout) as response:
+                    response.raise_for_status()
+                    response_data = await response.json()
 
                 _log.debug(f"Tea API Response data: {response_data}")
 
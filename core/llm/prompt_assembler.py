@@ -0,0 +1,140 @@
+"""
+AmyAlmond Project - core/llm/prompt_assembler.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+prompt_assembler.py - 按固定布局组装发送给 LLM 的上下文，使提供商侧的前缀缓存尽可能命中
+"""
+import hashlib
+
+from config import MAX_CONTEXT_TOKENS, PROMPT_TRIM_LOW_WATERMARK
+from core.llm.llm_stats import llm_stats
+from core.utils.logger import get_logger
+from core.utils.tokenizer import token_counter, TOKENS_PER_MESSAGE
+from core.utils.utils import calculate_token_count
+
+_log = get_logger()
+
+MEMORY_TEMPLATE = "<在数据库查找到的你的长期记忆，请谨慎使用：{}>"
+
+
+def _fingerprint(message):
+    raw = f"{message.get('role')}\x00{message.get('content')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class PromptAssembler:
+    """
+    Prompt 组装器
+
+    布局固定为：系统提示（由客户端放在最前，逐字节不变）→ 上下文摘要 → 对话历史 → 本轮检索到的记忆，
+    用户输入由客户端追加在最后。越靠前的部分越稳定，易变的记忆放在末尾，不会打断前面的公共前缀。
+    历史超出 Token 上限时一次裁剪到 low_watermark 比例，而不是每轮丢弃一条，从而在之后几轮保持前缀不变。
+    每次组装都会与该群组上一轮的结果比较，统计保持不变的前缀 Token 数。
+    """
+
+    def __init__(self, max_tokens=MAX_CONTEXT_TOKENS, low_watermark=PROMPT_TRIM_LOW_WATERMARK):
+        self.max_tokens = max_tokens
+        self.low_watermark = low_watermark
+        self._previous = {}
+        self._trim_start = {}
+        self.totals = {"turns": 0, "prompt_tokens": 0, "stable_prefix_tokens": 0}
+        self.last_turn = {}
+
+    def assemble(self, group_id, system_prompt, history, memories=()):
+        """
+        组装上下文
+
+        参数:
+            group_id (str): 群组的唯一标识符
+            system_prompt (str): 系统提示，仅用于前缀稳定性统计，不会出现在返回结果中
+            history (list): 对话历史，带 `summary: True` 的消息视为摘要
+            memories (list[str]): 本轮检索到的记忆内容
+        返回:
+            list: 只包含 role 与 content 的上下文消息列表
+        """
+        summaries, messages = [], []
+        for msg in history:
+            content = msg.get("content")
+            if not content or not content.strip():
+                continue
+            target = summaries if msg.get("summary") else messages
+            target.append({"role": msg["role"], "content": content})
+
+        # 记忆去重后按检索顺序拼成一条消息放在末尾
+        unique_memories = list(dict.fromkeys(memory for memory in memories if memory))
+        memory_messages = [{"role": "user", "content": MEMORY_TEMPLATE.format("\n".join(unique_memories))}] \
+            if unique_memories else []
+
+        messages = self._trim(group_id, messages, calculate_token_count(summaries + memory_messages))
+        context = summaries + messages + memory_messages
+        self._record(group_id, [{"role": "system", "content": system_prompt}] + context)
+        return context
+
+    def _trim(self, group_id, messages, reserved):
+        """
+        历史超出上限时从最早的消息开始裁剪，一次裁剪到 low_watermark 比例；
+        记住裁剪后的第一条消息，之后几轮从同一位置开始，直到再次超出上限
+        """
+        start = self._trim_start.get(group_id)
+        if start is not None:
+            fingerprints = [_fingerprint(msg) for msg in messages]
+            if start in fingerprints:
+                messages = messages[fingerprints.index(start):]
+
+        budget = self.max_tokens - reserved
+        counts = [count + TOKENS_PER_MESSAGE
+                  for count in token_counter.count_batch([msg["content"] for msg in messages])]
+        total = sum(counts)
+        if total <= budget:
+            return messages
+
+        target = budget * self.low_watermark
+        start = 0
+        while start < len(messages) and total > target:
+            total -= counts[start]
+            start += 1
+        messages = messages[start:]
+        if messages:
+            self._trim_start[group_id] = _fingerprint(messages[0])
+        _log.debug(f"<PROMPT> 历史超出上限，已裁剪至 {total}/{budget} Token")
+        return messages
+
+    def _record(self, group_id, prompt):
+        """
+        与该群组上一轮比较，统计保持不变的前缀 Token 数
+        """
+        fingerprints = [_fingerprint(msg) for msg in prompt]
+        previous = self._previous.get(group_id, [])
+        stable = 0
+        while stable < min(len(previous), len(fingerprints)) and previous[stable] == fingerprints[stable]:
+            stable += 1
+        self._previous[group_id] = fingerprints
+
+        total_tokens = calculate_token_count(prompt)
+        stable_tokens = calculate_token_count(prompt[:stable])
+        self.totals["turns"] += 1
+        self.totals["prompt_tokens"] += total_tokens
+        self.totals["stable_prefix_tokens"] += stable_tokens
+        self.last_turn[group_id] = {"prompt_tokens": total_tokens, "stable_prefix_tokens": stable_tokens}
+        _log.debug(f"<PROMPT> 群组 {group_id} 稳定前缀: {stable_tokens}/{total_tokens} Token ({stable}/{len(prompt)} 条消息)")
+
+    def stats(self):
+        """
+        获取前缀稳定性统计
+
+        返回:
+            dict: 累计稳定前缀占比与各群组最近一轮的数据
+        """
+        prompt_tokens = self.totals["prompt_tokens"]
+        return self.totals | {
+            "stable_prefix_ratio": round(self.totals["stable_prefix_tokens"] / prompt_tokens, 4) if prompt_tokens else None,
+            "groups": dict(self.last_turn),
+        }
+
+
+prompt_assembler = PromptAssembler()
+llm_stats.register("prompt", prompt_assembler.stats)
@@ -0,0 +1,266 @@
+"""
+AmyAlmond Project - core/llm/resilience.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+resilience.py - LLM 调用的重试（指数退避 + 抖动、Retry-After、重试预算）与按端点熔断
+"""
+import asyncio
+import random
+import time
+
+import httpx
+
+from config import (LLM_RETRY_MAX_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, LLM_RETRY_BUDGET_RATIO,
+                    LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_TIMEOUT)
+from core.llm.admission import admission_registry
+from core.llm.llm_client import LLMClient, LLMRequestError
+from core.llm.llm_stats import llm_stats
+from core.llm.single_flight import coalesce
+from core.llm.telemetry import llm_telemetry
+from core.utils.logger import get_logger
+from core.utils.utils import calculate_token_count
+
+_log = get_logger()
+
+# 重试预算的上限，保证低流量时也能有少量重试
+RETRY_BUDGET_CAP = 10
+
+
+class CircuitOpenError(LLMRequestError):
+    """
+    熔断器断开时直接抛出，不向上游发送请求
+    """
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"端点 {endpoint} 已熔断，{retry_in:.1f} 秒后半开探测", retryable=False)
+        self.endpoint = endpoint
+
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器
+
+    closed：正常放行，连续失败达到阈值后转为 open；
+    open：直接拒绝，reset_timeout 秒后转为 half_open；
+    half_open：只放行一个探测请求，成功则 closed，失败则重新 open。
+    """
+
+    def __init__(self, endpoint, failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=LLM_BREAKER_RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def before_call(self):
+        """
+        调用前检查，断开时抛出 CircuitOpenError
+        """
+        if self.state == "open":
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError(self.endpoint, self.reset_timeout - elapsed)
+            self.state = "half_open"
+            self.probing = False
+            _log.info(f"<CIRCUIT> 端点 {self.endpoint} 进入半开状态，放行一次探测")
+        if self.state == "half_open":
+            if self.probing:
+                raise CircuitOpenError(self.endpoint, 0)
+            self.probing = True
+
+    def on_success(self):
+        if self.state != "closed":
+            _log.info(f"<CIRCUIT> 端点 {self.endpoint} 探测成功，熔断器恢复闭合")
+        self.state = "closed"
+        self.failures = 0
+        self.probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                _log.warning(f"<CIRCUIT> 端点 {self.endpoint} 熔断:")
+                _log.warning(f"   ↳ 连续失败: {self.failures} 次")
+                _log.warning(f"   ↳ {self.reset_timeout} 秒后半开探测")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class ResiliencePolicy:
+    """
+    LLM 调用的弹性策略，按端点维护熔断器与重试预算
+
+    可重试的错误按指数退避 + 完全抖动等待后重试，服务端给出 Retry-After 时以其为准；
+    每次请求为端点积累 budget_ratio 个重试额度，额度耗尽后不再重试，故障期间重试量不会超过请求量的固定比例。
+    """
+
+    def __init__(self, max_attempts=LLM_RETRY_MAX_ATTEMPTS, base_delay=LLM_RETRY_BASE_DELAY,
+                 max_delay=LLM_RETRY_MAX_DELAY, budget_ratio=LLM_RETRY_BUDGET_RATIO):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self._breakers = {}
+        self._budgets = {}
+        self.totals = {"calls": 0, "retries": 0, "budget_exhausted": 0, "rejected_by_breaker": 0}
+
+    def breaker(self, endpoint):
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(endpoint)
+        return self._breakers[endpoint]
+
+    async def call(self, endpoint, factory, cost=0, model=None):
+        """
+        按策略执行一次 LLM 调用，每次尝试前先通过该端点的准入控制；整个调用（含重试）记入遥测
+
+        参数:
+            endpoint (str): 端点标识，同一端点共享熔断器、重试预算与准入限额
+            factory (callable): 无参协程函数，每次尝试都会重新调用
+            cost (int): 预估消耗的 Token 数，用于 TPM 限流
+            model (str): 模型名，用于遥测分类与费用计算
+        返回:
+            factory 的结果
+        异常:
+            LLMRequestError: 重试耗尽、错误不可重试、熔断器断开或准入被拒绝时抛出
+        """
+        async with llm_telemetry.track(endpoint, model, cost) as record:
+            result = await self._call(endpoint, factory, cost, record)
+            record.set_result(result)
+            return result
+
+    async def _call(self, endpoint, factory, cost, record):
+        breaker = self.breaker(endpoint)
+        admission = admission_registry.get(endpoint)
+        self.totals["calls"] += 1
+        self._budgets[endpoint] = min(self._budgets.get(endpoint, RETRY_BUDGET_CAP) + self.budget_ratio,
+                                      RETRY_BUDGET_CAP)
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self.totals["rejected_by_breaker"] += 1
+                raise
+
+            try:
+                await admission.acquire(cost)
+            except BaseException:
+                # 未能获得准入（被拒绝或等待时被取消）时释放半开探测名额
+                breaker.probing = False
+                raise
+
+            try:
+                result = await factory()
+            except LLMRequestError as e:
+                error = e
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                error = LLMRequestError(f"{type(e).__name__}: {e}")
+            except asyncio.CancelledError:
+                # 调用方取消不说明端点有问题，只释放半开探测名额
+                breaker.probing = False
+                raise
+            except Exception:
+                # 其他异常（例如 200 响应格式异常导致的 KeyError/ValueError）计为失败但不重试，
+                # 否则半开探测名额不会释放，端点将永远无法再被探测
+                breaker.on_failure()
+                raise
+            else:
+                breaker.on_success()
+                return result
+
+            if not error.retryable:
+                # 不可重试的错误（例如 400/401）说明请求本身有问题，不计入熔断
+                breaker.probing = False
+                raise error
+            breaker.on_failure()
+
+            if attempt >= self.max_attempts or breaker.state == "open":
+                raise error
+            if self._budgets[endpoint] < 1:
+                self.totals["budget_exhausted"] += 1
+                _log.warning(f"<RETRY> 端点 {endpoint} 的重试预算已耗尽，放弃重试")
+                raise error
+            self._budgets[endpoint] -= 1
+            self.totals["retries"] += 1
+            record.retries += 1
+
+            delay = self._backoff(attempt, error.retry_after)
+            _log.info(f"<RETRY> 端点 {endpoint} 请求失败，{delay:.2f} 秒后重试 ({attempt}/{self.max_attempts - 1}):")
+            _log.info(f"   ↳ 状态码: {error.status_code}")
+            _log.info(f"   ↳ 错误详情: {error}")
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt, retry_after=None):
+        """
+        计算第 attempt 次失败后的等待时间：有 Retry-After 时遵循它（不超过上限），否则指数退避 + 完全抖动
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def stats(self):
+        """
+        获取重试与熔断统计
+
+        返回:
+            dict: 累计指标、各端点的熔断器状态与剩余重试预算
+        """
+        return {
+            "totals": dict(self.totals),
+            "endpoints": {
+                endpoint: breaker.stats() | {"retry_budget": round(self._budgets.get(endpoint, 0), 2)}
+                for endpoint, breaker in self._breakers.items()
+            },
+        }
+
+
+resilience_policy = ResiliencePolicy()
+llm_stats.register("resilience", resilience_policy.stats)
+
+
+class ResilientLLMClient(LLMClient):
+    """
+    为任意 LLMClient 加上重试与熔断，实现了 LLMClient 接口。
+
+    被包装的客户端需以 raise_errors=True 创建。raise_errors=False 时（单提供商模式），
+    最终失败返回兜底文本；为 True 时（路由器后端）抛出异常，由路由器转移到其他后端。
+    其余属性（例如 openai_model）透传给被包装的客户端。model 用于选择预估 Token 数时的编码。
+    """
+
+    def __init__(self, client, endpoint, policy=None, raise_errors=False, model=None):
+        self.client = client
+        self.endpoint = endpoint
+        self.policy = policy or resilience_policy
+        self.raise_errors = raise_errors
+        self.model = model
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def on_message(self, message, reply_message):
+        return await self.client.on_message(message, reply_message)
+
+    @coalesce
+    async def get_response(self, context, user_input, system_prompt):
+        cost = calculate_token_count(
+            [{"content": system_prompt}, *context, {"content": user_input}], self.model)
+        try:
+            return await self.policy.call(
+                self.endpoint, lambda: self.client.get_response(context, user_input, system_prompt), cost,
+                self.model or getattr(self.client, "openai_model", None))
+        except LLMRequestError as e:
+            if self.raise_errors:
+                raise
+            _log.error(f"<RETRY> 端点 {self.endpoint} 请求最终失败: {e}")
+            return "请求失败，请稍后再试。"
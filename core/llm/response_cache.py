@@ -0,0 +1,261 @@
+"""
+AmyAlmond Project - core/llm/response_cache.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+response_cache.py - LLM 辅助调用的内容寻址响应缓存（内存 LRU + SQLite 持久化）
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import LLM_CACHE_ENABLED, LLM_CACHE_FILE, LLM_CACHE_TTL, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_MAX_ENTRIES
+from core.llm.llm_client import is_fallback_reply
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+# 统计计数落盘的最小间隔（秒），供 API 进程读取
+STATS_FLUSH_INTERVAL = 10
+# 每写入多少条检查一次过期与容量
+EVICTION_CHECK_EVERY = 100
+
+STAT_FIELDS = ("memory_hits", "disk_hits", "misses", "stores", "evictions")
+
+
+def cache_key(kind, model, system_prompt, user_input):
+    """
+    计算缓存键：(调用类型, 模型, 系统提示, 输入) 的 SHA-256
+
+    参数:
+        kind (str): 调用类型，例如 keywords
+        model (str): 模型名称
+        system_prompt (str): 系统提示
+        user_input: 输入内容，可以是字符串或消息列表
+    返回:
+        str: 十六进制摘要
+    """
+    raw = json.dumps([kind, model, system_prompt, user_input], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    内容寻址的 LLM 响应缓存
+
+    先查内存 LRU，未命中再查 SQLite；两级都按 TTL 过期，并分别按条目数淘汰最久未访问的条目。
+    命中/未命中等计数按调用类型统计，并定期写入 SQLite 的 stats 表，供独立运行的 API 进程读取。
+    """
+
+    def __init__(self, path=LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+                 max_entries=LLM_CACHE_MAX_ENTRIES, enabled=LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pending_stats = {}
+        self._last_stats_flush = time.monotonic()
+        self._stores_since_check = 0
+
+    async def get_or_compute(self, kind, model, system_prompt, user_input, compute):
+        """
+        命中缓存时直接返回，否则调用 compute() 并缓存其有效结果
+
+        参数:
+            kind (str): 调用类型，用于分类统计
+            model (str): 模型名称
+            system_prompt (str): 系统提示
+            user_input: 输入内容
+            compute (callable): 无参协程函数，返回 LLM 结果
+        返回:
+            str: 缓存或新计算的结果
+        """
+        if not self.enabled:
+            return await compute()
+
+        key = cache_key(kind, model, system_prompt, user_input)
+        value = self._memory_get(key)
+        if value is not None:
+            self._count(kind, "memory_hits")
+            await self._maybe_flush_stats()
+            return value
+
+        value = await asyncio.to_thread(self._locked, self._disk_get, key)
+        if value is not None:
+            self._count(kind, "disk_hits")
+            self._memory_put(key, value, time.time() + self.ttl)
+            await self._maybe_flush_stats()
+            return value
+
+        self._count(kind, "misses")
+        value = await compute()
+        if value and not is_fallback_reply(value):
+            self._memory_put(key, value, time.time() + self.ttl)
+            self._count(kind, "stores")
+            evicted = await asyncio.to_thread(self._locked, self._disk_put, key, kind, value)
+            if evicted:
+                self._count(kind, "evictions", evicted)
+        await self._maybe_flush_stats()
+        return value
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _count(self, kind, field, amount=1):
+        counters = self._pending_stats.setdefault(kind, dict.fromkeys(STAT_FIELDS, 0))
+        counters[field] += amount
+
+    async def _maybe_flush_stats(self):
+        if time.monotonic() - self._last_stats_flush >= STATS_FLUSH_INTERVAL:
+            await asyncio.to_thread(self._locked, self._flush_stats, self._take_stats())
+
+    def _take_stats(self):
+        pending, self._pending_stats = self._pending_stats, {}
+        self._last_stats_flush = time.monotonic()
+        return pending
+
+    def _locked(self, func, *args):
+        """
+        在锁内执行 SQLite 操作，出错时只记录日志，缓存不可用不影响正常调用
+        """
+        with self._lock:
+            try:
+                return func(*args)
+            except sqlite3.Error as e:
+                _log.warning("<LLM CACHE> 访问缓存数据库时出错:")
+                _log.warning(f"   ↳ 错误详情: {e}")
+                return None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, kind TEXT, value TEXT, "
+                "created_at REAL, expires_at REAL, accessed_at REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (kind TEXT PRIMARY KEY, memory_hits INTEGER DEFAULT 0, "
+                "disk_hits INTEGER DEFAULT 0, misses INTEGER DEFAULT 0, stores INTEGER DEFAULT 0, "
+                "evictions INTEGER DEFAULT 0)")
+            self._conn.commit()
+        return self._conn
+
+    def _disk_get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return row[0]
+
+    def _disk_put(self, key, kind, value):
+        """
+        写入一条缓存，返回本次顺带淘汰的条目数
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO responses (key, kind, value, created_at, expires_at, accessed_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", (key, kind, value, now, now + self.ttl, now))
+        conn.commit()
+        self._stores_since_check += 1
+        if self._stores_since_check < EVICTION_CHECK_EVERY:
+            return 0
+        self._stores_since_check = 0
+        return self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        """
+        删除过期条目，并在条目数超出上限时淘汰最久未访问的条目
+        """
+        evicted = conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            evicted += conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)", (overflow,)).rowcount
+        conn.commit()
+        if evicted:
+            _log.info(f"<LLM CACHE> 淘汰 {evicted} 条过期或超出容量的缓存")
+        return evicted
+
+    def _flush_stats(self, pending):
+        """
+        把累计的计数增量写入 stats 表
+        """
+        conn = self._connect()
+        for kind, counters in pending.items():
+            conn.execute("INSERT OR IGNORE INTO stats (kind) VALUES (?)", (kind,))
+            conn.execute(
+                f"UPDATE stats SET {', '.join(f'{field} = {field} + ?' for field in STAT_FIELDS)} WHERE kind = ?",
+                [counters[field] for field in STAT_FIELDS] + [kind])
+        conn.commit()
+
+    @staticmethod
+    def read_stats(path=LLM_CACHE_FILE):
+        """
+        从缓存数据库读取命中统计，可在 API 等其他进程中调用
+
+        参数:
+            path (str): 缓存数据库路径
+        返回:
+            dict: 按调用类型与汇总的命中次数、命中率以及当前条目数
+        """
+        if not os.path.exists(path):
+            return {"kinds": {}, "total": dict.fromkeys(STAT_FIELDS, 0) | {"hit_rate": None}, "entries": 0}
+
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(f"SELECT kind, {', '.join(STAT_FIELDS)} FROM stats").fetchall()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        finally:
+            conn.close()
+
+        def with_rate(counters):
+            lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+            hits = counters["memory_hits"] + counters["disk_hits"]
+            return counters | {"hit_rate": round(hits / lookups, 4) if lookups else None}
+
+        kinds = {row[0]: dict(zip(STAT_FIELDS, row[1:])) for row in rows}
+        total = {field: sum(counters[field] for counters in kinds.values()) for field in STAT_FIELDS}
+        return {
+            "kinds": {kind: with_rate(counters) for kind, counters in kinds.items()},
+            "total": with_rate(total),
+            "entries": entries,
+        }
+
+
+response_cache = ResponseCache()
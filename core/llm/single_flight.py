@@ -0,0 +1,76 @@
+"""
+AmyAlmond Project - core/llm/single_flight.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+single_flight.py - 合并同时进行中的相同 LLM 请求，只向上游发送一次
+"""
+import asyncio
+import functools
+import hashlib
+import json
+
+from core.llm.llm_stats import llm_stats
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+class SingleFlight:
+    """
+    单飞（single-flight）请求合并器
+
+    同一个键在上一次调用完成前再次到达时，不会发起新的请求，而是等待正在进行的那一次并共享其结果（或异常）。
+    请求在独立任务中执行，某个调用方被取消不会影响其他等待同一结果的调用方。
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        """
+        执行或加入一次请求
+
+        参数:
+            key (str): 请求键，相同的键视为相同请求
+            factory (callable): 无参协程函数，真正发起请求
+        返回:
+            请求结果
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            _log.debug(f"<SINGLE FLIGHT> 合并相同的进行中请求 ({self.coalesced}/{self.calls})")
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+single_flight = SingleFlight()
+llm_stats.register("single_flight", single_flight.stats)
+
+
+def coalesce(method):
+    """
+    装饰 LLM 客户端的异步方法：同一客户端实例上参数完全相同的并发调用共享一次上游请求
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        raw = json.dumps([method.__qualname__, id(self), args, kwargs], ensure_ascii=False, sort_keys=True,
+                         default=str)
+        key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return await single_flight.do(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,265 @@
+"""
+AmyAlmond Project - core/llm/telemetry.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+telemetry.py - 记录每次 LLM 调用的 Token、延迟、首 Token 时间、重试与费用，并按群组、调用点、模型汇总
+"""
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from config import LLM_MODEL_PRICES, LLM_TELEMETRY_MAX_GROUPS, LLM_TELEMETRY_WINDOW, LLM_TELEMETRY_RECENT_CALLS
+from core.llm.call_context import current_group, current_call_site
+from core.llm.llm_stats import llm_stats
+from core.utils.logger import get_logger
+from core.utils.tokenizer import token_counter
+
+_log = get_logger()
+
+# 当前正在进行的调用记录，提供商客户端通过 report_usage / report_first_token 补充数据
+_current_call = ContextVar("llm_current_call", default=None)
+
+# 群组数超过上限时，最久未出现的群组并入该键
+OTHER_GROUPS = "(other)"
+
+
+class CallRecord:
+    """
+    单次 LLM 调用（含重试）的遥测数据
+    """
+
+    __slots__ = ("endpoint", "model", "call_site", "group", "started", "latency", "ttft", "retries",
+                 "prompt_tokens", "completion_tokens", "estimated", "error")
+
+    def __init__(self, endpoint, model, estimated_prompt_tokens):
+        self.endpoint = endpoint
+        self.model = model or endpoint
+        self.call_site = current_call_site.get()
+        self.group = current_group.get()
+        self.started = time.monotonic()
+        self.latency = 0.0
+        self.ttft = None
+        self.retries = 0
+        self.prompt_tokens = estimated_prompt_tokens
+        self.completion_tokens = 0
+        self.estimated = True
+        self.error = None
+
+    def set_usage(self, response_data):
+        """
+        从响应中读取 usage，兼容 OpenAI（prompt_tokens）、Anthropic（input_tokens）与 Google（usageMetadata）格式
+        """
+        usage = response_data.get("usage") or response_data.get("usageMetadata")
+        if not isinstance(usage, dict):
+            return
+        prompt = usage.get("prompt_tokens", usage.get("input_tokens", usage.get("promptTokenCount")))
+        completion = usage.get("completion_tokens", usage.get("output_tokens", usage.get("candidatesTokenCount")))
+        if prompt is None and completion is None:
+            return
+        self.prompt_tokens = prompt or 0
+        self.completion_tokens = completion or 0
+        self.estimated = False
+
+    def set_result(self, result):
+        """
+        调用成功后补全数据：响应为 dict 时读取其中的 usage，为文本且提供商未上报 usage 时估算回复 Token 数
+        """
+        if isinstance(result, dict):
+            self.set_usage(result)
+        elif self.estimated and isinstance(result, str):
+            self.completion_tokens = token_counter.count_text(result, self.model)
+
+    def cost(self):
+        """
+        按 llm_model_prices（美元 / 百万 Token）计算费用，未配置价格的模型为 0
+        """
+        model = self.model.lower()
+        prefix = max((prefix for prefix in LLM_MODEL_PRICES if model.startswith(prefix.lower())), key=len, default=None)
+        if prefix is None:
+            return 0.0
+        price = LLM_MODEL_PRICES[prefix]
+        return (self.prompt_tokens * price.get("prompt", 0) + self.completion_tokens * price.get("completion", 0)) / 1e6
+
+    def to_dict(self):
+        return {
+            "endpoint": self.endpoint, "model": self.model, "call_site": self.call_site, "group": self.group,
+            "latency": round(self.latency, 3), "ttft": round(self.ttft, 3) if self.ttft is not None else None,
+            "retries": self.retries, "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "estimated": self.estimated, "cost": round(self.cost(), 6), "error": self.error,
+        }
+
+
+def report_usage(response_data):
+    """
+    提供商客户端拿到响应后调用，把其中的 usage 记入当前调用
+
+    参数:
+        response_data (dict): 提供商返回的 JSON
+    """
+    record = _current_call.get()
+    if record is not None and isinstance(response_data, dict):
+        record.set_usage(response_data)
+
+
+def report_first_token():
+    """
+    流式请求收到第一个 Token 时调用，记录首 Token 时间（同一次调用只记录第一次）
+    """
+    record = _current_call.get()
+    if record is not None and record.ttft is None:
+        record.ttft = time.monotonic() - record.started
+
+
+class _Rollup:
+    """
+    一个维度取值上的累计指标，延迟分位数取最近 window 次调用
+    """
+
+    def __init__(self, window):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.estimated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.ttft_total = 0.0
+        self.ttft_count = 0
+        self._latencies = deque(maxlen=window)
+
+    def add(self, record, cost):
+        self.calls += 1
+        self.errors += record.error is not None
+        self.retries += record.retries
+        self.estimated += record.estimated
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost += cost
+        self.latency_total += record.latency
+        self.latency_max = max(self.latency_max, record.latency)
+        self._latencies.append(record.latency)
+        if record.ttft is not None:
+            self.ttft_total += record.ttft
+            self.ttft_count += 1
+
+    def merge(self, other):
+        for name in ("calls", "errors", "retries", "estimated", "prompt_tokens", "completion_tokens", "cost",
+                     "latency_total", "ttft_total", "ttft_count"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.latency_max = max(self.latency_max, other.latency_max)
+        self._latencies.extend(other._latencies)
+
+    def _percentile(self, values, q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 3) if values else None
+
+    def snapshot(self):
+        latencies = sorted(self._latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "estimated_calls": self.estimated,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": round(self.cost, 6),
+            "latency_avg": round(self.latency_total / self.calls, 3) if self.calls else None,
+            "latency_p50": self._percentile(latencies, 0.5),
+            "latency_p95": self._percentile(latencies, 0.95),
+            "latency_max": round(self.latency_max, 3),
+            "ttft_avg": round(self.ttft_total / self.ttft_count, 3) if self.ttft_count else None,
+        }
+
+
+class LLMTelemetry:
+    """
+    LLM 调用遥测
+
+    ResiliencePolicy 在每次调用（含其全部重试）外层调用 track()，提供商客户端通过 report_usage 上报 usage；
+    提供商未返回 usage 时以预估的输入 Token 数和回复文本的计数代替，并计入 estimated_calls。
+    数据按总计、调用点、模型与群组汇总在内存中：群组数超过 max_groups 时最久未出现的群组并入 "(other)"，
+    另保留最近 recent 次调用的明细，内存占用有上限。
+    """
+
+    def __init__(self, max_groups=LLM_TELEMETRY_MAX_GROUPS, window=LLM_TELEMETRY_WINDOW,
+                 recent=LLM_TELEMETRY_RECENT_CALLS):
+        self.max_groups = max(int(max_groups), 1)
+        self.window = window
+        self.totals = _Rollup(window)
+        self.by_call_site = {}
+        self.by_model = {}
+        self.by_group = OrderedDict()
+        self.recent = deque(maxlen=recent)
+
+    @asynccontextmanager
+    async def track(self, endpoint, model=None, estimated_prompt_tokens=0):
+        """
+        跟踪一次 LLM 调用，with 块内抛出的异常会被记为失败后继续抛出
+
+        参数:
+            endpoint (str): 端点标识
+            model (str): 模型名，未知时以端点代替
+            estimated_prompt_tokens (int): 预估的输入 Token 数，提供商未返回 usage 时使用
+        返回:
+            CallRecord: 本次调用的记录，可调用 set_result 补全数据
+        """
+        record = CallRecord(endpoint, model, estimated_prompt_tokens)
+        token = _current_call.set(record)
+        try:
+            yield record
+        except BaseException as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            _current_call.reset(token)
+            record.latency = time.monotonic() - record.started
+            self._add(record)
+
+    def _rollup(self, table, key):
+        if key not in table:
+            table[key] = _Rollup(self.window)
+        return table[key]
+
+    def _add(self, record):
+        cost = record.cost()
+        self.totals.add(record, cost)
+        self._rollup(self.by_call_site, record.call_site).add(record, cost)
+        self._rollup(self.by_model, record.model).add(record, cost)
+        self._rollup(self.by_group, record.group).add(record, cost)
+        self.by_group.move_to_end(record.group)
+        while len(self.by_group) > self.max_groups:
+            evicted_group, evicted = self.by_group.popitem(last=False)
+            if evicted_group == OTHER_GROUPS:
+                self.by_group[OTHER_GROUPS] = evicted
+                continue
+            self._rollup(self.by_group, OTHER_GROUPS).merge(evicted)
+        self.recent.append(record.to_dict())
+
+        _log.debug(f"<TELEMETRY> {record.call_site} @ {record.model} 群组 {record.group}: "
+                   f"{record.prompt_tokens}+{record.completion_tokens} Token, {record.latency:.2f}s, "
+                   f"重试 {record.retries} 次{'，失败: ' + record.error if record.error else ''}")
+
+    def stats(self):
+        """
+        获取遥测汇总
+
+        返回:
+            dict: 总计、按调用点/模型/群组的汇总与最近调用明细
+        """
+        return {
+            "totals": self.totals.snapshot(),
+            "call_site": {key: rollup.snapshot() for key, rollup in self.by_call_site.items()},
+            "model": {key: rollup.snapshot() for key, rollup in self.by_model.items()},
+            "group": {key: rollup.snapshot() for key, rollup in self.by_group.items()},
+            "recent": list(self.recent),
+        }
+
+
+llm_telemetry = LLMTelemetry()
+llm_stats.register("telemetry", llm_telemetry.stats)
@@ -0,0 +1,227 @@
+"""
+AmyAlmond Project - core/memory/memory_compactor.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+memory_compactor.py - 记忆遗忘与压缩任务，按年龄、检索次数和重要度为记忆打分，定期删除或合并低价值记忆
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from config import (MEMORY_THRESHOLD, FORGET_THRESHOLD, MEMORY_DECAY_HALF_LIFE_DAYS, MEMORY_COMPACTION_INTERVAL,
+                    MEMORY_COMPACTION_BATCH_SIZE, MEMORY_COMPACTION_THROTTLE, MEMORY_COMPACTION_REQUESTS_PER_SECOND,
+                    TEMP_MEMORY_STALE_DAYS)
+from core.llm.llm_client import is_fallback_reply
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+
+def _parse_timestamp(value):
+    """
+    将 ES/MongoDB 中的时间戳统一转换为带时区的 datetime
+    """
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    return None
+
+
+class MemoryCompactor:
+    """
+    定期压缩记忆存储的后台任务
+
+    记忆分数 = 10 * 重要度 * 0.5 ^ (年龄天数 / 半衰期) + 检索次数，
+    当群组记忆数量超过 MEMORY_THRESHOLD 时，分数低于 FORGET_THRESHOLD 的记忆会被合并或删除。
+    """
+
+    def __init__(self, mongo, es_manager, memory_optimizer=None, index_name="messages"):
+        """
+        参数:
+            mongo (AsyncMongoDBUtils): 异步 MongoDB 工具实例
+            es_manager (AsyncElasticsearchIndexManager): 异步 Elasticsearch 管理器实例
+            memory_optimizer (MemoryOptimizer): 用于合并低价值记忆的优化器，为空时只删除不合并
+            index_name (str): 存放长期记忆的索引
+        """
+        self.mongo = mongo
+        self.es_manager = es_manager
+        self.memory_optimizer = memory_optimizer
+        self.index_name = index_name
+
+    @staticmethod
+    def score_memory(document, now=None):
+        """
+        计算一条记忆的保留价值
+
+        参数:
+            document (dict): 记忆文档，可包含 timestamp、importance、retrieval_count
+            now (datetime): 当前时间
+
+        返回:
+            float: 记忆分数，越低越容易被遗忘
+        """
+        now = now or datetime.now(timezone.utc)
+        timestamp = _parse_timestamp(document.get("timestamp")) or now
+        age_days = max((now - timestamp).total_seconds() / 86400, 0)
+        decay = 0.5 ** (age_days / MEMORY_DECAY_HALF_LIFE_DAYS)
+        importance = float(document.get("importance", 1.0))
+        retrieval_count = int(document.get("retrieval_count", 0))
+        return 10 * importance * decay + retrieval_count
+
+    async def run_forever(self):
+        """
+        按 MEMORY_COMPACTION_INTERVAL 周期执行压缩
+        """
+        _log.info(">>> MEMORY COMPACTION SCHEDULED")
+        _log.info(f"   ↳ 间隔: {MEMORY_COMPACTION_INTERVAL} 秒")
+        while True:
+            await asyncio.sleep(MEMORY_COMPACTION_INTERVAL)
+            try:
+                await self.compact_once()
+            except Exception as e:
+                _log.error(f"<COMPACTION> 记忆压缩任务出错: {e}", exc_info=True)
+
+    async def compact_once(self):
+        """
+        执行一轮完整的记忆压缩
+
+        返回:
+            dict: 本轮各存储删除/合并的记录数
+        """
+        _log.info("<COMPACTION> 开始压缩记忆存储...")
+        stats = {"es_deleted": 0, "es_merged": 0, "conversations_deleted": 0, "temp_groups_merged": 0,
+                 "conversations_migrated": 0, "partitions_archived": 0, "indices_rolled_over": 0}
+
+        stats["temp_groups_merged"] = await self._merge_stale_temporary_memories()
+
+        group_counts = await self.es_manager.group_document_counts(self.index_name)
+        for group_id, count in group_counts.items():
+            if count > MEMORY_THRESHOLD:
+                deleted, merged = await self._compact_es_group(group_id, count)
+                stats["es_deleted"] += deleted
+                stats["es_merged"] += merged
+
+        oversized_groups = await self.mongo.find_oversized_conversation_groups(MEMORY_THRESHOLD)
+        for group_id, count in oversized_groups.items():
+            stats["conversations_deleted"] += await self._compact_conversations(group_id, count)
+
+        stats["indices_rolled_over"] = len(await self.es_manager.rollover_indices())
+
+        rollover = await self.mongo.rollover_conversation_partitions(MEMORY_COMPACTION_BATCH_SIZE)
+        stats["conversations_migrated"] = rollover["migrated"]
+        stats["partitions_archived"] = len(rollover["archived"])
+
+        _log.info("<COMPACTION> 记忆压缩完成:")
+        for key, value in stats.items():
+            _log.info(f"   ↳ {key}: {value}")
+        return stats
+
+    async def _compact_es_group(self, group_id, count):
+        """
+        对单个群组的 ES 记忆打分，合并并删除超出上限的低价值记忆
+        """
+        now = datetime.now(timezone.utc)
+        query = {"query": {"term": {"group_id": group_id}}}
+        hits = [hit async for hit in self.es_manager.scan_documents(
+            self.index_name, query,
+            source=["content", "timestamp", "importance", "retrieval_count"],
+            routing=group_id
+        )]
+
+        scored = [(self.score_memory(hit.get("_source", {}), now), hit) for hit in hits]
+        scored.sort(key=lambda item: item[0])
+        excess = len(scored) - MEMORY_THRESHOLD
+        candidates = [hit for score, hit in scored if score < FORGET_THRESHOLD][:max(excess, 0)]
+        if not candidates:
+            return 0, 0
+
+        merged = 0
+        if self.memory_optimizer and len(candidates) > 1:
+            contents = [hit["_source"].get("content", "") for hit in candidates if hit["_source"].get("content")]
+            merged_content = await self.memory_optimizer.optimize_memory(contents)
+            if not merged_content or is_fallback_reply(merged_content):
+                # 合并失败时不写入也不删除，候选记忆保留到下一轮
+                _log.warning(f"<COMPACTION> 群组 {group_id} 的记忆合并失败，跳过本轮遗忘")
+                return 0, 0
+            inserted = await self.es_manager.bulk_insert(self.index_name, [{
+                "group_id": group_id,
+                "role": "assistant",
+                "content": merged_content,
+                "importance": 0.5,
+                "retrieval_count": 0
+            }])
+            if not inserted:
+                # 合并结果未写入时不删除候选记忆，否则这些记忆会永久丢失
+                _log.warning(f"<COMPACTION> 群组 {group_id} 的合并记忆写入失败，跳过本轮遗忘")
+                return 0, 0
+            merged = len(candidates)
+
+        deleted = 0
+        ids = [hit["_id"] for hit in candidates]
+        for start in range(0, len(ids), MEMORY_COMPACTION_BATCH_SIZE):
+            batch = ids[start:start + MEMORY_COMPACTION_BATCH_SIZE]
+            deleted += await self.es_manager.delete_by_query(
+                self.index_name, {"ids": {"values": batch}}, MEMORY_COMPACTION_REQUESTS_PER_SECOND, routing=group_id
+            )
+            await asyncio.sleep(MEMORY_COMPACTION_THROTTLE)
+
+        _log.info(f"<COMPACTION> 群组 {group_id} 记忆数 {count}，遗忘 {deleted} 条，合并 {merged} 条")
+        return deleted, merged
+
+    async def _compact_conversations(self, group_id, count):
+        """
+        删除 MongoDB 中超出上限的最早对话记录
+        """
+        excess = count - MEMORY_THRESHOLD
+        deleted = 0
+        while excess > 0:
+            ids = await self.mongo.find_oldest_conversation_ids(group_id, min(excess, MEMORY_COMPACTION_BATCH_SIZE))
+            if not ids:
+                break
+            removed = await self.mongo.delete_conversations_by_ids(ids)
+            deleted += removed
+            excess -= len(ids)
+            await asyncio.sleep(MEMORY_COMPACTION_THROTTLE)
+        return deleted
+
+    async def _merge_stale_temporary_memories(self):
+        """
+        将长时间未达到优化阈值的临时记忆合并写入 ES，避免临时集合无限增长
+        """
+        before = datetime.now(timezone.utc) - timedelta(days=TEMP_MEMORY_STALE_DAYS)
+        group_ids = await self.mongo.find_stale_temporary_memory_groups(before)
+        merged_groups = 0
+        for group_id in group_ids:
+            temp_memories = await self.mongo.find_temporary_memories(group_id)
+            contents = [mem["content"] for mem in temp_memories if mem.get("content")]
+            if contents:
+                if not self.memory_optimizer:
+                    # 没有优化器时无法合并，保留临时记忆而不是直接清空
+                    continue
+                merged_content = await self.memory_optimizer.optimize_memory(contents)
+                if not merged_content or is_fallback_reply(merged_content):
+                    _log.warning(f"<COMPACTION> 群组 {group_id} 的临时记忆合并失败，保留到下一轮")
+                    continue
+                inserted = await self.es_manager.bulk_insert(self.index_name, [{
+                    "group_id": group_id,
+                    "role": "assistant",
+                    "content": merged_content,
+                    "importance": max(float(mem.get("importance", 1.0)) for mem in temp_memories),
+                    "retrieval_count": 0
+                }])
+                if not inserted:
+                    _log.warning(f"<COMPACTION> 群组 {group_id} 的临时记忆写入失败，保留到下一轮")
+                    continue
+            # 只删除本轮读取并合并的临时记忆，合并期间新写入的记忆留到下一轮
+            await self.mongo.delete_temporary_memories([mem["_id"] for mem in temp_memories])
+            merged_groups += 1
+            await asyncio.sleep(MEMORY_COMPACTION_THROTTLE)
+        return merged_groups
@@ -8,19 +8,25 @@ Version: 1.3.0 (Stable_923001)
 
 memory_manager.py 包含管理消息历史和记忆存储的主要类和方法，支持MongoDB Full-Text Search+Elasticsearch以及智能记忆管理。
 """
-import random
+import asyncio
 import jieba.analyse
 
 from collections import deque
 from core.llm.plugins.inject_memory_client import InjectMemoryClient
-from core.db.elasticsearch_index_manager import ElasticsearchIndexManager
-from core.utils.mongodb_utils import MongoDBUtils
-from config import MAX_CONTEXT_TOKENS, OPENAI_SECRET, OPENAI_MODEL, OPENAI_API_URL, ELASTICSEARCH_QUERY_TERMS, MEMORY_BATCH_SIZE
+from core.db.service_registry import service_registry
+from core.utils.mongodb_utils import AsyncMongoDBUtils
+from config import (MAX_CONTEXT_TOKENS, ELASTICSEARCH_QUERY_TERMS,
+                    MEMORY_BATCH_SIZE, MEMORY_DECAY_HALF_LIFE_DAYS, ELASTICSEARCH_SEARCH_TOP_K)
 from core.utils.logger import get_logger
+from core.utils.utils import calculate_token_count
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from core.llm.plugins.openai_client import OpenAIClient
+from core.llm.llm_factory import LLMFactory
+from core.llm.llm_client import is_fallback_reply
+from core.llm.response_cache import response_cache
+from core.llm.call_context import call_site
 from core.memory.memory_optimizer import MemoryOptimizer
+from core.memory.memory_compactor import MemoryCompactor
 
 _log = get_logger()
 
@@ -30,16 +36,26 @@ class MemoryManager:
     管理消息历史和智能记忆存储的类
     """
 
-    def __init__(self):
+    def __init__(self, reply_client=None):
         """
         初始化 MemoryManager 实例，创建消息历史字典并连接到数据库
+
+        参数:
+            reply_client (LLMClient): 回复客户端，没有 OpenAI 配置时辅助调用改用该客户端
         """
         self.message_history = {}
-        self.mongo = MongoDBUtils()  # 初始化MongoDB工具
-        self.es_manager = ElasticsearchIndexManager()  # 初始化Elasticsearch管理器
-        self.inject_client = InjectMemoryClient(OPENAI_SECRET, OPENAI_MODEL, OPENAI_API_URL)  # 初始化注入记忆的LLM客户端
-        self.openai_client = OpenAIClient(OPENAI_SECRET, OPENAI_MODEL, OPENAI_API_URL)
-        self.memory_optimizer = MemoryOptimizer(self.openai_client)  # 初始化记忆优化器
+        self.mongo = AsyncMongoDBUtils()  # 初始化异步MongoDB工具
+        self.es_manager = service_registry.get_async_es_manager()  # 共享的异步Elasticsearch管理器
+        self.bulk_indexer = service_registry.get_bulk_indexer()  # 共享的后台批量写入器
+        self.inject_client = InjectMemoryClient()  # 初始化注入记忆的LLM客户端
+        # 辅助调用按调用点使用各自的模型配置（llm_profiles），均带重试与熔断；没有 OpenAI 配置时使用回复客户端
+        llm_factory = LLMFactory()
+        self.summary_client = llm_factory.create_profile_client("summary", fallback=reply_client)
+        self.semantic_client = llm_factory.create_profile_client("semantic", fallback=reply_client)
+        self.memory_optimizer = MemoryOptimizer(
+            llm_factory.create_profile_client("optimization", fallback=reply_client))  # 初始化记忆优化器
+        self.compactor = MemoryCompactor(self.mongo, self.es_manager, self.memory_optimizer)  # 初始化记忆压缩任务
+        self._background_tasks = set()  # 持有后台任务的引用，避免任务在完成前被回收
 
     def add_message_to_history(self, group_id, message):
         """
@@ -53,6 +69,23 @@ class MemoryManager:
             self.message_history[group_id] = deque(maxlen=MAX_CONTEXT_TOKENS)
         self.message_history[group_id].append(message)
 
+    async def record_conversation(self, group_id, message):
+        """
+        添加一条消息到群组的消息历史，并持久化到当月的对话分区；
+        其他实例通过变更流同步这条消息，启动时由 load_memory 从热分区加载
+
+        参数:
+            group_id (str): 群组的唯一标识符
+            message (dict): 包含角色和内容的消息字典
+        """
+        self.add_message_to_history(group_id, message)
+        await self.mongo.insert_conversation({
+            "group_id": group_id,
+            "role": message.get("role"),
+            "content": message.get("content"),
+            "message": message
+        })
+
     def get_message_history(self, group_id):
         """
         获取指定群组的消息历史
@@ -65,13 +98,12 @@ class MemoryManager:
         """
         return self.message_history.get(group_id, deque(maxlen=MAX_CONTEXT_TOKENS))
 
-    async def compress_memory(self, group_id, get_gpt_response):
+    async def compress_memory(self, group_id):
         """
-        压缩消息历史以减少内存占用，如果消息历史超过最大允许Token数，将使用 GPT 生成摘要并替换历史记录
+        压缩消息历史以减少内存占用，如果消息历史超过最大允许Token数，将使用 summary 模型配置生成摘要并替换历史记录
 
         参数:
             group_id (str): 群组的唯一标识符
-            get_gpt_response (function): 用于获取 GPT 回复的函数
 
         返回:
             list: 压缩后的消息历史
@@ -81,16 +113,27 @@ class MemoryManager:
         # 过滤掉没有 'content' 键的消息
         valid_message_history = [msg for msg in message_history if 'content' in msg and msg['content'].strip()]
 
-        token_count = sum(len(msg['content']) for msg in valid_message_history)
+        token_count = calculate_token_count(valid_message_history)
 
         # 创建新的列表来存储压缩后的消息历史记录
         compressed_history = valid_message_history
 
         if token_count > MAX_CONTEXT_TOKENS:
-            summary = await get_gpt_response(
-                list(valid_message_history), "你是高级算法机器，请在不忽略关键人名或数据以及细节的情况下总结无损压缩对话（20-40字）。"
-            )
-            compressed_history = [{"role": "assistant", "content": summary}]
+            instruction = "你是高级算法机器，请在不忽略关键人名或数据以及细节的情况下总结无损压缩对话（20-40字）。"
+            with call_site("summary"):
+                summary = await response_cache.get_or_compute(
+                    "summary", getattr(self.summary_client, "model", None), instruction, list(valid_message_history),
+                    lambda: self.summary_client.get_response(context=list(valid_message_history),
+                                                             user_input="请压缩以上对话。",
+                                                             system_prompt=instruction)
+                )
+            if not summary or is_fallback_reply(summary):
+                # 摘要失败时保留未压缩的历史，由 PromptAssembler 按 Token 上限裁剪，兜底文本不写入记忆
+                _log.warning(f"<COMPRESS> 群组 {group_id} 的摘要生成失败，保留未压缩的消息历史")
+                return compressed_history
+
+            # 标记为摘要，PromptAssembler 会把摘要放在历史之前
+            compressed_history = [{"role": "assistant", "content": summary, "summary": True}]
 
             # 将摘要存储到Elasticsearch中，以便以后可以检索到
             await self.store_memory(group_id, None, "assistant", summary)
@@ -98,24 +141,51 @@ class MemoryManager:
 
         return compressed_history
 
-    async def store_memory(self, group_id, message, role, content):
+    async def store_memory(self, group_id, message, role, content, importance=1.0):
+        """
+        存储一条记忆，先写入MongoDB临时集合，达到阈值后优化并写入Elasticsearch
+
+        参数:
+            group_id (str): 群组的唯一标识符
+            message (GroupMessage): 原始消息
+            role (str): 消息角色
+            content (str): 消息内容
+            importance (float): 记忆重要度，影响记忆压缩时的遗忘顺序
+        """
+        await self.store_memories(group_id, message, [{"role": role, "content": content, "importance": importance}])
+
+    async def store_memories(self, group_id, message, memories):
+        """
+        批量存储多条记忆，一次无序批量写入MongoDB临时集合，达到阈值后优化并写入Elasticsearch
+
+        参数:
+            group_id (str): 群组的唯一标识符
+            message (GroupMessage): 原始消息
+            memories (list[dict]): 记忆列表，每项包含 role、content，可选 importance
+        """
         try:
-            _log.debug(f"正在存储消息: group_id={group_id}, role={role}, content={content}")
+            _log.debug(f"正在存储消息: group_id={group_id}, 条数={len(memories)}")
             _log.debug(f"阈值: {MEMORY_BATCH_SIZE}")
 
-            if content is None:
-                _log.warning(f"遇到了一个空内容的消息: group_id={group_id}, role={role}")
+            documents = []
+            for memory in memories:
+                if memory.get("content") is None:
+                    _log.warning(f"遇到了一个空内容的消息: group_id={group_id}, role={memory.get('role')}")
+                    continue
+                documents.append({
+                    "group_id": group_id,
+                    "role": memory["role"],
+                    "content": memory["content"],
+                    "importance": memory.get("importance", 1.0)
+                })
+            if not documents:
                 return
 
-            # 将消息先存储到MongoDB的临时集合中
-            self.mongo.insert_temporary_memory({
-                "group_id": group_id,
-                "role": role,
-                "content": content
-            })
+            # 将消息先批量存储到MongoDB的临时集合中
+            await self.mongo.insert_temporary_memories(documents)
 
             # 获取所有临时存储的记忆
-            temp_memories = self.mongo.find_temporary_memories(group_id)
+            temp_memories = await self.mongo.find_temporary_memories(group_id)
             _log.debug(f"当前暂存消息数: {len(temp_memories)}，阈值: {MEMORY_BATCH_SIZE}")
 
             # 如果消息数量达到阈值，进行记忆优化
@@ -125,19 +195,21 @@ class MemoryManager:
                 all_contents = [mem['content'] for mem in temp_memories]
                 optimized_content = await self.memory_optimizer.optimize_memory(all_contents)
 
-                # 存储优化后的内容到Elasticsearch
-                self.es_manager.bulk_insert(index_name="messages", data=[{
+                # 优化后的内容交给后台批量写入器，与其他群组的写入合并后写入Elasticsearch
+                await self.bulk_indexer.enqueue("messages", {
                     "group_id": group_id,
                     "role": "assistant",
-                    "content": optimized_content
-                }])
+                    "content": optimized_content,
+                    "importance": max(float(mem.get("importance", 1.0)) for mem in temp_memories),
+                    "retrieval_count": 0
+                })
 
                 # 清空MongoDB的临时集合
-                self.mongo.clear_temporary_memory(group_id)
+                await self.mongo.clear_temporary_memory(group_id)
 
-                _log.info(f"> 优化后的消息已存储到Elasticsearch, group_id: {group_id}, content: {optimized_content}")
+                _log.info(f"> 优化后的消息已加入Elasticsearch写入队列, group_id: {group_id}, content: {optimized_content}")
             else:
-                _log.info(f"> 消息已存储到MongoDB临时集合, group_id: {group_id}, role: {role}, content: {content}")
+                _log.info(f"> 消息已存储到MongoDB临时集合, group_id: {group_id}, 条数: {len(documents)}")
 
         except Exception as e:
             _log.error(f"> 存储消息到数据库时发生错误: {e}", exc_info=True)
@@ -146,8 +218,8 @@ class MemoryManager:
         try:
             _log.info("正在加载消息历史...")
 
-            # 从MongoDB加载消息历史
-            conversations = self.mongo.find_all_conversations()
+            # 从MongoDB加载消息历史，只读取最近几个月的热分区
+            conversations = await self.mongo.find_recent_conversations()
             for conversation in conversations:
                 group_id = conversation.get('group_id')
                 if group_id not in self.message_history:
@@ -169,9 +241,12 @@ class MemoryManager:
                     self.message_history[group_id].append(message)
                     unique_messages.add(message_str)
 
-            # 从Elasticsearch中加载更多记忆
-            es_conversations = self.es_manager.search(index_name="messages", query={"query": {"match_all": {}}})
-            for conversation in es_conversations:
+            # 从Elasticsearch中加载更多记忆，使用 point-in-time 分页读取全部文档并按时间顺序加入
+            es_conversations = 0
+            async for hit in self.es_manager.iterate_documents(
+                    "messages", source=["group_id", "role", "content"], sort=[{"timestamp": "asc"}]):
+                conversation = hit.get("_source", {})
+                es_conversations += 1
                 group_id = conversation.get('group_id')
                 if group_id not in self.message_history:
                     self.message_history[group_id] = deque(maxlen=MAX_CONTEXT_TOKENS)
@@ -180,7 +255,7 @@ class MemoryManager:
                     "content": conversation.get('content')
                 })
 
-            _log.debug(f"Elasticsearch消息历史: {es_conversations}")
+            _log.debug(f"Elasticsearch消息历史: {es_conversations} 条")
             _log.info("Elasticsearch消息历史加载完成。")
 
             _log.info("所有消息历史已成功加载。")
@@ -203,8 +278,15 @@ class MemoryManager:
                 sorted_results = self.sort_results_by_relevance(query, basic_results)
                 return {"role": "system", "content": f"相关记忆: {sorted_results[0]['content']}"}
 
-            sorted_results = self.sort_results_by_relevance(query, advanced_results)
-            return {"role": "system", "content": f"相关记忆: {sorted_results[0]['content']}"}
+            # 高级搜索结果已在 ES 中按相关度与时间衰减排好序
+            best_result = advanced_results[0]
+            if best_result.get("_id"):
+                # 记录检索次数，供记忆压缩任务评估记忆价值
+                task = asyncio.create_task(
+                    self.es_manager.record_retrieval(best_result["_index"], best_result["_id"], group_id))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+            return {"role": "system", "content": f"相关记忆: {best_result['content']}"}
         except Exception as e:
             _log.error(f"检索记忆时发生错误: {e}", exc_info=True)
             return None
@@ -254,7 +336,7 @@ class MemoryManager:
         _log.debug(f"MongoDB查询: {query}")
 
         # 查找符合条件的对话记录
-        results = self.mongo.find_conversations(query)
+        results = await self.mongo.find_conversations(query)
 
         # 过滤搜索结果，只保留包含所有关键词的记录
         filtered_results = [
@@ -271,36 +353,68 @@ class MemoryManager:
         context = []  # 这里可以是空列表，因为我们不需要之前的对话上下文
         user_input = f"{query}"
 
-        response = await self.openai_client.get_response(context=context, user_input=user_input,
-                                                         system_prompt=system_prompt)
+        with call_site("semantic"):
+            response = await response_cache.get_or_compute(
+                "semantic", getattr(self.semantic_client, "model", None), system_prompt, user_input,
+                lambda: self.semantic_client.get_response(context=context, user_input=user_input,
+                                                          system_prompt=system_prompt))
 
         if response:
             return response.strip().split(',')
         return []
 
     async def advanced_search(self, group_id, query_text):
+        """
+        使用Elasticsearch检索长期记忆，more_like_this 相关度乘以按时间的高斯衰减，由 ES 完成排序并只返回前 k 条
+
+        参数:
+            group_id (str): 群组的唯一标识符
+            query_text (str): 检索文本
+
+        返回:
+            list: 按得分从高到低排列的记忆（只包含 content、_id 与 _index）
+        """
         query = {
+            "size": ELASTICSEARCH_SEARCH_TOP_K,
+            "_source": ["content"],
             "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"group_id": group_id}},
-                        {
-                            "more_like_this": {
-                                "fields": ["content"],
-                                "like": query_text,
-                                "min_term_freq": 1,
-                                "max_query_terms": ELASTICSEARCH_QUERY_TERMS
+                "function_score": {
+                    "query": {
+                        "bool": {
+                            "filter": [{"term": {"group_id": group_id}}],
+                            "must": [
+                                {
+                                    "more_like_this": {
+                                        "fields": ["content"],
+                                        "like": query_text,
+                                        "min_term_freq": 1,
+                                        "max_query_terms": ELASTICSEARCH_QUERY_TERMS
+                                    }
+                                }
+                            ]
+                        }
+                    },
+                    # 与记忆遗忘使用同一半衰期：距今一个半衰期的记忆得分减半
+                    "functions": [{
+                        "gauss": {
+                            "timestamp": {
+                                "origin": "now",
+                                "scale": f"{MEMORY_DECAY_HALF_LIFE_DAYS}d",
+                                "decay": 0.5
                             }
                         }
-                    ]
+                    }],
+                    "score_mode": "multiply",
+                    "boost_mode": "multiply"
                 }
             }
         }
 
         _log.debug(f"Elasticsearch查询: {query}")
-        results = self.es_manager.search(index_name="messages", query=query)
+        results = await self.es_manager.search(index_name="messages", query=query, with_ids=True, routing=group_id,
+                                               batched=True)
         _log.debug(f"Elasticsearch搜索结果: {results}")
-        return [result['_source'] for result in results if '_source' in result]
+        return [result for result in results if result.get('content')]
 
     async def inject_memory_to_llm(self, group_id, prompt):
         """
@@ -330,11 +444,8 @@ class MemoryManager:
                 if memory not in unique_memory_contexts:
                     unique_memory_contexts.append(memory)
 
-            # 混合插入唯一记忆内容
-            full_prompt = [{"role": "system", "content": prompt}]
-            for memory in unique_memory_contexts:
-                insert_position = random.randint(0, len(full_prompt))
-                full_prompt.insert(insert_position, memory)
+            # 系统提示固定在最前，记忆按检索顺序追加在其后，保持前缀稳定
+            full_prompt = [{"role": "system", "content": prompt}] + unique_memory_contexts
 
             _log.info(f"生成的系统提示已注入记忆，group_id: {group_id}, prompt: {full_prompt}")
             return full_prompt
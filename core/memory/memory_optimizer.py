@@ -1,5 +1,7 @@
 # core/memory/memory_optimizer.py
+from core.llm.call_context import call_site
 from core.llm.plugins.openai_client import OpenAIClient
+from core.llm.response_cache import response_cache
 
 class MemoryOptimizer:
     def __init__(self, openai_client: OpenAIClient):
@@ -17,9 +19,13 @@ class MemoryOptimizer:
         """
         joined_messages = "\n".join(messages)
         system_prompt = "你是高级算法机器，请在不忽略关键人名或数据以及细节的情况下总结无损压缩对话，提取重要的细节并删除冗余、不重要信息。"
-        response = await self.openai_client.get_response(
-            context=[],
-            user_input=joined_messages,
-            system_prompt=system_prompt
-        )
+        with call_site("optimization"):
+            response = await response_cache.get_or_compute(
+                "optimize", getattr(self.openai_client, "model", None), system_prompt, joined_messages,
+                lambda: self.openai_client.get_response(
+                    context=[],
+                    user_input=joined_messages,
+                    system_prompt=system_prompt
+                )
+            )
         return response.strip() if response else ""
@@ -31,5 +31,9 @@ class AdminCommandPlugin(Plugin):
                 logger.info("<ADMIN> 收到管理员reload命令")
                 await self.bot_client.hot_reload(group_id, message.id)
                 return False  # 阻止消息进入 LLM 处理
+            elif cleaned_content == "dbcheck":
+                logger.info("<ADMIN> 收到管理员dbcheck命令")
+                await self.bot_client.check_db_indexes(group_id, message.id)
+                return False  # 阻止消息进入 LLM 处理
 
         return True  # 继续进入 LLM 处理
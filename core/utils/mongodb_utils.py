@@ -1,33 +1,240 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 from bson import ObjectId
-from pymongo import MongoClient, errors
-from config import MONGODB_URI, MONGODB_USERNAME, MONGODB_PASSWORD
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne, WriteConcern, errors
+from config import (MONGODB_EXECUTOR_WORKERS, MONGODB_SCRATCH_WRITE_W, INSTANCE_ID, CONVERSATION_HOT_MONTHS,
+                    CONVERSATION_ARCHIVE_AFTER_MONTHS, CONVERSATION_ARCHIVE_COMPRESSOR)
+from core.db.service_registry import service_registry
 from core.utils.logger import get_logger
 
 _log = get_logger()
 
+# MongoDB 专用线程池，所有异步调用共享，避免阻塞事件循环
+_mongo_executor = None
+
+
+def get_mongo_executor():
+    """
+    获取（必要时创建）MongoDB 专用线程池
+    """
+    global _mongo_executor
+    if _mongo_executor is None:
+        _mongo_executor = ThreadPoolExecutor(max_workers=MONGODB_EXECUTOR_WORKERS, thread_name_prefix="mongodb")
+    return _mongo_executor
+
+
+# 按数据类型区分的写入确认级别
+WRITE_CONCERNS = {
+    # 临时记忆等可再生数据：不等待日志落盘，追求吞吐
+    "scratch": WriteConcern(w=MONGODB_SCRATCH_WRITE_W, j=False),
+    # 用户等关键数据：多数节点确认并落盘
+    "durable": WriteConcern(w="majority", j=True),
+}
+
+# 各集合需要的索引定义: {集合名: [(索引键, 索引选项)]}
+INDEX_DEFINITIONS = {
+    "conversations": [
+        ([("group_id", ASCENDING), ("timestamp", DESCENDING)], {"name": "group_id_timestamp"}),
+    ],
+    "temp_memories": [
+        ([("group_id", ASCENDING), ("timestamp", ASCENDING)], {"name": "group_id_timestamp"}),
+    ],
+    "users": [
+        ([("user_id", ASCENDING)], {
+            "name": "user_id_unique",
+            "unique": True,
+            "partialFilterExpression": {"user_id": {"$exists": True}}
+        }),
+    ],
+}
+
+# 对话集合按月分区: conversations_YYYYMM 为在线分区，conversations_archive_YYYYMM 为压缩归档分区，
+# 不带后缀的 conversations 为分区前的旧集合，由滚动任务逐步迁移
+CONVERSATIONS_COLLECTION = "conversations"
+CONVERSATION_PARTITION_PREFIX = "conversations_"
+CONVERSATION_ARCHIVE_PREFIX = "conversations_archive_"
+
+# 需要通过 explain() 自检的热点查询: (名称, 集合名, 过滤条件, 排序)
+HOT_QUERIES = [
+    ("find_temporary_memories", "temp_memories", {"group_id": "__probe__"}, None),
+    ("clear_temporary_memory", "temp_memories", {"group_id": "__probe__"}, None),
+    ("basic_search", "conversations", {"group_id": "__probe__", "content": {"$regex": "probe", "$options": "i"}}, None),
+    ("group_history", "conversations", {"group_id": "__probe__"}, [("timestamp", DESCENDING)]),
+    ("find_user", "users", {"user_id": "__probe__"}, None),
+]
+
+
+def _plan_stages(plan):
+    """
+    递归收集执行计划中出现的所有 stage
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan"):
+            if key in plan:
+                stages.extend(_plan_stages(plan[key]))
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+def _as_utc(value):
+    """
+    MongoDB 默认返回不带时区的 UTC 时间，统一补上时区
+    """
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _month_index(value):
+    """
+    将时间转换为连续的月份序号（年 * 12 + 月 - 1），便于做月份加减
+    """
+    return value.year * 12 + value.month - 1
+
+
+def _month_start(month_index):
+    """
+    月份序号对应月份的第一天（UTC）
+    """
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def conversation_partition_name(timestamp):
+    """
+    获取时间戳所属的在线对话分区名称，例如 conversations_202410
+    """
+    return f"{CONVERSATION_PARTITION_PREFIX}{_as_utc(timestamp):%Y%m}"
+
+
+def parse_conversation_partition(name):
+    """
+    解析对话分区名称
+
+    返回:
+        tuple: (月份序号, 是否归档分区)，旧的未分区集合返回 (None, False)，非对话分区返回 None
+    """
+    if name == CONVERSATIONS_COLLECTION:
+        return None, False
+    archived = name.startswith(CONVERSATION_ARCHIVE_PREFIX)
+    suffix = name[len(CONVERSATION_ARCHIVE_PREFIX if archived else CONVERSATION_PARTITION_PREFIX):]
+    if not name.startswith(CONVERSATION_PARTITION_PREFIX) or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return int(suffix[:4]) * 12 + int(suffix[4:]) - 1, archived
+
+
+def _query_time_range(query):
+    """
+    从查询条件的 timestamp 字段中提取时间范围，用于分区裁剪
+    """
+    condition = (query or {}).get("timestamp")
+    if isinstance(condition, datetime):
+        return condition, condition
+    if not isinstance(condition, dict):
+        return None, None
+    start = condition.get("$gte", condition.get("$gt"))
+    end = condition.get("$lte", condition.get("$lt"))
+    return start, end
+
+
 class MongoDBUtils:
-    def __init__(self):
+    def __init__(self, client=None):
         """
         初始化MongoDBUtils实例，连接到指定的MongoDB数据库和集合
+
+        参数:
+            client (MongoClient): 使用的客户端，默认取服务注册表中的共享客户端
         """
         try:
-            # 修改URI，增加authSource参数
-            updated_uri = f"{MONGODB_URI}?authSource=admin"
-            self.client = MongoClient(updated_uri, username=MONGODB_USERNAME, password=MONGODB_PASSWORD)
+            self._owns_client = client is not None
+            self.client = client or service_registry.get_mongo_client()
             self.db = self.client["amyalmond"]
-            self.users_collection = self.db["users"]
-            self.conversations_collection = self.db["conversations"]
-            self.temp_memories_collection = self.db["temp_memories"]  # 临时记忆集合
+            self.users_collection = self.db.get_collection("users", write_concern=WRITE_CONCERNS["durable"])
+            # 分区前的旧对话集合，新对话按月写入 conversations_YYYYMM
+            self.conversations_collection = self.db[CONVERSATIONS_COLLECTION]
+            self._known_partitions = set()
+            # 临时记忆集合
+            self.temp_memories_collection = self.db.get_collection("temp_memories",
+                                                                   write_concern=WRITE_CONCERNS["scratch"])
             _log.info("<DB CONNECT> 成功连接到MongoDB:")
-            _log.info(f"   ↳ URI: {updated_uri}")
             _log.info(f"   ↳ 数据库: amyalmond")
         except errors.ConnectionFailure as e:
             _log.error("<DB ERROR> 🚨无法连接到MongoDB服务器:")
             _log.error(f"   ↳ 错误详情: {e}")
             raise
 
+    def ensure_indexes(self):
+        """
+        按 INDEX_DEFINITIONS 创建缺失的索引，已存在的索引不会重复创建
+
+        返回:
+            list: 已确保存在的索引名称
+        """
+        ensured = []
+        for collection_name, indexes in INDEX_DEFINITIONS.items():
+            if collection_name == CONVERSATIONS_COLLECTION:
+                targets = self.conversation_partitions() or [CONVERSATIONS_COLLECTION]
+            else:
+                targets = [collection_name]
+            for target in targets:
+                ensured.extend(self._create_indexes(target, indexes))
+        _log.info("<DB INDEX> 索引检查完成:")
+        _log.info(f"   ↳ 索引列表: {ensured}")
+        return ensured
+
+    def _create_indexes(self, collection_name, indexes):
+        """
+        在指定集合上创建一组索引
+
+        返回:
+            list: 创建成功的索引名称
+        """
+        created = []
+        for keys, options in indexes:
+            try:
+                created.append(self.db[collection_name].create_index(keys, **options))
+            except errors.PyMongoError as e:
+                _log.error("<DB ERROR> 🚨创建索引失败:")
+                _log.error(f"   ↳ 集合: {collection_name}")
+                _log.error(f"   ↳ 索引: {options.get('name')}")
+                _log.error(f"   ↳ 错误详情: {e}")
+        return created
+
+    def check_query_plans(self):
+        """
+        使用 explain() 检查热点查询的执行计划，标记仍在进行全集合扫描（COLLSCAN）的查询
+
+        返回:
+            list[dict]: 每个热点查询的检查结果
+        """
+        report = []
+        for name, collection_name, query, sort in HOT_QUERIES:
+            if collection_name == CONVERSATIONS_COLLECTION:
+                collection_name = conversation_partition_name(datetime.now(timezone.utc))
+            try:
+                cursor = self.db[collection_name].find(query)
+                if sort:
+                    cursor = cursor.sort(sort)
+                winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+                stages = _plan_stages(winning_plan)
+                report.append({
+                    "query": name,
+                    "collection": collection_name,
+                    "stages": stages,
+                    "collscan": "COLLSCAN" in stages
+                })
+            except errors.PyMongoError as e:
+                report.append({"query": name, "collection": collection_name, "error": str(e)})
+
+        for item in report:
+            if item.get("collscan"):
+                _log.warning(f"<DB INDEX> ⚠️热点查询 {item['query']} 仍在全集合扫描 ({item['collection']})")
+        return report
+
     def get_all_database_names(self):
         """
         获取MongoDB服务器上的所有数据库名称
@@ -75,6 +282,8 @@ class MongoDBUtils:
             memory_document["_id"] = memory_document.get("_id", ObjectId())
             # 如果没有时间戳，使用当前时间
             memory_document["timestamp"] = memory_document.get("timestamp", datetime.now(timezone.utc))
+            # 标记写入来源实例，供变更流跳过本实例的写入
+            memory_document["origin"] = INSTANCE_ID
 
             result = self.temp_memories_collection.insert_one(memory_document)
             return result.inserted_id
@@ -82,6 +291,35 @@ class MongoDBUtils:
             _log.error(f"插入临时记忆失败: {e}")
             return None
 
+    def insert_temporary_memories(self, memory_documents):
+        """
+        批量插入临时记忆，使用无序写入与快速写入确认级别
+
+        参数:
+            memory_documents (list[dict]): 临时记忆文档列表
+        返回:
+            int: 写入的文档数
+        """
+        if not memory_documents:
+            return 0
+        try:
+            now = datetime.now(timezone.utc)
+            for memory_document in memory_documents:
+                memory_document["_id"] = memory_document.get("_id", ObjectId())
+                memory_document["timestamp"] = memory_document.get("timestamp", now)
+                memory_document["origin"] = INSTANCE_ID
+
+            result = self.temp_memories_collection.bulk_write(
+                [InsertOne(memory_document) for memory_document in memory_documents], ordered=False
+            )
+            return result.inserted_count if result.acknowledged else len(memory_documents)
+        except errors.BulkWriteError as e:
+            _log.error(f"批量插入临时记忆部分失败: {e.details.get('writeErrors')}")
+            return e.details.get("nInserted", 0)
+        except errors.PyMongoError as e:
+            _log.error(f"批量插入临时记忆失败: {e}")
+            return 0
+
     def find_temporary_memories(self, group_id):
         """
         获取特定群组的所有临时记忆
@@ -104,6 +342,20 @@ class MongoDBUtils:
             _log.error(f"清空临时记忆失败: {e}")
             return 0
 
+    def delete_temporary_memories(self, ids):
+        """
+        按ID删除临时记忆，只删除已合并的文档，合并期间新写入的临时记忆不受影响
+
+        返回:
+            int: 删除的文档数
+        """
+        try:
+            result = self.temp_memories_collection.delete_many({"_id": {"$in": list(ids)}})
+            return result.deleted_count
+        except errors.PyMongoError as e:
+            _log.error(f"删除临时记忆失败: {e}")
+            return 0
+
     def insert_user(self, user_document):
         """
         插入一份用户文档到MongoDB的用户集合中，自动添加时间戳和ID
@@ -121,6 +373,37 @@ class MongoDBUtils:
             _log.error(f"   ↳ 错误详情: {e}")
             return None
 
+    def upsert_users(self, users):
+        """
+        批量写入或更新用户文档，使用多数节点确认的写入级别
+
+        参数:
+            users (list[dict]): 用户文档列表，每个文档必须包含 user_id
+        返回:
+            int: 新增与修改的文档总数
+        """
+        if not users:
+            return 0
+        try:
+            now = datetime.now(timezone.utc)
+            operations = [
+                UpdateOne(
+                    {"user_id": user["user_id"]},
+                    {"$set": {**user, "timestamp": user.get("timestamp", now), "origin": INSTANCE_ID}},
+                    upsert=True
+                )
+                for user in users
+            ]
+            result = self.users_collection.bulk_write(operations, ordered=False)
+            _log.info("<DB UPSERT> 批量写入用户文档成功:")
+            _log.info(f"   ↳ 新增数: {result.upserted_count}")
+            _log.info(f"   ↳ 修改数: {result.modified_count}")
+            return result.upserted_count + result.modified_count
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨批量写入用户文档失败:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return 0
+
     def find_user(self, query):
         """
         根据查询条件查找用户文档
@@ -183,17 +466,69 @@ class MongoDBUtils:
             _log.error(f"   ↳ 错误详情: {e}")
             return None
 
-    def find_conversations(self, query):
+    def conversation_partitions(self, start=None, end=None, include_archive=True):
+        """
+        列出时间范围与 [start, end] 有重叠的对话分区，按月份从旧到新排序
+
+        参数:
+            start (datetime): 范围起点，为空表示不限
+            end (datetime): 范围终点，为空表示不限
+            include_archive (bool): 是否包含归档分区
+        返回:
+            list: 分区集合名称，旧的未分区集合（如仍存在）排在最前
+        """
+        start_index = _month_index(_as_utc(start)) if start else None
+        end_index = _month_index(_as_utc(end)) if end else None
+        partitions = []
+        names = self.db.list_collection_names(filter={"name": {"$regex": f"^{CONVERSATIONS_COLLECTION}"}})
+        for name in names:
+            parsed = parse_conversation_partition(name)
+            if parsed is None:
+                continue
+            month, archived = parsed
+            if archived and not include_archive:
+                continue
+            # 旧集合没有固定时间范围，只要存在就必须参与查询
+            if month is not None and ((start_index is not None and month < start_index)
+                                      or (end_index is not None and month > end_index)):
+                continue
+            partitions.append((-1 if month is None else month, archived, name))
+        return [name for _, _, name in sorted(partitions)]
+
+    def _conversation_partition(self, timestamp):
+        """
+        获取时间戳对应的在线分区，首次写入新分区时创建索引
+        """
+        name = conversation_partition_name(timestamp)
+        if name not in self._known_partitions:
+            self._create_indexes(name, INDEX_DEFINITIONS[CONVERSATIONS_COLLECTION])
+            self._known_partitions.add(name)
+        return self.db[name]
+
+    def _find_in_partitions(self, query, start=None, end=None):
+        """
+        按时间范围路由查询，只访问时间范围重叠的分区；未指定范围时从查询条件的 timestamp 中推断
+        """
+        if start is None and end is None:
+            start, end = _query_time_range(query)
+        documents = []
+        for name in self.conversation_partitions(start, end):
+            documents.extend(self.db[name].find(query))
+        return documents
+
+    def find_conversations(self, query, start=None, end=None):
         """
         根据查询条件查找多个对话文档
 
         参数:
             query (dict): 查询条件
+            start (datetime): 只查询该时间之后的分区，为空时从 query 的 timestamp 条件推断
+            end (datetime): 只查询该时间之前的分区，为空时从 query 的 timestamp 条件推断
         返回:
             找到的对话文档列表（list of dict），如果未找到则返回空列表
         """
         try:
-            conversation_documents = list(self.conversations_collection.find(query))
+            conversation_documents = self._find_in_partitions(query, start, end)
             if conversation_documents:
                 _log.info("<DB FIND> 找到对话文档:")
                 _log.info(f"   ↳ 数量: {len(conversation_documents)}")
@@ -209,13 +544,13 @@ class MongoDBUtils:
 
     def find_all_conversations(self):
         """
-        从MongoDB的对话集合中检索所有对话文档。
+        从所有对话分区（包括归档分区）中检索全部对话文档。
 
         返回:
             list[dict]: 包含所有对话文档的列表。
         """
         try:
-            conversations = list(self.conversations_collection.find({}))
+            conversations = self._find_in_partitions({})
             _log.info("<DB FIND> 检索到所有对话记录:")
             _log.info(f"   ↳ 总记录数: {len(conversations)} 条")
             return conversations
@@ -224,16 +559,42 @@ class MongoDBUtils:
             _log.error(f"   ↳ 错误详情: {e}")
             return []
 
+    def find_recent_conversations(self, months=CONVERSATION_HOT_MONTHS):
+        """
+        只从最近几个月的热分区中检索对话文档，按时间顺序返回
+
+        参数:
+            months (int): 包含当前月在内的月份数
+        返回:
+            list[dict]: 对话文档列表
+        """
+        try:
+            start = _month_start(_month_index(datetime.now(timezone.utc)) - months + 1)
+            conversations = []
+            for name in self.conversation_partitions(start=start, include_archive=False):
+                conversations.extend(self.db[name].find({"timestamp": {"$gte": start}}).sort("timestamp", 1))
+            _log.info("<DB FIND> 检索到最近对话记录:")
+            _log.info(f"   ↳ 起始时间: {start:%Y-%m}")
+            _log.info(f"   ↳ 总记录数: {len(conversations)} 条")
+            return conversations
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨检索最近对话文档时发生错误:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return []
+
     def insert_conversation(self, conversation_document):
         """
-        插入一份对话文档到MongoDB的对话集合中，自动添加时间戳和ID
+        插入一份对话文档到其时间戳所属的月分区中，自动添加时间戳和ID
         """
         try:
             conversation_document["_id"] = conversation_document.get("_id", ObjectId())
             conversation_document["timestamp"] = conversation_document.get("timestamp", datetime.now(timezone.utc))
+            conversation_document["origin"] = INSTANCE_ID
 
-            result = self.conversations_collection.insert_one(conversation_document)
+            collection = self._conversation_partition(conversation_document["timestamp"])
+            result = collection.insert_one(conversation_document)
             _log.info("<DB INSERT> 插入对话文档成功:")
+            _log.info(f"   ↳ 分区: {collection.name}")
             _log.info(f"   ↳ _id: {result.inserted_id}")
             return result.inserted_id
         except errors.PyMongoError as e:
@@ -251,7 +612,7 @@ class MongoDBUtils:
             找到的对话文档（dict），如果未找到则返回None
         """
         try:
-            conversation_documents = list(self.conversations_collection.find(query))
+            conversation_documents = self._find_in_partitions(query)
             if conversation_documents:
                 _log.info("<DB FIND> 找到对话文档:")
                 _log.info(f"   ↳ 数量: {len(conversation_documents)}")
@@ -267,7 +628,7 @@ class MongoDBUtils:
 
     def update_conversation(self, query, update_values):
         """
-        根据查询条件更新对话文档
+        根据查询条件更新对话文档，从最新的分区开始查找第一个匹配的文档
 
         参数:
             query (dict): 查询条件
@@ -276,8 +637,17 @@ class MongoDBUtils:
             更新的结果
         """
         try:
-            result = self.conversations_collection.update_one(query, {'$set': update_values})
+            start, end = _query_time_range(query)
+            for name in reversed(self.conversation_partitions(start, end)):
+                result = self.db[name].update_one(query, {'$set': update_values})
+                if result.matched_count:
+                    break
+            else:
+                _log.info("<DB UPDATE> 未找到符合条件的对话文档:")
+                _log.info(f"   ↳ 查询条件: {query}")
+                return 0
             _log.info("<DB UPDATE> 更新对话文档成功:")
+            _log.info(f"   ↳ 分区: {name}")
             _log.info(f"   ↳ 匹配数: {result.matched_count}")
             _log.info(f"   ↳ 修改数: {result.modified_count}")
             return result.modified_count
@@ -288,7 +658,7 @@ class MongoDBUtils:
 
     def delete_conversation(self, query):
         """
-        根据查询条件删除对话文档
+        根据查询条件删除对话文档，从最新的分区开始查找第一个匹配的文档
 
         参数:
             query (dict): 查询条件
@@ -296,24 +666,303 @@ class MongoDBUtils:
             删除的结果
         """
         try:
-            result = self.conversations_collection.delete_one(query)
+            start, end = _query_time_range(query)
+            deleted_count = 0
+            for name in reversed(self.conversation_partitions(start, end)):
+                deleted_count = self.db[name].delete_one(query).deleted_count
+                if deleted_count:
+                    break
             _log.info("<DB DELETE> 删除对话文档成功:")
-            _log.info(f"   ↳ 删除数: {result.deleted_count}")
-            return result.deleted_count
+            _log.info(f"   ↳ 删除数: {deleted_count}")
+            return deleted_count
         except errors.PyMongoError as e:
             _log.error("<DB ERROR> 🚨删除对话文档失败:")
             _log.error(f"   ↳ 错误详情: {e}")
             return None
 
+    def find_oversized_conversation_groups(self, threshold):
+        """
+        查找在线分区中对话数量超过阈值的群组，归档分区不参与计数与压缩
+
+        参数:
+            threshold (int): 每个群组允许保留的对话数量
+        返回:
+            dict: {group_id: 对话数量}
+        """
+        try:
+            pipeline = [{"$group": {"_id": "$group_id", "count": {"$sum": 1}}}]
+            counts = {}
+            for name in self.conversation_partitions(include_archive=False):
+                for doc in self.db[name].aggregate(pipeline):
+                    counts[doc["_id"]] = counts.get(doc["_id"], 0) + doc["count"]
+            return {group_id: count for group_id, count in counts.items() if count > threshold}
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨统计群组对话数量失败:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return {}
+
+    def find_oldest_conversation_ids(self, group_id, limit):
+        """
+        按时间顺序获取指定群组最早的若干条对话ID，从最旧的在线分区开始读取
+        """
+        try:
+            ids = []
+            for name in self.conversation_partitions(include_archive=False):
+                cursor = self.db[name].find(
+                    {"group_id": group_id}, {"_id": 1}
+                ).sort("timestamp", 1).limit(limit - len(ids))
+                ids.extend(doc["_id"] for doc in cursor)
+                if len(ids) >= limit:
+                    break
+            return ids
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨查询最早对话失败:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return []
+
+    def delete_conversations_by_ids(self, ids):
+        """
+        按ID批量删除对话文档（跨所有在线分区，不删除归档）
+
+        返回:
+            int: 删除的文档数
+        """
+        try:
+            ids = list(ids)
+            deleted = 0
+            for name in self.conversation_partitions(include_archive=False):
+                deleted += self.db[name].delete_many({"_id": {"$in": ids}}).deleted_count
+                if deleted >= len(ids):
+                    break
+            return deleted
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨批量删除对话文档失败:")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return 0
+
+    def rollover_conversation_partitions(self, batch_size=1000):
+        """
+        对话分区滚动任务：
+        1. 把旧的未分区集合中的对话按月迁移到在线分区
+        2. 把超过 CONVERSATION_ARCHIVE_AFTER_MONTHS 个月的在线分区合并进压缩归档集合并删除原分区
 
+        返回:
+            dict: {"migrated": 迁移的旧对话数, "archived": 归档的分区列表}
+        """
+        stats = {"migrated": self._migrate_legacy_conversations(batch_size), "archived": []}
+        cutoff = _month_index(datetime.now(timezone.utc)) - CONVERSATION_ARCHIVE_AFTER_MONTHS
+        for name in self.conversation_partitions(include_archive=False):
+            month, _ = parse_conversation_partition(name)
+            if month is not None and month < cutoff and self._archive_partition(name, month):
+                stats["archived"].append(name)
+        if stats["migrated"] or stats["archived"]:
+            _log.info("<DB ROLLOVER> 对话分区滚动完成:")
+            _log.info(f"   ↳ 迁移旧对话: {stats['migrated']} 条")
+            _log.info(f"   ↳ 归档分区: {stats['archived']}")
+        return stats
+
+    def _migrate_legacy_conversations(self, batch_size):
+        """
+        分批把旧 conversations 集合中的文档写入对应月分区，写入成功后从旧集合删除
+        """
+        migrated = 0
+        try:
+            while True:
+                batch = list(self.conversations_collection.find({}).limit(batch_size))
+                if not batch:
+                    break
+                by_partition = {}
+                for document in batch:
+                    timestamp = document.get("timestamp")
+                    if not isinstance(timestamp, datetime):
+                        timestamp = document["_id"].generation_time
+                    # 标记为迁移数据，变更流不会把它当作新消息同步到其他实例
+                    document["migrated"] = True
+                    collection = self._conversation_partition(timestamp)
+                    by_partition.setdefault(collection.name, []).append(document)
+                for name, documents in by_partition.items():
+                    try:
+                        self.db[name].insert_many(documents, ordered=False)
+                    except errors.BulkWriteError as e:
+                        # 上次迁移中断时已写入的文档会触发重复键错误，可以忽略
+                        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                            raise
+                self.conversations_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                migrated += len(batch)
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨迁移旧对话集合失败:")
+            _log.error(f"   ↳ 错误详情: {e}")
+        return migrated
+
+    def _archive_partition(self, name, month):
+        """
+        将在线分区合并进同月的压缩归档集合，确认所有文档都已归档后删除在线分区
+
+        返回:
+            bool: 是否归档成功
+        """
+        archive_name = f"{CONVERSATION_ARCHIVE_PREFIX}{month // 12:04d}{month % 12 + 1:02d}"
+        try:
+            if archive_name not in self.db.list_collection_names(filter={"name": archive_name}):
+                self.db.create_collection(archive_name, storageEngine={
+                    "wiredTiger": {"configString": f"block_compressor={CONVERSATION_ARCHIVE_COMPRESSOR}"}
+                })
+                self._create_indexes(archive_name, INDEX_DEFINITIONS[CONVERSATIONS_COLLECTION])
+
+            source = self.db[name]
+            # $merge 在服务端完成复制，重复执行时保留已归档的文档
+            list(source.aggregate([{"$merge": {
+                "into": archive_name, "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"
+            }}]))
+            # 在服务端逐条核对在线分区的文档是否都已进入归档集合，避免把全部 _id 拉回客户端
+            missing = list(source.aggregate([
+                {"$project": {"_id": 1}},
+                {"$lookup": {"from": archive_name, "localField": "_id", "foreignField": "_id", "as": "archived"}},
+                {"$match": {"archived": {"$size": 0}}},
+                {"$count": "missing"},
+            ], allowDiskUse=True))
+            if missing:
+                _log.warning(f"<DB ROLLOVER> ⚠️分区 {name} 有 {missing[0]['missing']} 条文档未进入归档集合，保留原分区")
+                return False
+            source.drop()
+            self._known_partitions.discard(name)
+            return True
+        except errors.PyMongoError as e:
+            _log.error("<DB ERROR> 🚨归档对话分区失败:")
+            _log.error(f"   ↳ 分区: {name}")
+            _log.error(f"   ↳ 错误详情: {e}")
+            return False
+
+    def find_stale_temporary_memory_groups(self, before):
+        """
+        查找存在早于指定时间的临时记忆的群组
+        """
+        try:
+            return self.temp_memories_collection.distinct("group_id", {"timestamp": {"$lt": before}})
+        except errors.PyMongoError as e:
+            _log.error(f"查找过期临时记忆失败: {e}")
+            return []
 
     def close_connection(self):
         """
-        关闭MongoDB连接
+        关闭MongoDB连接，共享客户端由服务注册表统一关闭
         """
+        if not self._owns_client:
+            return
         try:
             self.client.close()
             _log.info("<DB CLOSE> 成功关闭MongoDB连接")
         except errors.PyMongoError as e:
             _log.error("<DB ERROR> 🚨关闭MongoDB连接时出错:")
             _log.error(f"   ↳ 错误详情: {e}")
+
+
+class AsyncMongoDBUtils:
+    """
+    MongoDBUtils 的异步版本，方法与 MongoDBUtils 一致，但全部可 await。
+
+    所有 pymongo 调用都在专用线程池中执行，慢查询只占用线程池中的一个线程，不会阻塞事件循环上的其他群组。
+    """
+
+    def __init__(self, mongo=None):
+        """
+        参数:
+            mongo (MongoDBUtils): 复用的同步实例，为空时新建
+        """
+        self.sync = mongo or service_registry.get_mongo_utils()
+        self.client = self.sync.client
+        self.db = self.sync.db
+        self.users_collection = self.sync.users_collection
+        self.conversations_collection = self.sync.conversations_collection
+        self.temp_memories_collection = self.sync.temp_memories_collection
+
+    async def run(self, func, *args, **kwargs):
+        """
+        在 MongoDB 线程池中执行任意阻塞调用，供需要直接操作集合的代码使用
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_mongo_executor(), functools.partial(func, *args, **kwargs))
+
+    async def ensure_indexes(self):
+        return await self.run(self.sync.ensure_indexes)
+
+    async def check_query_plans(self):
+        return await self.run(self.sync.check_query_plans)
+
+    async def get_all_database_names(self):
+        return await self.run(self.sync.get_all_database_names)
+
+    async def get_all_collection_names(self, db_name):
+        return await self.run(self.sync.get_all_collection_names, db_name)
+
+    async def insert_temporary_memory(self, memory_document):
+        return await self.run(self.sync.insert_temporary_memory, memory_document)
+
+    async def insert_temporary_memories(self, memory_documents):
+        return await self.run(self.sync.insert_temporary_memories, memory_documents)
+
+    async def find_temporary_memories(self, group_id):
+        return await self.run(self.sync.find_temporary_memories, group_id)
+
+    async def clear_temporary_memory(self, group_id):
+        return await self.run(self.sync.clear_temporary_memory, group_id)
+
+    async def delete_temporary_memories(self, ids):
+        return await self.run(self.sync.delete_temporary_memories, ids)
+
+    async def insert_user(self, user_document):
+        return await self.run(self.sync.insert_user, user_document)
+
+    async def upsert_users(self, users):
+        return await self.run(self.sync.upsert_users, users)
+
+    async def find_user(self, query):
+        return await self.run(self.sync.find_user, query)
+
+    async def update_user(self, query, update_values):
+        return await self.run(self.sync.update_user, query, update_values)
+
+    async def delete_user(self, query):
+        return await self.run(self.sync.delete_user, query)
+
+    async def conversation_partitions(self, start=None, end=None, include_archive=True):
+        return await self.run(self.sync.conversation_partitions, start, end, include_archive)
+
+    async def find_conversations(self, query, start=None, end=None):
+        return await self.run(self.sync.find_conversations, query, start, end)
+
+    async def find_all_conversations(self):
+        return await self.run(self.sync.find_all_conversations)
+
+    async def find_recent_conversations(self, months=CONVERSATION_HOT_MONTHS):
+        return await self.run(self.sync.find_recent_conversations, months)
+
+    async def insert_conversation(self, conversation_document):
+        return await self.run(self.sync.insert_conversation, conversation_document)
+
+    async def find_conversation(self, query):
+        return await self.run(self.sync.find_conversation, query)
+
+    async def update_conversation(self, query, update_values):
+        return await self.run(self.sync.update_conversation, query, update_values)
+
+    async def delete_conversation(self, query):
+        return await self.run(self.sync.delete_conversation, query)
+
+    async def find_oversized_conversation_groups(self, threshold):
+        return await self.run(self.sync.find_oversized_conversation_groups, threshold)
+
+    async def find_oldest_conversation_ids(self, group_id, limit):
+        return await self.run(self.sync.find_oldest_conversation_ids, group_id, limit)
+
+    async def delete_conversations_by_ids(self, ids):
+        return await self.run(self.sync.delete_conversations_by_ids, ids)
+
+    async def rollover_conversation_partitions(self, batch_size=1000):
+        return await self.run(self.sync.rollover_conversation_partitions, batch_size)
+
+    async def find_stale_temporary_memory_groups(self, before):
+        return await self.run(self.sync.find_stale_temporary_memory_groups, before)
+
+    async def close_connection(self):
+        return await self.run(self.sync.close_connection)
@@ -0,0 +1,278 @@
+"""
+AmyAlmond Project - core/utils/tokenizer.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+tokenizer.py - 按模型家族选择 BPE 编码的 Token 计数器，带内容缓存与批量计数
+"""
+import asyncio
+import base64
+import hashlib
+import math
+import os
+import re
+from collections import OrderedDict
+
+from config import (OPENAI_MODEL, LLM_PROVIDERS, LLM_PROFILES, LLM_TOKENIZER_DIR, LLM_TOKENIZER_ENCODINGS,
+                    LLM_TOKENIZER_CACHE_ENTRIES)
+from core.llm.llm_stats import llm_stats
+from core.utils.logger import get_logger
+
+_log = get_logger()
+
+# 未随仓库附带的编码由 tiktoken 下载并缓存到该目录
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", LLM_TOKENIZER_DIR)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 不使用 BPE 词表、按字符类别估算的编码名
+HEURISTIC = "heuristic"
+
+# 模型名前缀 → 编码，按顺序匹配第一个；未匹配的模型使用估算
+MODEL_ENCODINGS = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding", "cl100k_base"),
+)
+
+# 随仓库附带的词表（LLM_TOKENIZER_DIR/<编码名>.tiktoken），与 tiktoken 官方发布的文件一致，
+# 加载时校验 sha256，切分规则与特殊 Token 同 tiktoken_ext.openai_public
+_ENDOFTEXT = "<|endoftext|>"
+_ENDOFPROMPT = "<|endofprompt|>"
+BUNDLED_ENCODINGS = {
+    "cl100k_base": {
+        "sha256": "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7",
+        "pat_str": r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+        "special_tokens": {_ENDOFTEXT: 100257, "<|fim_prefix|>": 100258, "<|fim_middle|>": 100259,
+                           "<|fim_suffix|>": 100260, _ENDOFPROMPT: 100276},
+    },
+    "o200k_base": {
+        "sha256": "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d",
+        "pat_str": "|".join([
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""\p{N}{1,3}""",
+            r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+            r"""\s*[\r\n]+""",
+            r"""\s+(?!\S)""",
+            r"""\s+""",
+        ]),
+        "special_tokens": {_ENDOFTEXT: 199999, _ENDOFPROMPT: 200018},
+    },
+}
+
+# Chat 格式中每条消息的额外开销（角色与分隔符）
+TOKENS_PER_MESSAGE = 3
+
+_CJK_RANGES = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_PATTERN = re.compile(f'[{_CJK_RANGES}]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9]+')
+_SYMBOL_PATTERN = re.compile(rf'[^\sA-Za-z0-9{_CJK_RANGES}]')
+
+
+def estimate_tokens(text):
+    """
+    没有 BPE 词表时估算 Token 数：中日韩字符每字约 1 个 Token，英文与数字约 4 个字符 1 个 Token，其余符号各 1 个
+
+    参数:
+        text (str): 文本
+    返回:
+        int: 估算的 Token 数
+    """
+    words = sum(math.ceil(len(word) / 4) for word in _WORD_PATTERN.findall(text))
+    return len(_CJK_PATTERN.findall(text)) + words + len(_SYMBOL_PATTERN.findall(text))
+
+
+class TokenCounter:
+    """
+    Token 计数器
+
+    按模型名选择编码（llm_tokenizer_encodings 中的配置优先，其次是内置的模型家族表）。
+    词表只在启动时由 preload() 在工作线程中加载（优先读取随仓库附带的文件），计数路径从不做 I/O：
+    编码尚未加载或加载失败时退回按字符类别估算，加载完成后自动改为精确计数。
+    计数结果按 (编码, 文本内容) 缓存在 LRU 中，同一条历史消息在每轮组装上下文时只编码一次；
+    批量计数时未命中的文本通过 encode_batch 一次性编码。
+    """
+
+    def __init__(self, default_model=OPENAI_MODEL, overrides=None, max_entries=LLM_TOKENIZER_CACHE_ENTRIES):
+        self.default_model = default_model
+        self.overrides = LLM_TOKENIZER_ENCODINGS if overrides is None else overrides
+        self.max_entries = max_entries
+        self._encodings = {}
+        self._models = {}
+        self._cache = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "heuristic": 0}
+
+    def target_encoding(self, model=None):
+        """
+        获取模型按配置应使用的编码名（不考虑是否已加载）
+        """
+        model = (model or self.default_model or "").lower()
+        if model not in self._models:
+            name = next((encoding for prefix, encoding in self.overrides.items() if model.startswith(prefix.lower())),
+                        None)
+            if name is None:
+                name = next((encoding for prefix, encoding in MODEL_ENCODINGS if model.startswith(prefix)), HEURISTIC)
+            self._models[model] = name
+        return self._models[model]
+
+    def encoding_name(self, model=None):
+        """
+        获取当前用于该模型计数的编码名
+
+        参数:
+            model (str): 模型名，默认使用 openai_model
+        返回:
+            str: 编码名，编码尚未加载或无法加载时为 "heuristic"
+        """
+        name = self.target_encoding(model)
+        return name if self._encodings.get(name) is not None else HEURISTIC
+
+    def configured_models(self):
+        """
+        配置中出现的所有模型名（openai_model、llm_providers 与 llm_profiles）
+        """
+        models = {self.default_model}
+        models.update(item.get("model") for item in LLM_PROVIDERS)
+        models.update(profile.get("model") for profile in LLM_PROFILES.values())
+        return {model for model in models if model}
+
+    async def preload(self, models=None):
+        """
+        在工作线程中加载模型所需的编码，启动时调用一次，之后的计数不再触发任何 I/O
+
+        参数:
+            models (Iterable[str]): 模型名，默认取配置中出现的所有模型
+        """
+        names = {self.target_encoding(model) for model in (models or self.configured_models())} - {HEURISTIC}
+        names -= set(self._encodings)
+        if not names:
+            return
+        if tiktoken is None:
+            _log.warning("<TOKENIZER> 未安装 tiktoken，Token 数将按字符类别估算（pip install tiktoken）")
+            return
+        for name in sorted(names):
+            encoding = await asyncio.to_thread(self._load_encoding, name)
+            # 在事件循环线程中发布，计数路径读到的要么是 None 要么是完整的编码
+            self._encodings[name] = encoding
+            if encoding is not None:
+                _log.info(f"<TOKENIZER> 已加载编码 {name}")
+
+    @staticmethod
+    def _load_encoding(name):
+        """
+        加载一个编码：随仓库附带的词表直接从 LLM_TOKENIZER_DIR 读取并校验，其他编码交给 tiktoken（可能需要联网下载）。
+        失败时记录警告并返回 None
+        """
+        try:
+            spec = BUNDLED_ENCODINGS.get(name)
+            if spec is None:
+                return tiktoken.get_encoding(name)
+            path = os.path.join(LLM_TOKENIZER_DIR, f"{name}.tiktoken")
+            with open(path, "rb") as f:
+                data = f.read()
+            if hashlib.sha256(data).hexdigest() != spec["sha256"]:
+                raise ValueError(f"词表文件校验失败: {path}")
+            ranks = {}
+            for line in data.splitlines():
+                if line:
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+            return tiktoken.Encoding(name, pat_str=spec["pat_str"], mergeable_ranks=ranks,
+                                     special_tokens=spec["special_tokens"])
+        except Exception as e:
+            _log.warning(f"<TOKENIZER> 无法加载编码 {name}，已改用估算计数:")
+            _log.warning(f"   ↳ 词表目录: {LLM_TOKENIZER_DIR}")
+            _log.warning(f"   ↳ 错误详情: {e}")
+            return None
+
+    def count_batch(self, texts, model=None):
+        """
+        批量计算文本的 Token 数
+
+        参数:
+            texts (list[str]): 文本列表
+            model (str): 模型名，默认使用 openai_model
+        返回:
+            list[int]: 与 texts 一一对应的 Token 数
+        """
+        name = self.encoding_name(model)
+        counts = [0] * len(texts)
+        missing = {}
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            key = (name, text)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                counts[i] = self._cache[key]
+                self.metrics["hits"] += 1
+            else:
+                missing.setdefault(text, []).append(i)
+
+        if missing:
+            self.metrics["misses"] += len(missing)
+            unique = list(missing)
+            encoding = self._encodings.get(name)
+            if encoding is None:
+                self.metrics["heuristic"] += len(unique)
+                results = [estimate_tokens(text) for text in unique]
+            else:
+                results = [len(tokens) for tokens in encoding.encode_batch(unique, disallowed_special=())]
+            for text, count in zip(unique, results):
+                self._cache[(name, text)] = count
+                for i in missing[text]:
+                    counts[i] = count
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return counts
+
+    def count_text(self, text, model=None):
+        """
+        计算单段文本的 Token 数
+        """
+        return self.count_batch([text], model)[0]
+
+    def count_messages(self, messages, model=None):
+        """
+        计算 Chat 消息列表的 Token 数，包含每条消息的格式开销；结果可以按片段相加
+
+        参数:
+            messages (list): 消息字典列表
+            model (str): 模型名，默认使用 openai_model
+        返回:
+            int: Token 总数
+        """
+        contents = [message.get('content') or '' for message in messages]
+        return sum(self.count_batch(contents, model)) + TOKENS_PER_MESSAGE * len(messages)
+
+    def stats(self):
+        """
+        获取计数缓存统计
+
+        返回:
+            dict: 缓存命中/未命中次数、估算次数与各模型使用的编码
+        """
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return self.metrics | {
+            "hit_rate": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+            "entries": len(self._cache),
+            "tiktoken": tiktoken is not None,
+            "loaded": sorted(name for name, encoding in self._encodings.items() if encoding is not None),
+            "models": dict(self._models),
+        }
+
+
+token_counter = TokenCounter()
+llm_stats.register("tokenizer", token_counter.stats)
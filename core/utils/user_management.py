@@ -12,6 +12,7 @@ user_management.py - 用户管理模块，负责用户名映射的加载和保
 
 import json
 from config import USER_NAMES_FILE
+from core.utils.mongodb_utils import AsyncMongoDBUtils
 
 USER_NAMES = {}
 
@@ -25,6 +26,12 @@ def get_user_name(user_id):
     return USER_NAMES.get(user_id, f"消息来自未知用户：")
 
 
+def set_user_name(user_id, nickname):
+    """更新本地用户名映射，不写入数据库，用于同步其他实例的注册"""
+    USER_NAMES[user_id] = f"消息来自{nickname}："
+    save_user_names()
+
+
 def load_user_names():
     """从文件加载用户名映射"""
     global USER_NAMES
@@ -45,6 +52,8 @@ async def add_new_user(user_id, nickname):
     global USER_NAMES
     USER_NAMES[user_id] = f"消息来自{nickname}："
     save_user_names()
+    # 用户数据使用多数节点确认写入MongoDB
+    await AsyncMongoDBUtils().upsert_users([{"user_id": user_id, "nickname": nickname}])
     return True
 
 
@@ -14,6 +14,8 @@ import platform
 from typing import Optional, Tuple
 # logger.py模块 - <用于记录日志>
 from core.utils.logger import get_logger
+# tokenizer.py模块 - <按模型家族的BPE编码计算Token数>
+from core.utils.tokenizer import token_counter
 
 _log = get_logger()
 
@@ -57,40 +59,18 @@ def load_system_prompt(file_path):
         return f.read()
 
 
-def calculate_token_count(messages: list) -> int:
+def calculate_token_count(messages: list, model: Optional[str] = None) -> int:
     """
     计算消息列表中的token数量，用于确保消息上下文不会超出LLM的token限制。
 
     参数:
         messages (list): 包含消息字典的列表，每个字典包含角色和内容。
+        model (Optional[str]): 模型名，决定使用的BPE编码，默认使用 openai_model。
 
     返回:
-        int: 消息列表中的总token数量。
+        int: 消息列表中的总token数量（含每条消息的格式开销）。
     """
-    total_tokens = 0
-
-    # 逐条消息计算token数量
-    for message in messages:
-        content = message.get('content', '')
-        tokens = tokenize(content)
-        total_tokens += len(tokens)
-
-    return total_tokens
-
-
-def tokenize(text: str) -> list:
-    """
-    将给定的文本拆分为token列表。
-
-    参数:
-        text (str): 需要token化的文本。
-
-    返回:
-        list: 包含文本中token的列表。
-    """
-    # 使用简单的正则表达式模拟GPT的token化规则
-    tokens = re.findall(r'\w+|[^\w\s]', text, re.UNICODE)
-    return tokens
+    return token_counter.count_messages(messages, model)
 
 
 def detect_os_and_version() -> Tuple[Optional[str], Optional[str]]:
@@ -19,6 +19,7 @@ from fastapi.middleware.cors import CORSMiddleware
 import botpy
 from core.api.routes import router as api_router
 from core.bot.bot_client import MyClient
+from core.db.service_registry import service_registry
 from core.utils.logger import get_logger, handle_critical_error
 from config import test_config
 
@@ -38,6 +39,14 @@ app.add_middleware(
 # 注册 API 路由
 app.include_router(api_router)
 
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    """
+    关闭共享的数据库连接池
+    """
+    await service_registry.aclose()
+
 async def check_port_occupied(port):
     """
     异步检查指定端口是否被占用。
@@ -0,0 +1,76 @@
+"""
+AmyAlmond Project - tools/benchmark/mongodb_write_benchmark.py
+
+Open Source Repository: https://github.com/shuakami/amyalmond_bot
+Developer: Shuakami <3 LuoXiaoHei
+Copyright (c) 2024 Amyalmond_bot. All rights reserved.
+Version: 1.3.0 (Stable_923001)
+
+mongodb_write_benchmark.py - 对比逐条写入与批量写入在不同写入确认级别下的吞吐量
+
+用法: python tools/benchmark/mongodb_write_benchmark.py [文档数量，默认2000]
+"""
+import os
+import sys
+import time
+
+from pymongo import InsertOne
+
+# 手动指定项目根目录
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# 将项目根目录添加到 Python 的搜索路径中
+sys.path.append(project_root)
+from core.db.service_registry import service_registry
+from core.utils.mongodb_utils import WRITE_CONCERNS
+
+BENCHMARK_COLLECTION = "benchmark_writes"
+
+
+def make_documents(count):
+    """生成与临时记忆结构相同的测试文档"""
+    return [{"group_id": f"bench_{i % 20}", "role": "user", "content": f"benchmark message {i}"} for i in range(count)]
+
+
+def run_case(name, collection, count, bulk):
+    """执行一次写入测试并返回每秒写入文档数"""
+    collection.delete_many({})
+    documents = make_documents(count)
+    start = time.perf_counter()
+    if bulk:
+        collection.bulk_write([InsertOne(document) for document in documents], ordered=False)
+    else:
+        for document in documents:
+            collection.insert_one(document)
+    elapsed = time.perf_counter() - start
+    throughput = count / elapsed if elapsed else float("inf")
+    print(f"> {name:<32} {elapsed:>8.3f}s  {throughput:>10.0f} docs/s")
+    return throughput
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    db = service_registry.get_mongo_client()["amyalmond"]
+
+    print("+----------------------------------------------------------------+")
+    print(f"|   MongoDB 写入基准测试（{count} 条文档）")
+    print("+----------------------------------------------------------------+")
+
+    cases = [
+        ("insert_one / 默认写入级别", db.get_collection(BENCHMARK_COLLECTION), False),
+        ("insert_one / majority", db.get_collection(BENCHMARK_COLLECTION, write_concern=WRITE_CONCERNS["durable"]), False),
+        ("bulk_write / majority", db.get_collection(BENCHMARK_COLLECTION, write_concern=WRITE_CONCERNS["durable"]), True),
+        ("bulk_write / scratch", db.get_collection(BENCHMARK_COLLECTION, write_concern=WRITE_CONCERNS["scratch"]), True),
+    ]
+    try:
+        results = {name: run_case(name, collection, count, bulk) for name, collection, bulk in cases}
+        baseline = results[cases[0][0]]
+        print("+----------------------------------------------------------------+")
+        for name, throughput in results.items():
+            print(f"> {name:<32} 相对基线: {throughput / baseline:.1f}x")
+    finally:
+        db.drop_collection(BENCHMARK_COLLECTION)
+        service_registry.close()
+
+
+if __name__ == "__main__":
+    main()
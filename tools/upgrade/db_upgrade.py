@@ -13,6 +13,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..
 sys.path.append(project_root)
 from config import MONGODB_URI, MONGODB_USERNAME, MONGODB_PASSWORD, ELASTICSEARCH_URL, ELASTICSEARCH_USERNAME, \
     ELASTICSEARCH_PASSWORD
+from core.db.elasticsearch_index_manager import ElasticsearchIndexManager
 
 # 路径配置
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -54,8 +55,7 @@ def backup_elasticsearch():
     if not os.path.exists(backup_dir):
         os.makedirs(backup_dir)
 
-    query = {"query": {"match_all": {}}}
-    results = helpers.scan(es_client, index="messages", query=query)
+    results = ElasticsearchIndexManager(es_client).iterate_documents("messages")
 
     for i, result in enumerate(results):
         with open(os.path.join(backup_dir, f"{i}.json"), "w", encoding="utf-8") as file:
@@ -92,9 +92,11 @@ def prompt_clear_databases():
     print("> MongoDB 清空完成.")
 
     print("> 清空 Elasticsearch 'messages' 索引...")
-    if es_client.indices.exists(index="messages"):
+    # messages 为指向月索引的别名时只清空文档，保留模板创建的索引；旧的普通索引由机器人启动时按模板重建
+    if es_client.indices.exists_alias(name="messages"):
+        es_client.delete_by_query(index="messages", query={"match_all": {}}, conflicts="proceed", refresh=True)
+    elif es_client.indices.exists(index="messages"):
         es_client.options(ignore_status=[400, 404]).indices.delete(index="messages")
-    es_client.indices.create(index="messages")
     print("> Elasticsearch 清空完成.")
 
 
@@ -150,6 +152,7 @@ def migrate_long_term_memory():
 
                 action = {
                     "_index": "messages",
+                    "_routing": group_id,
                     "_source": {
                         "group_id": group_id,
                         "role": "system",